@@ -0,0 +1,211 @@
+# --------------------------------------------------------------------------
+# Filename      : adaptive_sweep.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Adaptive parameter search, in place of the fixed grids of
+#                 (smz_duration, smz_radius) swept by the main blocks of
+#                 calc_smz.py, calc_kda_smz.py and calc_glr.py.
+#
+#                 1. refine: maps the metrics over a range of parameters.
+#                    The centre of each rectangle of a coarse grid is
+#                    evaluated, and the rectangle is split in four only if
+#                    some metric there is off the mean of the corners (the
+#                    bilinear interpolation) by more than tolerance times
+#                    its largest value, down to a resolution of
+#                    min_duration x min_radius. A rectangle already at the
+#                    resolution in one direction is split in two, at the
+#                    midpoint of its edge, which is compared with the mean
+#                    of the two ends of that edge. Where the metrics are flat,
+#                    or change evenly, the coarse grid is kept; the cells
+#                    gather where they bend or jump.
+#                 2. cheapest: for each smz_duration, the smallest
+#                    smz_radius (to within resolution) whose metric reaches
+#                    a target, e.g. a tot-sys k of 5, by bisection. The
+#                    metrics grow with the radius and the silent period,
+#                    so the answer for a longer silent period is searched
+#                    below the one of the shorter.
+#
+#                 Every cell is run through a journal (see sweep_journal.py),
+#                 keyed by the cell, the smz centre and the options that
+#                 change the result: cells already there are not run
+#                 again, and interrupted searches resume where they were.
+#                 Earlier output files can be given as cached, as (file,
+#                 smz_x, smz_y) for the centre they were run at (calc.txt,
+#                 calc_glr.output, ...: the centres of the main blocks of
+#                 calc_smz.py and calc_glr.py); only those run at the
+#                 sweep's centre, with no options, are used.
+#
+#                 metrics are positions in the result tuple: 5, 6, 7 are k,
+#                 d_bar and anon_duration over all vehicles, 10, 11, 12 the
+#                 same over the anonymized ones (METRICS). Options that make
+#                 smz_stats return more than the result tuple (fraction of
+#                 smz_events.py, dual of calc_glr.py) are not accepted.
+#
+# Output print  : the result tuple of every cell (as smz_stats prints it),
+#                 then, for cheapest, the (smz_duration, smz_radius) found
+#                 for each silent period (None if even max_radius misses
+#                 the target), and the number of cells run
+#
+# Usage         : sweep = Sweep("smz", "rural.srt", 2290, 800,
+#                   "adaptive_smz.journal", cached = [("calc.txt", 2290, 800)])
+#                 cells = refine(sweep, [20, 60, 100], [30, 90, 150])
+#                 frontier = cheapest(sweep, 5, range(20, 120, 20), 10, 150)
+#
+#                 python adaptive_sweep.py refine smz rural.srt 2290 800
+#                 python adaptive_sweep.py cheapest glr urban.srt 1430 2490 1.5
+#
+# --------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import sweep_journal
+
+
+# engine -> (label of its result tuples, module of its smz_stats)
+ENGINES = {"smz": ("parms:", "calc_smz"), "glr": ("GLR parms:", "calc_glr"),
+  "events": ("parms:", "smz_events")}
+
+METRICS = {"k": 5, "d_bar": 6, "anon_duration": 7, "k_anon": 10,
+  "d_bar_anon": 11, "anon_duration_anon": 12}
+
+
+class Sweep:
+  # the cells of one engine, trace and smz centre, run through a journal;
+  # kwargs are passed on to smz_stats (e.g. outfile, checkpoint)
+
+  def __init__ (self, engine, infile, smz_x, smz_y, journal, cached = (),
+    **kwargs):
+    if engine not in ENGINES:
+      raise ValueError("unknown engine %s" % engine)
+    if kwargs.get("fraction") is not None and kwargs["fraction"] < 1 \
+      or kwargs.get("dual"):
+      raise ValueError("%s: a sweep needs one result tuple per cell (no "
+        "fraction or dual)" % infile)
+    self.label, module = ENGINES[engine]
+    self.smz_stats = __import__(module).smz_stats
+    self.infile = infile
+    self.smz_x = smz_x
+    self.smz_y = smz_y
+    self.kwargs = kwargs
+    self.journal = sweep_journal.Journal(journal)
+    if not sweep_journal.cell_key(self.label, infile, 0, 0, smz_x, smz_y,
+      **kwargs)[6:]: # (the output files hold runs without options)
+      for path, x, y in cached:
+        if (x, y) == (smz_x, smz_y):
+          self.journal.merge(path, (x, y))
+    self.cells = {} # (smz_duration, smz_radius) -> result, of this search
+    self.runs = 0   # cells run (not found in the journal)
+
+  def cell (self, smz_duration, smz_radius):
+    # returns the result tuple of one cell, run only if not journaled
+    key = (smz_duration, smz_radius)
+    if key not in self.cells:
+      cell = sweep_journal.cell_key(self.label, self.infile, smz_duration,
+        smz_radius, self.smz_x, self.smz_y, **self.kwargs)
+      if not self.journal.done(cell):
+        self.runs += 1
+      self.cells[key] = self.journal.run(cell, self.smz_stats, smz_duration,
+        smz_radius, self.smz_x, self.smz_y, self.infile, **self.kwargs)
+    return self.cells[key]
+
+
+def bends (corners, centre, metrics, tolerance):
+  # returns true if one of the metrics at centre is off the mean of its
+  # values at corners by more than tolerance times its largest (absolute)
+  # value
+  for m in metrics:
+    values = [result[m] for result in corners]
+    top = max([abs(value) for value in values + [centre[m]]])
+    if abs(centre[m] - sum(values) / float(len(values))) > tolerance * top:
+      return True
+  return False
+
+
+def refine (sweep, durations, radii, tolerance = 0.1, metrics = (5, 6, 7),
+  min_duration = 5, min_radius = 5):
+  # evaluates the coarse grid durations x radii (sorted lists), and the
+  # midpoints of its rectangles wherever the metrics bend (see above);
+  # returns the cells evaluated, {(smz_duration, smz_radius): result}
+  todo = []
+  for i in range(len(durations) - 1):
+    for j in range(len(radii) - 1):
+      todo.append((durations[i], durations[i + 1], radii[j], radii[j + 1]))
+  if len(durations) == 1 or len(radii) == 1: # (a line, not a grid)
+    for d in durations:
+      for r in radii:
+        sweep.cell(d, r)
+  while todo: # (coarse rectangles first)
+    d0, d1, r0, r1 = todo.pop(0)
+    ds = [d0, d1]
+    if d1 - d0 >= 2 * min_duration:
+      ds = [d0, (d0 + d1) // 2, d1]
+    rs = [r0, r1]
+    if r1 - r0 >= 2 * min_radius:
+      rs = [r0, (r0 + r1) // 2, r1]
+    if len(ds) == 2 and len(rs) == 2:
+      continue # (at the resolution)
+    d, r = ds[len(ds) // 2], rs[len(rs) // 2]
+    # (the midpoint of an edge if one direction is at the resolution: the
+    # ends of that edge)
+    ends_d = [d]
+    if len(ds) == 3:
+      ends_d = [d0, d1]
+    ends_r = [r]
+    if len(rs) == 3:
+      ends_r = [r0, r1]
+    corners = [sweep.cell(a, b) for a in ends_d for b in ends_r]
+    if not bends(corners, sweep.cell(d, r), metrics, tolerance):
+      continue
+    for i in range(len(ds) - 1):
+      for j in range(len(rs) - 1):
+        todo.append((ds[i], ds[i + 1], rs[j], rs[j + 1]))
+  return dict(sweep.cells)
+
+
+def cheapest (sweep, target, durations, min_radius, max_radius,
+  metric = 5, resolution = 1):
+  # returns [(smz_duration, smz_radius)]: for each smz_duration, the
+  # smallest smz_radius in [min_radius, max_radius] (to within resolution)
+  # whose metric reaches target, or None if max_radius does not
+  frontier = []
+  hi_radius = max_radius
+  for d in sorted(durations):
+    hi = hi_radius
+    if sweep.cell(d, hi)[metric] < target:
+      if hi == max_radius or sweep.cell(d, max_radius)[metric] < target:
+        frontier.append((d, None))
+        continue
+      hi = max_radius # (not monotone after all)
+    lo = min_radius
+    if sweep.cell(d, lo)[metric] >= target:
+      hi = lo
+    while hi - lo > resolution:
+      mid = (lo + hi) // 2
+      if sweep.cell(d, mid)[metric] >= target:
+        hi = mid
+      else:
+        lo = mid
+    frontier.append((d, hi))
+    hi_radius = hi
+  return frontier
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  mode, engine, infile = sys.argv[1:4]
+  smz_x, smz_y = float(sys.argv[4]), float(sys.argv[5])
+  sweep = Sweep(engine, infile, smz_x, smz_y, "adaptive_%s_%s_%g_%g.journal"
+    % (engine, os.path.basename(infile), smz_x, smz_y))
+  if mode == "refine":
+    cells = refine(sweep, [20, 60, 100], [30, 90, 150])
+  elif mode == "cheapest":
+    target = float(sys.argv[6])
+    print (cheapest(sweep, target, range(20, 120, 20), 10, 150))
+  else:
+    raise ValueError("unknown mode %s (refine or cheapest)" % mode)
+  print ("cells:", len(sweep.cells), "run:", sweep.runs)
+  print (time.ctime()) # ===== end of program =====
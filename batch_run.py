@@ -0,0 +1,262 @@
+# --------------------------------------------------------------------------
+# Filename      : batch_run.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Run the SMZ and GLR engines (calc_smz.py, calc_glr.py)
+#                 over many GMSF/MMTS traces and parameter grids listed in
+#                 a manifest, and collect all result tuples in one table.
+#
+#                 Jobs are grouped by trace, so every trace is loaded once:
+#                 the trace is loaded into a bounded LRU pool of trajectory
+#                 sources, then a pool of worker processes is forked for
+#                 its jobs. The workers share the parent's trace arrays
+#                 (copy-on-write pages of array() buffers, never written)
+#                 instead of re-reading the trace file. The GLR neighbour
+#                 indexes of the trace (one per comrange, see
+#                 neighbour_index.py) are built before the fork too, so
+#                 every worker and every silent period shares them.
+#
+#                 When both engines are asked for the same trace, silent
+#                 period and radius, the two jobs are run as one pass of
+#                 calc_glr.py with dual = True, which gives the SMZ result
+#                 of calc_smz.py as well (see calc_glr.py).
+#
+# Input file    : manifest, one trace per line (# starts a comment):
+#
+#                 rural.txt 2290  800 20,40,60,80,100 30,60,90,120,150 smz,glr
+#                 urban.srt 1430 2490 20,40,60,80,100 30,60,90,120,150 glr
+#
+#                 trace file (.txt GMSF/MMTS or .srt), smz_x, smz_y,
+#                 smz_durations, smz_radii (comma separated lists) and
+#                 engines (smz, glr or both, default both); a trace may be
+#                 listed more than once, its jobs are run together
+#
+# Output file   : table of results, one tab separated line per job, written
+#                 as soon as the job finishes:
+#
+#                 trace engine smz_duration smz_radius <result tuple...>
+#
+#                 where the result tuple is what smz_stats prints. The table
+#                 is also the journal of the batch: each line is appended
+#                 atomically (see sweep_journal.py), and jobs already in the
+#                 table are skipped when the batch is run again
+#
+#                 with a sta_dir, the per-vehicle statistics of each job go
+#                 to <trace>_<engine>_<duration>_<radius>.sta in it, and
+#                 those of the GLR model to <trace>_glr_<...>.glr as well,
+#                 with its pair distributions in <trace>_glr_<...>.hst
+#
+# Usage         : python batch_run.py manifest.txt results.tsv [processes]
+#                   [sta_dir]
+#
+#                 processes "-" runs one worker per CPU (the default); the
+#                 sta_dir is created if needed
+#
+# --------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import multiprocessing
+from collections import OrderedDict
+
+import calc_glr
+import calc_smz
+import sweep_journal
+import traj_source
+
+
+POOL_SIZE = 2  # loaded traces kept in RAM (the current one and one more)
+
+_pool = OrderedDict() # trace file -> trajectory source, least recent first
+_source = None        # source of the trace being run (inherited by workers)
+
+
+def read_manifest (manifest):
+  # returns a list of jobs (trace, engine, smz_duration, smz_radius,
+  # smz_x, smz_y), grouped by trace in order of first appearance
+  jobs = OrderedDict()
+  mf = open(manifest, "r")
+  for lineno, line in enumerate(mf):
+    words = line.split("#")[0].split()
+    if not words:
+      continue
+    if len(words) not in (5, 6):
+      raise ValueError("%s line %d: expected 5 or 6 columns, got %d"
+        % (manifest, lineno + 1, len(words)))
+    trace = words[0]
+    smz_x, smz_y = float(words[1]), float(words[2])
+    durations = [int(w) for w in words[3].split(",")]
+    radii = [int(w) for w in words[4].split(",")]
+    engines = (words[5] if len(words) == 6 else "smz,glr").split(",")
+    for engine in engines:
+      if engine not in ("smz", "glr"):
+        raise ValueError("%s line %d: unknown engine %s"
+          % (manifest, lineno + 1, engine))
+      for smz_duration in durations:
+        for smz_radius in radii:
+          jobs.setdefault(trace, []).append(
+            (trace, engine, smz_duration, smz_radius, smz_x, smz_y))
+  mf.close()
+  return [job for trace in jobs for job in jobs[trace]]
+
+
+def load_trace (trace):
+  # returns the trajectory source for trace, from the pool if it is there;
+  # the least recently used source is dropped when the pool is full
+  if trace in _pool:
+    _pool[trace] = _pool.pop(trace)
+  else:
+    while len(_pool) >= POOL_SIZE:
+      _pool.popitem(last = False)
+    _pool[trace] = traj_source.open_trace(trace)
+  return _pool[trace]
+
+
+def pair_jobs (jobs):
+  # returns jobs with each smz job that has a glr job of the same trace,
+  # smz_duration, smz_radius and smz centre merged with it into one
+  # "smz+glr" job (in place of the smz job), the others as they are
+  glr = set([job[:1] + job[2:] for job in jobs if job[1] == "glr"])
+  smz = set([job[:1] + job[2:] for job in jobs if job[1] == "smz"])
+  paired = []
+  for job in jobs:
+    key = job[:1] + job[2:]
+    if key in glr and key in smz:
+      if job[1] == "smz":
+        paired.append(job[:1] + ("smz+glr",) + job[2:])
+    else:
+      paired.append(job)
+  return paired
+
+
+def sta_file (trace, engine, smz_duration, smz_radius, sta_dir,
+  ext = ".sta"):
+  # returns the name of the statistics file of a job (os.devnull if
+  # there is no sta_dir)
+  if sta_dir is None:
+    return os.devnull
+  stem = os.path.splitext(os.path.basename(trace))[0]
+  return os.path.join(sta_dir, "%s_%s_%d_%d%s"
+    % (stem, engine, smz_duration, smz_radius, ext))
+
+
+def run_job (job, sta_dir = None):
+  # runs one job against the current trace (_source) and returns its
+  # table rows (two for an smz+glr job); the .sta files are kept only if
+  # sta_dir is given
+  trace, engine, smz_duration, smz_radius, smz_x, smz_y = job
+  outfile = sta_file(trace, engine, smz_duration, smz_radius, sta_dir)
+  glr_outfile = None
+  hist_outfile = None
+  if sta_dir is not None:
+    glr_outfile = sta_file(trace, "glr", smz_duration, smz_radius, sta_dir,
+      ".glr")
+    hist_outfile = sta_file(trace, "glr", smz_duration, smz_radius, sta_dir,
+      ".hst")
+  if engine == "smz":
+    results = [("smz", calc_smz.smz_stats(smz_duration, smz_radius, smz_x,
+      smz_y, _source, outfile = outfile))]
+  elif engine == "glr":
+    results = [("glr", calc_glr.smz_stats(smz_duration, smz_radius, smz_x,
+      smz_y, _source, outfile = outfile, glr_outfile = glr_outfile,
+      hist_outfile = hist_outfile))]
+  else:
+    outfile = sta_file(trace, "smz", smz_duration, smz_radius, sta_dir)
+    smz, glr = calc_glr.smz_stats(smz_duration, smz_radius, smz_x, smz_y,
+      _source, outfile = outfile, glr_outfile = glr_outfile,
+      hist_outfile = hist_outfile, dual = True)
+    if sta_dir is not None: # (the same table as the glr job writes)
+      shutil.copyfile(outfile,
+        sta_file(trace, "glr", smz_duration, smz_radius, sta_dir))
+    results = [("smz", smz), ("glr", glr)]
+  return [(trace, engine, smz_duration, smz_radius) + tuple(result)
+    for engine, result in results]
+
+
+def _cell (w):
+  # table cell for one value, floats with full precision (like print)
+  if isinstance(w, float):
+    return repr(w)
+  return str(w)
+
+
+def _run_job (args):
+  return run_job(*args)
+
+
+def done_jobs (table):
+  # returns the set of (trace, engine, smz_duration, smz_radius) of the
+  # jobs already in table; a partial last line (interrupted write) is
+  # dropped
+  done = set()
+  if not os.path.exists(table):
+    return done
+  sweep_journal.drop_partial_line(table)
+  tf = open(table, "r")
+  for line in tf:
+    words = line.rstrip("\n").split("\t")
+    if len(words) > 4:
+      done.add((words[0], words[1], int(words[2]), int(words[3])))
+  tf.close()
+  return done
+
+
+def batch_run (jobs, table, processes = None, sta_dir = None):
+  # runs all jobs not yet in table (a file name), one trace at a time,
+  # and appends their rows to table as they finish
+  global _source
+  done = done_jobs(table)
+  jobs = pair_jobs([job for job in jobs if job[:4] not in done])
+  i = 0
+  while i < len(jobs):
+    trace = jobs[i][0]
+    group = []
+    while i < len(jobs) and jobs[i][0] == trace:
+      group.append((jobs[i], sta_dir))
+      i += 1
+    _source = load_trace(trace)
+    radii = sorted(set([job[3] for job, _ in group if job[1] != "smz"]))
+    if radii:
+      import neighbour_index # (only for GLR jobs, it needs numpy)
+      if len(radii) <= neighbour_index.CACHE_SIZE:
+        for smz_radius in radii:
+          neighbour_index.neighbours(_source, smz_radius, _source.sim_time)
+    workers = None
+    if processes == 1:
+      rows = (_run_job(job) for job in group)
+    else:
+      workers = multiprocessing.Pool(processes) # forked after the load
+      rows = workers.imap_unordered(_run_job, group)
+    finished = False
+    try:
+      for job_rows in rows:
+        for row in job_rows:
+          sweep_journal.append_line(table,
+            "\t".join([_cell(w) for w in row]))
+      finished = True
+    finally:
+      if workers is not None:
+        if finished:
+          workers.close()
+        else: # (a job raised, or the batch was interrupted)
+          workers.terminate()
+        workers.join()
+      _source = None
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  processes = None
+  if len(sys.argv) > 3 and sys.argv[3] != "-":
+    processes = int(sys.argv[3])
+  sta_dir = None
+  if len(sys.argv) > 4:
+    sta_dir = sys.argv[4]
+    if not os.path.isdir(sta_dir):
+      os.makedirs(sta_dir)
+  batch_run(read_manifest(sys.argv[1]), sys.argv[2], processes, sta_dir)
+  print (time.ctime()) # ===== end of program =====
@@ -29,6 +29,9 @@
 #                    described in the "program output" section below
 # 
 # Input file    : a sorted, fully enumerated trajectory file (.srt) of the form
+#                 (or the GMSF/MMTS trace file itself, e.g. city.txt, in which
+#                 case steps c.-e. above are skipped and the positions are
+#                 generated on demand, see traj_source.py)
 #
 #                 0 1 1435.34 1539.1
 # 
@@ -42,11 +45,10 @@
 #                 a complete set of (x, y, t) positions
 #
 # Processing    : 1. initialize variables
-#                 2. open input file
-#                 3. loop through lines of input file
-#                 4. loop through words in each line of input file
-#                    and load them into variables
-#                    (now the entire input file is in RAM)
+#                 2. open input file as a trajectory source
+#                 3. (removed, see traj_source.py)
+#                 4. (removed, see traj_source.py)
+#                    (now the input file, or its index, is in RAM)
 #                 5. initialize variables for gathering statistics
 #                 6. loop through all time slices, vehicles
 #                    and calculate k, d_bar and anon_time for each vehicle
@@ -57,9 +59,18 @@
 #
 # Output file   : calc_kda_smz.sta statistics file
 #                 see section 7 for explanation of output file
+#                 (the SMZ statistics of the same pass; the GLR statistics
+#                 per vehicle are written to glr_outfile, and the pair
+#                 distributions to hist_outfile, if given)
 #
 # Output print  : see end of section 7 for explanation
 #
+# SMZ and GLR   : the loop of section 6 keeps the full SMZ bookkeeping of
+#                 calc_smz.py next to the GLR state, so one pass gives both
+#                 models: with dual = True, smz_stats prints and returns
+#                 the SMZ result tuple of calc_smz.py as well, and the
+#                 trace is read, and every position tested, only once
+#
 # Running time  : on pentium i5 it ran ~5.5 hours...
 #                 from Thu Jan 08 03:41:08 2015
 #                 to   Thu Jan 08 09:07:04 2015
@@ -105,20 +116,11 @@
 import math
 import time
 
-# GLOBAL LISTS
-
-global times 
-global cid  
-global curx
-global cury
+import sweep_journal
+import traj_source
 
-# the arrays (lists) below contain 100,000+ elements, the number of vehicles
-# times the number of time slices, roughly
-
-times = [] # time 
-cid   = [] # vehicle id
-curx  = [] # x position at time
-cury  = [] # y position at time
+# numpy and neighbour_index are imported by smz_stats when it is first
+# called, so importing this module (e.g. in a worker) loads neither
 
 # GLOBAL STATISTICAL LISTS
 
@@ -131,15 +133,13 @@ global anon_begin
 global seeking
 global glr_anon_time
 
-global simtimes
-
-def incomrange (other, self, x, y, r, time_index1, time_index2):
-  # returns lowest-numbered non-self leader or seeker in comrange, r, or 0 if none
+DIST_BIN = 50  # (m) bins of the pairs by departure distance
+GAP_BIN  = 10  # (s) bins of the pairs by departure time gap
 
-  global times 
-  global cid  
-  global curx
-  global cury
+def incomrange (other, self, near):
+  # returns lowest-numbered non-self leader or seeker in comrange, or 0 if none
+  # near lists the vehicles in comrange in the next time slice, by vehicle
+  # number (see neighbour_index.py)
 
   global myleader 
   global k
@@ -149,35 +149,28 @@ def incomrange (other, self, x, y, r, time_index1, time_index2):
 
   global seeking
   global glr_anon_time
-  global simtimes
 
   inrange = 0
   
   if other == "leader":
-    for j in range(time_index1, time_index2):
-      if cid[j] != self and cid[j] == myleader[cid[j]]:
-        
-        # print "-", x, curx[j], "-", cury[j], y, "-", math.sqrt( (float(x)-curx[j])**2 + (float(y)-cury[j])**2 )
-        if r > math.sqrt( (float(x)-curx[j])**2 + (float(y)-cury[j])**2 ):
-          return cid[j]
+    for j in near:
+      if j != self and j == myleader[j]:
+        return j
 
   elif other == "seeker":
-    for j in range(time_index1, time_index2):
-      if cid[j] != self and 1 == seeking[cid[j]]:
-        if r > math.sqrt( (float(x)-curx[j])**2 + (float(y)-cury[j])**2 ):
-          xydistance = math.sqrt( (float(x)-curx[j])**2 + (float(y)-cury[j])**2 )
-          return cid[j]
+    for j in near:
+      if j != self and 1 == seeking[j]:
+        return j
 
   else:
     print( "error (inrange): must search for leader or seeker")
     exit()
 
-def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
-
-  global times 
-  global cid  
-  global curx
-  global cury
+def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile,
+  region = None, sim_time = None, outfile = "calc_kda_smz.sta",
+  checkpoint = None, checkpoint_every = 100,
+  glr_seek_vid = 1000, step = None, dual = False, glr_outfile = None,
+  hist_outfile = None):
 
   global myleader 
   global k
@@ -187,15 +180,25 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
 
   global seeking
   global glr_anon_time
-  global simtimes
+
+  import numpy
+  import neighbour_index
    
   # ---------- 1. initialize variables --------------------------------------
 
   v = 1                  # vehicle number (note: there is no vehicle "0")
   # infile = "rural.srt" # should be city.srt, urban.srt, or rural.srt
-  outfile = "calc_kda_smz.sta"
-  SIM_TIME = 2000        # this is total simulation time of city, urban, rural
-                         # files from gmsf.sourceforge.net
+  # outfile = "calc_kda_smz.sta" # one .sta file per parameter set is
+                                  # needed for sta_bootstrap.py
+  # SIM_TIME (total simulation time, 2000 s for the city, urban, rural
+  # files from gmsf.sourceforge.net) and the region (xmin, ymin, xmax, ymax),
+  # (0, 0, 3000, 3000) for the same files, come from the trace metadata
+  # (see traj_source.py) unless given as sim_time and region
+
+  # step (seconds per time step, default 1) is the time resolution: the
+  # loop below runs over time steps, and times are kept in steps until
+  # they are written out in seconds (see traj_source.py). With sub-second
+  # steps, pass the GMSF/MMTS trace file (.txt) rather than a .srt file
 
   # ----- USER-DEFINED VARIABLES -----
   # change these in ===== main ===== section at bottom of this code
@@ -205,52 +208,42 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # smz_x        = 2290  # city:  390, urban: 1430, rural: 2290
   # smz_y        =  800  # city: 1710, urban: 2490, rural:  800
 
-  # speed of cars is around 20 m/s, width of region is 3000 m,
-  # so a car could possibly traverse the region in 3000/20 = 150 seconds
-
-  # the arrays below contain hundreds of thousands of elements, len(times)
-
-  times = [] # time
-  cid   = [] # vehicle id
-  curx  = [] # x position at time
-  cury  = [] # y position at time
+  # glr_seek_vid: seekers with a vehicle id <= glr_seek_vid do not
+  # search for a partner (and keep the result of the previous search);
+  # 1000 reproduces the published calc_glr.output runs
 
-  simtimes = [] # initial indexes for times[] for each time from 0 to SIM_TIME
+  # dual: also print the SMZ result of this pass (as calc_smz.py does)
+  # and return (smz result, GLR result) instead of the GLR result
+  # glr_outfile: per-vehicle GLR statistics file (see section 7)
+  # hist_outfile: pair distributions file of the cell (see section 7)
 
+  # speed of cars is around 20 m/s, width of region is (e.g.) 3000 m,
+  # so a car could possibly traverse the region in 3000/20 = 150 seconds
 
-  # ---------- 2. open input file --------------------------------------------
-
-  srt = open(infile, "r")
+  # ---------- 2. open input file as a trajectory source -------------------
 
-  # ---------- 3. loop through lines of input file ---------------------------
-  bigcounter = 0
-  lasttime = 0
-  counter = 4
-  for line in srt:
+  # the source hands out one time slice, (cid, curx, cury), at a time;
+  # .srt files are streamed, parsed in the background while the slices
+  # are processed (or read into RAM if their .txt trace file is missing),
+  # GMSF/MMTS trace files (.txt) are interpolated on demand;
+  # infile may also be a source opened already
 
-  # ---------- 4. loop through words in each line of input file  
-  #               and load them into variables
+  source = traj_source.open_trace(infile, step, stream = True)
+  infile = source.infile
+  step = source.step
 
-    for word in line.split():
-          counter = counter + 1
-          if counter == 5:
-              counter = 1
-          if counter == 1:
-              bigcounter += 1
-              times.append(int(word))
-              if int(word) > lasttime:
-                simtimes.append(bigcounter - 1)
-                lasttime = int(word)
-          if counter == 2:
-              cid.append(int(word))           
-          if counter == 3:
-              curx.append(float(word))
-          if counter == 4:
-              cury.append(float(word))
+  # ---------- 3., 4. (parsing now done by traj_source.py) -------------------
 
-  srt.close()
+  # ---------- (now the input file, or its segment index, is in RAM) --------
 
-  # ---------- (now the entire input file is in RAM) -------------------------
+  if sim_time is None:
+    SIM_TIME = source.sim_time # (in steps)
+  else:
+    SIM_TIME = traj_source.to_steps(sim_time, step)
+  if region is None:
+    region = source.region
+  smz_steps = traj_source.to_steps(smz_duration, step) # smz_duration in steps
+  xmin, ymin, xmax, ymax = region
 
   # ---------- 5. initialize variables for gathering statistics --------------
 
@@ -287,7 +280,7 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
 
   # initialize all the arrays declared above
 
-  for i in range(min(cid),max(cid)+2):
+  for i in range(source.vmin,source.vmax+2):
   # note: index of array = v where v is vehicle number
   # note: there is no vehicle 0
     smz_grp.append(-1) # initialize all vehicles to belong to no group
@@ -315,11 +308,39 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
                 # and to determine how many vehciles entered smz
                 # but did not exit the region
   smz_count = []# the number of vehicles currently in each smz
+                # (one per smz up to the end of the trace, which may run
+                # a second or two past SIM_TIME because of rounding)
   glr_total = 0
   
-  for i in range(0, SIM_TIME/smz_duration + 2):
+  for i in range(0, max(SIM_TIME, source.tmax)/smz_steps + 2):
     smz_count.append(0) # initialize counters to zero
 
+  # ----- checkpoint / resume (see sweep_journal.py)
+  # all vehicle state lives in the lists below (and a few counters), so a
+  # copy taken at a time-slice boundary is enough to resume the loop there
+
+  state_lists = {"smz_grp": smz_grp, "k": k, "d_bar": d_bar,
+    "anon_duration": anon_duration, "anon_begin": anon_begin, "vehx": vehx,
+    "vehy": vehy, "veh_begin_x": veh_begin_x, "veh_begin_y": veh_begin_y,
+    "veh_end_x": veh_end_x, "veh_end_y": veh_end_y,
+    "smz_entry_time": smz_entry_time, "smz_exit_time": smz_exit_time,
+    "region_exit_time": region_exit_time, "veh_exit_flag": veh_exit_flag,
+    "smz_count": smz_count, "myleader": myleader, "seeking": seeking,
+    "glr_anon_time": glr_anon_time, "glr_anon_partner": glr_anon_partner}
+  ckey = (infile, smz_duration, smz_radius, smz_x, smz_y, SIM_TIME, region,
+    step, glr_seek_vid)
+  resume_t = None  # last time slice already processed
+  incom = 0
+  if checkpoint is not None:
+    saved = sweep_journal.load_state(checkpoint, ckey)
+    if saved is not None:
+      resume_t, (lists, scalars) = saved
+      for name in state_lists:
+        state_lists[name][:] = lists[name]
+      smz_total = scalars["smz_total"]
+      glr_total = scalars["glr_total"]
+      incom     = scalars["incom"]
+
   # ---------- 6. loop through all time slices, vehicles
   #               and calculate k, d_bar and anon_time for each vehicle
   #               as it exits the region
@@ -330,126 +351,138 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # are assigned smz_grp zero (0).
 
   last_smz_grp = -1
-  # ----- loop through entire set of times, cid, curx, cury arrays
-  for i in range (len(times)):
-    v = cid[i]
-    cur_smz_grp = times[i] / smz_duration # set current smz_grp (truncates)
-    vehx[v] = curx[i] # most recent x position of vehicle
-    vehy[v] = cury[i] # most recent y position of vehicle
-    if veh_begin_x[v] != -1:
-      veh_begin_x[v] = curx[i]
-      veh_begin_y[v] = cury[i]
-    veh_end_x[v] = curx[i]
-    veh_end_y[v] = cury[i]
-
-    # ----- check if vehicle is leader, seeker or anonymous
+  # ----- who is in comrange of whom does not depend on the silent period,
+  # so it is looked up in an index shared by all smz_durations (built on
+  # first use for this trace and comrange, see neighbour_index.py)
+  index = neighbour_index.neighbours(source, smz_radius, SIM_TIME)
+  # ----- loop through all time slices, and all records in each slice;
+  # near[near_first[i] : near_first[i+1]] is searched by incomrange()
+  first = None
+  if resume_t is not None:
+    first = resume_t + 1
+  for t, cid, curx, cury in source.slices(first):
+    near_first, near = index.slice(t)
+    if checkpoint is not None and t % checkpoint_every == 0:
+      sweep_journal.save_state(checkpoint, ckey, t - 1, (state_lists,
+        {"smz_total": smz_total, "glr_total": glr_total, "incom": incom}))
+    for i in range(len(cid)):
+      v = cid[i]
+      cur_smz_grp = t / smz_steps # set current smz_grp (truncates)
+      vehx[v] = curx[i] # most recent x position of vehicle
+      vehy[v] = cury[i] # most recent y position of vehicle
+      if veh_begin_x[v] != -1:
+        veh_begin_x[v] = curx[i]
+        veh_begin_y[v] = cury[i]
+      veh_end_x[v] = curx[i]
+      veh_end_y[v] = cury[i]
+
+      # ----- check if vehicle is leader, seeker or anonymous
     
-    comrange      = smz_radius
-    silent_period = smz_duration
+      comrange      = smz_radius
+      silent_period = smz_steps
     
-    if myleader[v] == -1:                    # leader not set
-      if times[i]+1 > SIM_TIME:
-        incom = incomrange("leader", v, curx[i], cury[i], comrange, simtimes[1999], simtimes[2000])
-      else:
-        incom = incomrange("leader", v, curx[i], cury[i], comrange, simtimes[times[i]], simtimes[times[i]+1])
-      if incom:
-        seeking[v] = 1 # seeking
-        myleader[v] = incom
-      else:
-        myleader[v] = v 
-        seeking[v] = 2 # leader
-    elif myleader[v] != v:                   # leader not self
-      if seeking[v] == 1: # seeking
-        if v > 1000:
-          if times[i]+1 > SIM_TIME-1:
-            incom = incomrange("seeker", v, curx[i], cury[i], comrange, simtimes[1999], simtimes[2000])
-          else:
-            incom = incomrange("seeker", v, curx[i], cury[i], comrange, simtimes[times[i]], simtimes[times[i]+1]) 
+      if myleader[v] == -1:                    # leader not set
+        incom = incomrange("leader", v, near[near_first[i]:near_first[i+1]])
         if incom:
-          seeking[v]       = 0 # no longer seeking, now anonymous
-          seeking[incom]   = 0
-          glr_total       += 2
-          # set anon start time
-          glr_anon_time[v]     = min(SIM_TIME, times[i] + silent_period)
-          glr_anon_time[incom] = min(SIM_TIME, times[i] + silent_period)
-          glr_anon_partner[v]  = incom
-
-    # gpc ===============================================================
-
-    # ----- check if vehicle is entering smz
+          seeking[v] = 1 # seeking
+          myleader[v] = incom
+        else:
+          myleader[v] = v 
+          seeking[v] = 2 # leader
+      elif myleader[v] != v:                   # leader not self
+        if seeking[v] == 1: # seeking
+          if source.ids[v] > glr_seek_vid:
+            incom = incomrange("seeker", v,
+              near[near_first[i]:near_first[i+1]])
+          if incom:
+            seeking[v]       = 0 # no longer seeking, now anonymous
+            seeking[incom]   = 0
+            glr_total       += 2
+            # set anon start time
+            glr_anon_time[v]     = min(SIM_TIME, t + silent_period)
+            glr_anon_time[incom] = min(SIM_TIME, t + silent_period)
+            glr_anon_partner[v]  = incom
+
+      # gpc ===============================================================
+
+      # ----- check if vehicle is entering smz
     
-    # if vehicle within range of (smz_x,smz_y) and no smz_grp assigned
-    if smz_radius > math.sqrt((float(curx[i]) - smz_x) ** 2 \
-      + (float(cury[i]) - smz_y) ** 2) and smz_grp[v] < 0 :
-      smz_grp[v] = cur_smz_grp # set current vehicle's smz_grp
-      smz_count[cur_smz_grp] += 1   # increment current smz_grp
-      anon_begin[v] = times[i] # set start time of anon period for vehicle
-      smz_total +=1
-      smz_entry_time[v] = times[i]
-      smz_exit_time[v] = (cur_smz_grp + 1) * smz_duration
+      # if vehicle within range of (smz_x,smz_y) and no smz_grp assigned
+      if smz_radius > math.sqrt((float(curx[i]) - smz_x) ** 2 \
+        + (float(cury[i]) - smz_y) ** 2) and smz_grp[v] < 0 :
+        smz_grp[v] = cur_smz_grp # set current vehicle's smz_grp
+        smz_count[cur_smz_grp] += 1   # increment current smz_grp
+        anon_begin[v] = t # set start time of anon period for vehicle
+        smz_total +=1
+        smz_entry_time[v] = t
+        smz_exit_time[v] = (cur_smz_grp + 1) * smz_steps
       
-    # cars end trajectory when they hit the edge of region (0 or 3000) 
-    # that's when we collect the statisics k, d_bar and anon_duration (kda)
-    # vehicles usually originate at edge of region at beginning of trajectory 
-    # but values get overwritten (unless the vehicle terminates inside region)
+      # cars end trajectory when they hit the edge of region (e.g. 0 or 3000) 
+      # that's when we collect the statisics k, d_bar and anon_duration (kda)
+      # vehicles usually originate at edge of region at beginning of trajectory 
+      # but values get overwritten (unless the vehicle terminates inside region)
 
-    # ----- check if vehicle is exiting region
+      # ----- check if vehicle is exiting region
 
-    # check if vehicle is exiting region is within 20 m of edge
-    # vehicles move at about 20 m/s (~45 mph),
-    # program uses 1 sec time intervals,
-    # therefore often a vehicle is near region boundary for > 1 sec
+      # check if vehicle is exiting region is within 20 m of edge
+      # vehicles move at about 20 m/s (~45 mph),
+      # program uses 1 sec time intervals (time steps of step seconds),
+      # therefore often a vehicle is near region boundary for > 1 sec
     
-    edge_threshold = 20 
-    if curx[i] < 0 + edge_threshold \
-      or curx[i] > 3000 - edge_threshold \
-      or cury[i] < 0 + edge_threshold \
-      or cury[i] > 3000 - edge_threshold:
+      edge_threshold = 20 
+      if curx[i] < xmin + edge_threshold \
+        or curx[i] > xmax - edge_threshold \
+        or cury[i] < ymin + edge_threshold \
+        or cury[i] > ymax - edge_threshold:
       
-      # compute stats only if v was assigned a group
-      # and not exited already
-      if smz_grp[v] > -1 and veh_exit_flag[v] == 0: 
-        veh_exit_flag[v] = 1
-        region_exit_time[v] = times[i]
+        # compute stats only if v was assigned a group
+        # and not exited already
+        if smz_grp[v] > -1 and veh_exit_flag[v] == 0: 
+          veh_exit_flag[v] = 1
+          region_exit_time[v] = t
         
-        # ----- compute k -----
+          # ----- compute k -----
         
-        k[v] = smz_count[smz_grp[v]] # should be same as d_count+1
-        smz_count[smz_grp[v]] -= 1   # decrement vehicle's smz_grp
+          k[v] = smz_count[smz_grp[v]] # should be same as d_count+1
+          smz_count[smz_grp[v]] -= 1   # decrement vehicle's smz_grp
           
-        # ----- compute d_bar -----
+          # ----- compute d_bar -----
         
-        d_sum = 0                              # compute d_bar
-        d_count = 0                            # d_count == k - 1
-        # loop through all vehicles... if vehicle was anonymized...
-        # and vehicle is active... and vehicle is not current vehicle...
-        # and vehicle is in same smz_grp as current vehicle
-        for j in range(min(cid),max(cid)+1):   
-          if smz_grp[j] > -1 and vehx[j] > -1  and v != j \
-            and smz_grp[j] == smz_grp[v] :               
-            # sum distances from current vehicle (the one exiting the region)
-            # to each of the other vehicles in its group 
-            d_sum = d_sum + math.sqrt( (float(curx[i]) - vehx[j]) ** 2 \
-              + (float(cury[i]) - vehy[j]) ** 2 ) # increment d_sum
-            d_count += 1                          # increment d_count
-        if d_sum > 0 and k[v] > 0:
-          d_bar[v] = float(d_sum) / k[v]    # d_bar for vehicle set here
-          d_bar[v] = float(d_sum) / (d_count + 1) # d_bar for vehicle set here
-                                                      # d_count == k - 1
-          k[v] = d_count + 1
+          d_sum = 0                              # compute d_bar
+          d_count = 0                            # d_count == k - 1
+          # loop through all vehicles... if vehicle was anonymized...
+          # and vehicle is active... and vehicle is not current vehicle...
+          # and vehicle is in same smz_grp as current vehicle
+          for j in range(source.vmin,source.vmax+1):   
+            if smz_grp[j] > -1 and vehx[j] > -1  and v != j \
+              and smz_grp[j] == smz_grp[v] :               
+              # sum distances from current vehicle (the one exiting the region)
+              # to each of the other vehicles in its group 
+              d_sum = d_sum + math.sqrt( (float(curx[i]) - vehx[j]) ** 2 \
+                + (float(cury[i]) - vehy[j]) ** 2 ) # increment d_sum
+              d_count += 1                          # increment d_count
+          if d_sum > 0 and k[v] > 0:
+            d_bar[v] = float(d_sum) / k[v]    # d_bar for vehicle set here
+            d_bar[v] = float(d_sum) / (d_count + 1) # d_bar for vehicle set here
+                                                        # d_count == k - 1
+            k[v] = d_count + 1
 
         
-        # ----- compute anon_duration -----
+          # ----- compute anon_duration -----
         
-        if region_exit_time[v] > smz_exit_time[v]:
-          anon_duration[v] = region_exit_time[v] - smz_exit_time[v]
-        else:
-          anon_duration[v] = 0
+          if region_exit_time[v] > smz_exit_time[v]:
+            anon_duration[v] = traj_source.to_seconds( \
+              region_exit_time[v] - smz_exit_time[v], step)
+          else:
+            anon_duration[v] = 0
 
-        # ----- deactivate vehicle -----
+          # ----- deactivate vehicle -----
         
-        vehx[v] = -2
-        vehy[v] = -2
+          vehx[v] = -2
+          vehy[v] = -2
+
+  if checkpoint is not None:
+    sweep_journal.clear_state(checkpoint)
 
   # ---------- (now all statistical data are in RAM) -------------------------
 
@@ -465,16 +498,16 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   counter_indiv = 0
 
   sta = open(outfile, "w")    
-  for v in range(min(cid),max(cid)+1):
+  for v in range(source.vmin,source.vmax+1):
     # if smz_grp[v] == 0: # uncomment to write just one smz
-      s  = str(v) # vehicle id
+      s  = str(source.ids[v]) # vehicle id (as in the input file)
       if k[v] < 1:
         k[v] = 1
       s += " " + str(k[v]) # anonymity set size
       s += " " + str(d_bar[v]) # avg dist of decoys at end of i' trajectory
       s += " " + str(anon_duration[v]) # length of time possible for anon LBS
-      s += " " + str(smz_exit_time[v])
-      s += " " + str(region_exit_time[v])
+      s += " " + str(traj_source.to_seconds(smz_exit_time[v], step))
+      s += " " + str(traj_source.to_seconds(region_exit_time[v], step))
       s += " " + str(veh_end_x[v])
       s += " " + str(veh_end_y[v])
       s += " " + str(smz_grp[v])
@@ -502,82 +535,157 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # " - anon-only-kda: ", avg_k, avg_d, avg_a, anon vehicles (counter_indiv),
   # number of anonymized vehicles that never exited region (count_total)
   
-##  print ("SMZ parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
-##    float(k_sum) / counter, float(d_sum) / counter, float(a_sum) / counter, \
-##    counter, " - anon-only-kda:", float(k_sum_indiv) / counter_indiv, \
-##    float(d_sum_indiv) / counter_indiv, float(a_sum_indiv) / counter_indiv, \
-##    counter_indiv, count_total)
+  if dual:
+    smz_result = ("parms:", infile, smz_duration, smz_radius, \
+      " - tot-sys-kda:", float(k_sum) / counter, float(d_sum) / counter, \
+      float(a_sum) / counter, counter, " - anon-only-kda:", \
+      float(k_sum_indiv) / counter_indiv, float(d_sum_indiv) / counter_indiv, \
+      float(a_sum_indiv) / counter_indiv, counter_indiv, count_total)
+    print (smz_result)
+
+  # ----- vehicle-state table as arrays (index = vehicle number) -----
+
+  exit_time = numpy.array(region_exit_time) # (in steps)
+  end_x     = numpy.array(veh_end_x, dtype = float)
+  end_y     = numpy.array(veh_end_y, dtype = float)
+  anon_time = numpy.array(glr_anon_time)
+  partner   = numpy.array(glr_anon_partner)
 
   # ----- compute GLR anonymity distance ----
 
-  glr_anon_dist = 0
-  for q in range(len(glr_anon_partner)):
-    if glr_anon_partner[q] > 0:
-      departdiff = abs(region_exit_time[q] - region_exit_time[glr_anon_partner[q]])
-      x1 = veh_end_x[glr_anon_partner[q]]
-      y1 = veh_end_y[glr_anon_partner[q]]
-      x2 = veh_end_x[q]
-      y2 = veh_end_y[q]
-      departdist = math.sqrt( (float(x1) - x2) ** 2 + (float(y1) - y2) ** 2 )
-      glr_anon_dist += departdist - departdiff / 20 # speed = 20 m /s
+  # for each vehicle q with a partner p: distance between the points where
+  # q and p left the region, less 20 m (speed = 20 m/s) per whole second
+  # between their departures. the sums below add the values in vehicle
+  # order, like a loop over q would, so the totals do not depend on numpy
+
+  paired = numpy.nonzero(partner > 0)[0]
+  p = partner[paired]
+  departdiff = numpy.abs(exit_time[paired] - exit_time[p]) * step # seconds
+  departdist = numpy.sqrt((end_x[p] - end_x[paired]) ** 2 \
+    + (end_y[p] - end_y[paired]) ** 2)
+  glr_anon_dist = sum((departdist - departdiff // 20).tolist())
+
+  # distributions over pairs: counts per DIST_BIN meters of departure
+  # distance, and per GAP_BIN seconds between departures
+  glr_dist_hist = numpy.bincount((departdist // DIST_BIN).astype(int),
+    minlength = 1).tolist()
+  glr_gap_hist  = numpy.bincount((departdiff // GAP_BIN).astype(int),
+    minlength = 1).tolist()
     
   # ----- compute GLR anonymity time -----
 
-  glr_anon_total = 0
-  for q in range(len(glr_anon_time)):
-    if region_exit_time[q] > glr_anon_time[q]:
-      glr_anon_total += region_exit_time[q] - glr_anon_time[q]
+  anon_for = exit_time - anon_time
+  glr_anon_total = traj_source.to_seconds(
+    sum(anon_for[anon_for > 0].tolist()), step)
+
+  # ----- write GLR statistics per vehicle -----
+
+  # vehicle id, partner (0 = none), time it became anonymous (-1 = never),
+  # region exit time (-1 = never), anonymity time (0 if none) and distance
+  # between its and its partner's departure points (-1 = no partner);
+  # times in seconds
+
+  if glr_outfile is not None:
+    dist = numpy.zeros(len(partner)) - 1
+    dist[paired] = departdist
+    glr = open(glr_outfile, "w")
+    for v in range(source.vmin,source.vmax+1):
+      s  = str(source.ids[v])
+      s += " " + str(source.ids[glr_anon_partner[v]])
+      s += " " + str(traj_source.to_seconds(glr_anon_time[v], step))
+      s += " " + str(traj_source.to_seconds(region_exit_time[v], step))
+      s += " " + str(traj_source.to_seconds(int(max(anon_for[v], 0)), step))
+      s += " " + str(dist[v])
+      glr.write(s + "\n")
+    glr.close()
+
+  # ----- write the GLR pair distributions -----
+
+  # one line per bin: dist (departure distance) or gap (departure time
+  # gap), the lower bound of the bin (m or s) and the number of pairs
+
+  if hist_outfile is not None:
+    hst = open(hist_outfile, "w")
+    for i in range(len(glr_dist_hist)):
+      hst.write("dist %d %d\n" % (i * DIST_BIN, glr_dist_hist[i]))
+    for i in range(len(glr_gap_hist)):
+      hst.write("gap %d %d\n" % (i * GAP_BIN, glr_gap_hist[i]))
+    hst.close()
 
   # for glr, infile is same as smz, silent_period = smz_duration, and
   # smz_radius = comrange. counter is same as for smz. counter_indiv = glr_total.
-  print ("GLR parms:", infile, smz_duration, smz_radius, " - tot-sys-kdt:", \
+  result = ("GLR parms:", infile, smz_duration, smz_radius, " - tot-sys-kdt:", \
     2*float(glr_total) / counter, glr_anon_dist / counter, float(glr_anon_total) / counter, \
     counter, " - anon-only-kda:", 2*float(glr_total) / glr_total, \
     float(glr_anon_dist) / glr_total, float(glr_anon_total) / glr_total, \
     glr_total, "na")
+  print (result)
+  if dual:
+    return (smz_result, result)
+  return result
 
 
 # ========== 0. main =======================================================
 
-print (time.ctime()) # beginning of program
+# (only when run as a program, so smz_stats can be imported, e.g. by
+# batch_run.py)
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+
+  # completed parameter sets are kept in calc_glr.journal and skipped when the
+  # program is run again; an interrupted parameter set resumes from its last
+  # checkpoint, calc_glr.ckpt (see sweep_journal.py)
+
+  journal = sweep_journal.Journal("calc_glr.journal")
 
-# SIM_TIME is 2000 seconds so smz_duration of  25 means 80   smz's
-# SIM_TIME is 2000 seconds so smz_duration of  50 means 40   smz's
-# SIM_TIME is 2000 seconds so smz_duration of  75 means 26.7 smz's
-# SIM_TIME is 2000 seconds so smz_duration of 100 means 20   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  25 means 80   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  50 means 40   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  75 means 26.7 smz's
+  # SIM_TIME is 2000 seconds so smz_duration of 100 means 20   smz's
 
-# SIM_WIDTH is 3000 meters so smz_radius of  50 is 1.6%
-# SIM_WIDTH is 3000 meters so smz_radius of 100 is 3.3%
-# SIM_WIDTH is 3000 meters so smz_radius of 150 is 5.0%
+  # SIM_WIDTH is 3000 meters so smz_radius of  50 is 1.6%
+  # SIM_WIDTH is 3000 meters so smz_radius of 100 is 3.3%
+  # SIM_WIDTH is 3000 meters so smz_radius of 150 is 5.0%
 
-# rural
+  # rural
 
-sx = 2290
-sy = 800
-inf = "rural.srt"
+  sx = 2290
+  sy = 800
+  inf = "rural.srt"
 
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("GLR parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_glr.ckpt", hist_outfile = "%s_%d_%d.hst"
+        % (inf[:-4], smz_duration, smz_radius))
 
-# urban
+  # urban
 
-sx = 1430
-sy = 2490
-inf = "urban.srt"
+  sx = 1430
+  sy = 2490
+  inf = "urban.srt"
 
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("GLR parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_glr.ckpt", hist_outfile = "%s_%d_%d.hst"
+        % (inf[:-4], smz_duration, smz_radius))
 
-# city
+  # city
 
-sx = 390
-sy = 1710
-inf = "city.srt"
+  sx = 390
+  sy = 1710
+  inf = "city.srt"
 
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("GLR parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_glr.ckpt", hist_outfile = "%s_%d_%d.hst"
+        % (inf[:-4], smz_duration, smz_radius))
 
-print (time.ctime()) # ===== end of program =====
+  print (time.ctime()) # ===== end of program =====
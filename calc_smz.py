@@ -29,6 +29,9 @@
 #                    described in the "program output" section below
 # 
 # Input file    : a sorted, fully enumerated trajectory file (.srt) of the form
+#                 (or the GMSF/MMTS trace file itself, e.g. city.txt, in which
+#                 case steps c.-e. above are skipped and the positions are
+#                 generated on demand, see traj_source.py)
 #
 #                 0 1 1435.34 1539.1
 # 
@@ -42,11 +45,10 @@
 #                 a complete set of (x, y, t) positions
 #
 # Processing    : 1. initialize variables
-#                 2. open input file
-#                 3. loop through lines of input file
-#                 4. loop through words in each line of input file
-#                    and load them into variables
-#                    (now the entire input file is in RAM)
+#                 2. open input file as a trajectory source
+#                 3. (removed, see traj_source.py)
+#                 4. (removed, see traj_source.py)
+#                    (now the input file, or its index, is in RAM)
 #                 5. initialize variables for gathering statistics
 #                 6. loop through all time slices, vehicles
 #                    and calculate k, d_bar and anon_time for each vehicle
@@ -105,15 +107,28 @@
 import math
 import time
 
-def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
+import sweep_journal
+import traj_source
+
+def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile,
+  region = None, sim_time = None, outfile = "calc_kda_smz.sta",
+  checkpoint = None, checkpoint_every = 100, step = None):
    
   # ---------- 1. initialize variables --------------------------------------
 
   v = 1                  # vehicle number (note: there is no vehicle "0")
   # infile = "rural.srt" # should be city.srt, urban.srt, or rural.srt
-  outfile = "calc_kda_smz.sta"
-  SIM_TIME = 2000        # this is total simulation time of city, urban, rural
-                         # files from gmsf.sourceforge.net
+  # outfile = "calc_kda_smz.sta" # one .sta file per parameter set is
+                                  # needed for sta_bootstrap.py
+  # SIM_TIME (total simulation time, 2000 s for the city, urban, rural
+  # files from gmsf.sourceforge.net) and the region (xmin, ymin, xmax, ymax),
+  # (0, 0, 3000, 3000) for the same files, come from the trace metadata
+  # (see traj_source.py) unless given as sim_time and region
+
+  # step (seconds per time step, default 1) is the time resolution: the
+  # loop below runs over time steps, and times are kept in steps until
+  # they are written out in seconds (see traj_source.py). With sub-second
+  # steps, pass the GMSF/MMTS trace file (.txt) rather than a .srt file
 
   # ----- USER-DEFINED VARIABLES -----
   # change these in ===== main ===== section at bottom of this code
@@ -123,44 +138,33 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # smz_x        = 2290  # city:  390, urban: 1430, rural: 2290
   # smz_y        =  800  # city: 1710, urban: 2490, rural:  800
 
-  # speed of cars is around 20 m/s, width of region is 3000 m,
+  # speed of cars is around 20 m/s, width of region is (e.g.) 3000 m,
   # so a car could possibly traverse the region in 3000/20 = 150 seconds
 
-  # the arrays below contain hundreds of thousands of elements, len(times)
-
-  times = [] # time
-  cid   = [] # vehicle id
-  curx  = [] # x position at time
-  cury  = [] # y position at time
-
-  # ---------- 2. open input file --------------------------------------------
+  # ---------- 2. open input file as a trajectory source -------------------
 
-  srt = open(infile, "r")
+  # the source hands out one time slice, (cid, curx, cury), at a time;
+  # .srt files are streamed, parsed in the background while the slices
+  # are processed (or read into RAM if their .txt trace file is missing),
+  # GMSF/MMTS trace files (.txt) are interpolated on demand;
+  # infile may also be a source opened already
 
-  # ---------- 3. loop through lines of input file ---------------------------
+  source = traj_source.open_trace(infile, step, stream = True)
+  infile = source.infile
+  step = source.step
 
-  counter = 4
-  for line in srt:
+  # ---------- 3., 4. (parsing now done by traj_source.py) -------------------
 
-  # ---------- 4. loop through words in each line of input file  
-  #               and load them into variables
+  # ---------- (now the input file, or its segment index, is in RAM) --------
 
-    for word in line.split():
-          counter = counter + 1
-          if counter == 5:
-              counter = 1
-          if counter == 1:
-              times.append(int(word))
-          if counter == 2:
-              cid.append(int(word))           
-          if counter == 3:
-              curx.append(float(word))
-          if counter == 4:
-              cury.append(float(word))
-
-  srt.close()
-
-  # ---------- (now the entire input file is in RAM) -------------------------
+  if sim_time is None:
+    SIM_TIME = source.sim_time # (in steps)
+  else:
+    SIM_TIME = traj_source.to_steps(sim_time, step)
+  if region is None:
+    region = source.region
+  smz_steps = traj_source.to_steps(smz_duration, step) # smz_duration in steps
+  xmin, ymin, xmax, ymax = region
 
   # ---------- 5. initialize variables for gathering statistics --------------
 
@@ -191,7 +195,7 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
 
   # initialize all the arrays declared above
 
-  for i in range(min(cid),max(cid)+2):
+  for i in range(source.vmin,source.vmax+2):
   # note: index of array = v where v is vehicle number
   # note: there is no vehicle 0
     smz_grp.append(-1) # initialize all vehicles to belong to no group
@@ -215,10 +219,34 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
                 # and to determine how many vehciles entered smz
                 # but did not exit the region
   smz_count = []# the number of vehicles currently in each smz
+                # (one per smz up to the end of the trace, which may run
+                # a second or two past SIM_TIME because of rounding)
   
-  for i in range(0, SIM_TIME/smz_duration + 2):
+  for i in range(0, max(SIM_TIME, source.tmax)/smz_steps + 2):
     smz_count.append(0) # initialize counters to zero
 
+  # ----- checkpoint / resume (see sweep_journal.py)
+  # all vehicle state lives in the lists below (and a few counters), so a
+  # copy taken at a time-slice boundary is enough to resume the loop there
+
+  state_lists = {"smz_grp": smz_grp, "k": k, "d_bar": d_bar,
+    "anon_duration": anon_duration, "anon_begin": anon_begin, "vehx": vehx,
+    "vehy": vehy, "veh_begin_x": veh_begin_x, "veh_begin_y": veh_begin_y,
+    "veh_end_x": veh_end_x, "veh_end_y": veh_end_y,
+    "smz_entry_time": smz_entry_time, "smz_exit_time": smz_exit_time,
+    "region_exit_time": region_exit_time, "veh_exit_flag": veh_exit_flag,
+    "smz_count": smz_count}
+  ckey = (infile, smz_duration, smz_radius, smz_x, smz_y, SIM_TIME, region,
+    step)
+  resume_t = None  # last time slice already processed
+  if checkpoint is not None:
+    saved = sweep_journal.load_state(checkpoint, ckey)
+    if saved is not None:
+      resume_t, (lists, scalars) = saved
+      for name in state_lists:
+        state_lists[name][:] = lists[name]
+      smz_total = scalars["smz_total"]
+
   # ---------- 6. loop through all time slices, vehicles
   #               and calculate k, d_bar and anon_time for each vehicle
   #               as it exits the region
@@ -229,93 +257,104 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # are assigned smz_grp zero (0).
 
   last_smz_grp = -1
-  # ----- loop through entire set of times, cid, curx, cury arrays
-  for i in range (len(times)):
-    v = cid[i]
-    cur_smz_grp = times[i] / smz_duration # set current smz_grp (truncates)
-    vehx[v] = curx[i] # most recent x position of vehicle
-    vehy[v] = cury[i] # most recent y position of vehicle
-    if veh_begin_x[v] != -1:
-      veh_begin_x[v] = curx[i]
-      veh_begin_y[v] = cury[i]
-    veh_end_x[v] = curx[i]
-    veh_end_y[v] = cury[i]
-
-    # ----- check if vehicle is entering smz
+  # ----- loop through all time slices, and all records in each slice
+  first = None
+  if resume_t is not None:
+    first = resume_t + 1
+  for t, cid, curx, cury in source.slices(first):
+    if checkpoint is not None and t % checkpoint_every == 0:
+      sweep_journal.save_state(checkpoint, ckey, t - 1, (state_lists,
+        {"smz_total": smz_total}))
+    for i in range(len(cid)):
+      v = cid[i]
+      cur_smz_grp = t / smz_steps # set current smz_grp (truncates)
+      vehx[v] = curx[i] # most recent x position of vehicle
+      vehy[v] = cury[i] # most recent y position of vehicle
+      if veh_begin_x[v] != -1:
+        veh_begin_x[v] = curx[i]
+        veh_begin_y[v] = cury[i]
+      veh_end_x[v] = curx[i]
+      veh_end_y[v] = cury[i]
+
+      # ----- check if vehicle is entering smz
     
-    # if vehicle within range of (smz_x,smz_y) and no smz_grp assigned
-    if smz_radius > math.sqrt((float(curx[i]) - smz_x) ** 2 \
-      + (float(cury[i]) - smz_y) ** 2) and smz_grp[v] < 0 :
-      smz_grp[v] = cur_smz_grp # set current vehicle's smz_grp
-      smz_count[cur_smz_grp] += 1   # increment current smz_grp
-      anon_begin[v] = times[i] # set start time of anon period for vehicle
-      smz_total +=1
-      smz_entry_time[v] = times[i]
-      smz_exit_time[v] = (cur_smz_grp + 1) * smz_duration
+      # if vehicle within range of (smz_x,smz_y) and no smz_grp assigned
+      if smz_radius > math.sqrt((float(curx[i]) - smz_x) ** 2 \
+        + (float(cury[i]) - smz_y) ** 2) and smz_grp[v] < 0 :
+        smz_grp[v] = cur_smz_grp # set current vehicle's smz_grp
+        smz_count[cur_smz_grp] += 1   # increment current smz_grp
+        anon_begin[v] = t # set start time of anon period for vehicle
+        smz_total +=1
+        smz_entry_time[v] = t
+        smz_exit_time[v] = (cur_smz_grp + 1) * smz_steps
       
-    # cars end trajectory when they hit the edge of region (0 or 3000) 
-    # that's when we collect the statisics k, d_bar and anon_duration (kda)
-    # vehicles usually originate at edge of region at beginning of trajectory 
-    # but values get overwritten (unless the vehicle terminates inside region)
+      # cars end trajectory when they hit the edge of region (e.g. 0 or 3000) 
+      # that's when we collect the statisics k, d_bar and anon_duration (kda)
+      # vehicles usually originate at edge of region at beginning of trajectory 
+      # but values get overwritten (unless the vehicle terminates inside region)
 
-    # ----- check if vehicle is exiting region
+      # ----- check if vehicle is exiting region
 
-    # check if vehicle is exiting region is within 20 m of edge
-    # vehicles move at about 20 m/s (~45 mph),
-    # program uses 1 sec time intervals,
-    # therefore often a vehicle is near region boundary for > 1 sec
+      # check if vehicle is exiting region is within 20 m of edge
+      # vehicles move at about 20 m/s (~45 mph),
+      # program uses 1 sec time intervals (time steps of step seconds),
+      # therefore often a vehicle is near region boundary for > 1 sec
     
-    edge_threshold = 20 
-    if curx[i] < 0 + edge_threshold \
-      or curx[i] > 3000 - edge_threshold \
-      or cury[i] < 0 + edge_threshold \
-      or cury[i] > 3000 - edge_threshold:
+      edge_threshold = 20 
+      if curx[i] < xmin + edge_threshold \
+        or curx[i] > xmax - edge_threshold \
+        or cury[i] < ymin + edge_threshold \
+        or cury[i] > ymax - edge_threshold:
       
-      # compute stats only if v was assigned a group
-      # and not exited already
-      if smz_grp[v] > -1 and veh_exit_flag[v] == 0: 
-        veh_exit_flag[v] = 1
-        region_exit_time[v] = times[i]
+        # compute stats only if v was assigned a group
+        # and not exited already
+        if smz_grp[v] > -1 and veh_exit_flag[v] == 0: 
+          veh_exit_flag[v] = 1
+          region_exit_time[v] = t
         
-        # ----- compute k -----
+          # ----- compute k -----
         
-        k[v] = smz_count[smz_grp[v]] # should be same as d_count+1
-        smz_count[smz_grp[v]] -= 1   # decrement vehicle's smz_grp
+          k[v] = smz_count[smz_grp[v]] # should be same as d_count+1
+          smz_count[smz_grp[v]] -= 1   # decrement vehicle's smz_grp
           
-        # ----- compute d_bar -----
+          # ----- compute d_bar -----
         
-        d_sum = 0                              # compute d_bar
-        d_count = 0                            # d_count == k - 1
-        # loop through all vehicles... if vehicle was anonymized...
-        # and vehicle is active... and vehicle is not current vehicle...
-        # and vehicle is in same smz_grp as current vehicle
-        for j in range(min(cid),max(cid)+1):   
-          if smz_grp[j] > -1 and vehx[j] > -1  and v != j \
-            and smz_grp[j] == smz_grp[v] :               
-            # sum distances from current vehicle (the one exiting the region)
-            # to each of the other vehicles in its group 
-            d_sum = d_sum + math.sqrt( (float(curx[i]) - vehx[j]) ** 2 \
-              + (float(cury[i]) - vehy[j]) ** 2 ) # increment d_sum
-            d_count += 1                          # increment d_count
-        if d_sum > 0 and k[v] > 0:
-          d_bar[v] = float(d_sum) / k[v]    # d_bar for vehicle set here
-          d_bar[v] = float(d_sum) / (d_count + 1) # d_bar for vehicle set here
-                                                      # d_count == k - 1
-          k[v] = d_count + 1
-          if d_bar[v] > 3000:
-            print v
+          d_sum = 0                              # compute d_bar
+          d_count = 0                            # d_count == k - 1
+          # loop through all vehicles... if vehicle was anonymized...
+          # and vehicle is active... and vehicle is not current vehicle...
+          # and vehicle is in same smz_grp as current vehicle
+          for j in range(source.vmin,source.vmax+1):   
+            if smz_grp[j] > -1 and vehx[j] > -1  and v != j \
+              and smz_grp[j] == smz_grp[v] :               
+              # sum distances from current vehicle (the one exiting the region)
+              # to each of the other vehicles in its group 
+              d_sum = d_sum + math.sqrt( (float(curx[i]) - vehx[j]) ** 2 \
+                + (float(cury[i]) - vehy[j]) ** 2 ) # increment d_sum
+              d_count += 1                          # increment d_count
+          if d_sum > 0 and k[v] > 0:
+            d_bar[v] = float(d_sum) / k[v]    # d_bar for vehicle set here
+            d_bar[v] = float(d_sum) / (d_count + 1) # d_bar for vehicle set here
+                                                        # d_count == k - 1
+            k[v] = d_count + 1
+            if d_bar[v] > xmax - xmin:
+              print v
         
-        # ----- compute anon_duration -----
+          # ----- compute anon_duration -----
         
-        if region_exit_time[v] > smz_exit_time[v]:
-          anon_duration[v] = region_exit_time[v] - smz_exit_time[v]
-        else:
-          anon_duration[v] = 0
+          if region_exit_time[v] > smz_exit_time[v]:
+            anon_duration[v] = traj_source.to_seconds( \
+              region_exit_time[v] - smz_exit_time[v], step)
+          else:
+            anon_duration[v] = 0
 
-        # ----- deactivate vehicle -----
+          # ----- deactivate vehicle -----
         
-        vehx[v] = -2
-        vehy[v] = -2
+          vehx[v] = -2
+          vehy[v] = -2
+
+  if checkpoint is not None:
+    sweep_journal.clear_state(checkpoint)
 
   # ---------- (now all statistical data are in RAM) -------------------------
 
@@ -331,16 +370,16 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   counter_indiv = 0
 
   sta = open(outfile, "w")    
-  for v in range(min(cid),max(cid)+1):
+  for v in range(source.vmin,source.vmax+1):
     # if smz_grp[v] == 0: # uncomment to write just one smz
-      s  = str(v) # vehicle id
+      s  = str(source.ids[v]) # vehicle id (as in the input file)
       if k[v] < 1:
         k[v] = 1
       s += " " + str(k[v]) # anonymity set size
       s += " " + str(d_bar[v]) # avg dist of decoys at end of i' trajectory
       s += " " + str(anon_duration[v]) # length of time possible for anon LBS
-      s += " " + str(smz_exit_time[v])
-      s += " " + str(region_exit_time[v])
+      s += " " + str(traj_source.to_seconds(smz_exit_time[v], step))
+      s += " " + str(traj_source.to_seconds(region_exit_time[v], step))
       s += " " + str(veh_end_x[v])
       s += " " + str(veh_end_y[v])
       s += " " + str(smz_grp[v])
@@ -368,52 +407,71 @@ def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile):
   # " - anon-only-kda: ", avg_k, avg_d, avg_a, anon vehicles (counter_indiv),
   # number of anonymized vehicles that never exited region (count_total)
   
-  print ("parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
+  result = ("parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
     float(k_sum) / counter, float(d_sum) / counter, float(a_sum) / counter, \
     counter, " - anon-only-kda:", float(k_sum_indiv) / counter_indiv, \
     float(d_sum_indiv) / counter_indiv, float(a_sum_indiv) / counter_indiv, \
     counter_indiv, count_total)
+  print (result)
+  return result
 
 
 # ========== 0. main =======================================================
 
-print (time.ctime()) # beginning of program
+# (only when run as a program, so smz_stats can be imported, e.g. by
+# batch_run.py)
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+
+  # completed parameter sets are kept in calc_smz.journal and skipped when the
+  # program is run again; an interrupted parameter set resumes from its last
+  # checkpoint, calc_smz.ckpt (see sweep_journal.py)
+
+  journal = sweep_journal.Journal("calc_smz.journal")
 
-# SIM_TIME is 2000 seconds so smz_duration of  25 means 80   smz's
-# SIM_TIME is 2000 seconds so smz_duration of  50 means 40   smz's
-# SIM_TIME is 2000 seconds so smz_duration of  75 means 26.7 smz's
-# SIM_TIME is 2000 seconds so smz_duration of 100 means 20   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  25 means 80   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  50 means 40   smz's
+  # SIM_TIME is 2000 seconds so smz_duration of  75 means 26.7 smz's
+  # SIM_TIME is 2000 seconds so smz_duration of 100 means 20   smz's
 
-# SIM_WIDTH is 3000 meters so smz_radius of  50 is 1.6%
-# SIM_WIDTH is 3000 meters so smz_radius of 100 is 3.3%
-# SIM_WIDTH is 3000 meters so smz_radius of 150 is 5.0%
+  # SIM_WIDTH is 3000 meters so smz_radius of  50 is 1.6%
+  # SIM_WIDTH is 3000 meters so smz_radius of 100 is 3.3%
+  # SIM_WIDTH is 3000 meters so smz_radius of 150 is 5.0%
 
-# rural
+  # rural
 
-sx = 2290
-sy = 800
-inf = "rural.srt"
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  sx = 2290
+  sy = 800
+  inf = "rural.srt"
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_smz.ckpt")
 
-# urban
+  # urban
 
-sx = 1430
-sy = 2490
-inf = "urban.srt"
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  sx = 1430
+  sy = 2490
+  inf = "urban.srt"
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_smz.ckpt")
 
-# city
+  # city
 
-sx = 390
-sy = 1710
-inf = "city.srt"
+  sx = 390
+  sy = 1710
+  inf = "city.srt"
 
-for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
-  for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
-    smz_stats(smz_duration, smz_radius, sx, sy, inf)
+  for smz_duration in range(20, 120, 20): # [20, 40, 60, 80, 100]
+    for smz_radius in range(30, 180, 30): # [30, 60, 90, 120, 150]
+      journal.run(sweep_journal.cell_key("parms:", inf, smz_duration,
+        smz_radius, sx, sy), smz_stats, smz_duration, smz_radius, sx, sy,
+        inf, checkpoint = "calc_smz.ckpt")
 
-print (time.ctime()) # ===== end of program =====
+  print (time.ctime()) # ===== end of program =====
@@ -0,0 +1,339 @@
+# --------------------------------------------------------------------------
+# Filename      : engine_check.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Equivalence and regression check of the SMZ and GLR
+#                 engines against the scalar reference engines (calc_smz.py,
+#                 calc_glr.py) and the recorded results (calc.txt,
+#                 calc_smz.output, calc_glr.output).
+#
+#                 For each trace and parameter cell the engine under test
+#                 and the reference engine of its model are run on the same
+#                 trajectory source, each timed. The result tuple of the
+#                 engine is compared with the recorded one for the same
+#                 model, trace (file name) and cell if there is one, else
+#                 with the reference engine's; its .sta file is compared
+#                 row by row (per vehicle) with the reference engine's, or
+#                 with the file of the cell in a directory of recorded .sta
+#                 files (named as batch_run.py names them).
+#
+#                 Both engines start without cached GLR neighbour indexes
+#                 (see neighbour_index.py), so neither is timed with the
+#                 other's.
+#
+#                 Numbers match if they differ by at most tolerance times
+#                 the larger of them (0: exactly); engines that add up in
+#                 another order (smz_online.py) need ~1e-12.
+#
+#                 engines: smz, glr (the reference engines themselves),
+#                 events (smz_events.py, GMSF/MMTS traces only), online
+#                 (smz_online.py, no .sta file), dual and dual-glr (the
+#                 SMZ and GLR results of one calc_glr.py dual pass), batch
+#                 and batch-glr (all cells of the trace at once, in
+#                 parallel, by batch_run.py), parallel (one cell at a time,
+#                 in windows of time run in parallel, by smz_parallel.py)
+#
+# Output print  : one line per cell,
+#
+#                 ('check:', 'events', 'rural.txt', 20, 30, 'same',
+#                   'recorded', 0, ' - sta rows:', 1142, 0)
+#
+#                 (same, within tolerance or differs; against the recorded
+#                 or the reference result; fields that differ; .sta rows
+#                 compared and those that differ), followed by each
+#                 difference, then the times per trace:
+#
+#                 ('speed:', 'events', 'rural.txt', 2.81, 0.33, 8.5)
+#
+#                 (reference and engine seconds, speedup)
+#
+# Usage         : python engine_check.py events rural.txt 2290 800
+#                   20,60,100 30,90,150 [tolerance] [sta_dir]
+#
+#                 ok = check("online", "rural.srt", 2290, 800,
+#                   [(20, 30), (60, 90)], tolerance = 1e-12)
+#
+# --------------------------------------------------------------------------
+
+import os
+import ast
+import sys
+import time
+import shutil
+import tempfile
+
+import batch_run
+import calc_glr
+import calc_smz
+import traj_source
+
+
+BASELINES = ["calc.txt", "calc_smz.output", "calc_glr.output"]
+
+LABELS = {"smz": "parms:", "glr": "GLR parms:"} # model -> result label
+
+NUMBER = (int, long, float)
+
+
+# ---------- engines --------------------------------------------------------
+#
+# each engine runs the cells of one trace, (trace, source, cells, smz_x,
+# smz_y, sta_dir) -> {cell: result tuple}, writing the .sta file of each
+# cell to sta_dir (see batch_run.sta_file)
+
+def _each (run):
+  # engine that runs run(source, smz_duration, smz_radius, smz_x, smz_y,
+  # outfile) for one cell at a time
+  def engine (trace, source, cells, smz_x, smz_y, sta_dir, model):
+    results = {}
+    for d, r in cells:
+      outfile = batch_run.sta_file(trace, model, d, r, sta_dir)
+      results[(d, r)] = run(source, d, r, smz_x, smz_y, outfile)
+    return results
+  return engine
+
+
+def _smz (source, d, r, smz_x, smz_y, outfile):
+  return calc_smz.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile)
+
+
+def _glr (source, d, r, smz_x, smz_y, outfile):
+  return calc_glr.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile)
+
+
+def _events (source, d, r, smz_x, smz_y, outfile):
+  import smz_events
+  return smz_events.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile)
+
+
+def _online (source, d, r, smz_x, smz_y, outfile):
+  import smz_online
+  monitor = smz_online.SmzMonitor(d, r, smz_x, smz_y, source.region,
+    source.step, source.infile)
+  monitor.feed(source.slices())
+  result = monitor.current()
+  print (result)
+  return result
+
+
+def _parallel (source, d, r, smz_x, smz_y, outfile):
+  import smz_parallel
+  return smz_parallel.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile)
+
+
+def _dual (source, d, r, smz_x, smz_y, outfile):
+  return calc_glr.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile,
+    dual = True)[0]
+
+
+def _dual_glr (source, d, r, smz_x, smz_y, outfile):
+  return calc_glr.smz_stats(d, r, smz_x, smz_y, source, outfile = outfile,
+    dual = True)[1]
+
+
+def _batch (trace, source, cells, smz_x, smz_y, sta_dir, model):
+  # (batch_run.py loads the trace itself, and runs the cells in parallel)
+  table = os.path.join(sta_dir, "batch.tsv")
+  jobs = [(trace, model, d, r, smz_x, smz_y) for d, r in cells]
+  batch_run.batch_run(jobs, table, sta_dir = sta_dir)
+  results = {}
+  tf = open(table, "r")
+  for line in tf:
+    words = line.rstrip("\n").split("\t")
+    if words[1] == model:
+      results[(int(words[2]), int(words[3]))] = tuple(
+        [_value(w) for w in words[4:]])
+  tf.close()
+  return results
+
+
+def _value (word):
+  # a table cell of batch_run.py back as the value it was written from
+  try:
+    return ast.literal_eval(word)
+  except (SyntaxError, ValueError):
+    return word
+
+
+# engine -> (model, engine function)
+ENGINES = {"smz": ("smz", _each(_smz)), "glr": ("glr", _each(_glr)),
+  "events": ("smz", _each(_events)), "online": ("smz", _each(_online)),
+  "parallel": ("smz", _each(_parallel)), "dual": ("smz", _each(_dual)),
+  "dual-glr": ("glr", _each(_dual_glr)),
+  "batch": ("smz", _batch), "batch-glr": ("glr", _batch)}
+
+
+# ---------- comparisons ----------------------------------------------------
+
+def read_results (paths):
+  # returns the result tuples printed in files (missing ones are skipped),
+  # {(label, trace file name, smz_duration, smz_radius): result}
+  results = {}
+  for path in paths:
+    if not os.path.exists(path):
+      continue
+    rf = open(path, "r")
+    for line in rf:
+      try:
+        result = ast.literal_eval(line)
+      except (SyntaxError, ValueError):
+        continue # blank line, or not a result (e.g. a date)
+      if isinstance(result, tuple) and len(result) > 4:
+        results[(result[0], os.path.basename(result[1])) + result[2:4]] = \
+          result
+    rf.close()
+  return results
+
+
+def _close (a, b, tolerance):
+  # true if numbers a and b match to within tolerance (see above)
+  return abs(a - b) <= tolerance * max(abs(a), abs(b))
+
+
+def compare (expected, got, tolerance = 0):
+  # returns the differences of two result tuples, [(position, expected,
+  # got)], and whether all numbers are identical; trace files are compared
+  # by file name
+  diffs = []
+  exact = True
+  if len(expected) != len(got):
+    return ([(-1, len(expected), len(got))], False)
+  for i in range(len(expected)):
+    a, b = expected[i], got[i]
+    if i == 1:
+      a, b = os.path.basename(str(a)), os.path.basename(str(b))
+    if isinstance(a, NUMBER) and isinstance(b, NUMBER):
+      exact = exact and a == b
+      if not _close(a, b, tolerance):
+        diffs.append((i, a, b))
+    elif a != b:
+      diffs.append((i, a, b))
+  return (diffs, exact and not diffs)
+
+
+def compare_sta (expected_file, got_file, tolerance = 0):
+  # returns (rows, differing rows, first differing (expected, got) row) of
+  # two .sta files, rows matched by vehicle (first column)
+  expected = _sta_rows(expected_file)
+  got = _sta_rows(got_file)
+  differ = 0
+  first = None
+  for v in sorted(set(expected) | set(got)):
+    a, b = expected.get(v), got.get(v)
+    same = a is not None and b is not None and len(a) == len(b)
+    if same:
+      for i in range(len(a)):
+        if not _close(a[i], b[i], tolerance):
+          same = False
+    if not same:
+      differ += 1
+      if first is None:
+        first = (a, b)
+  return (len(expected), differ, first)
+
+
+def _sta_rows (path):
+  rows = {}
+  sf = open(path, "r")
+  for line in sf:
+    words = line.split()
+    if words:
+      rows[words[0]] = [float(w) for w in words]
+  sf.close()
+  return rows
+
+
+# ---------- check ----------------------------------------------------------
+
+def _forget_indexes ():
+  # drops the cached GLR neighbour indexes (if any were built)
+  if "neighbour_index" in sys.modules:
+    sys.modules["neighbour_index"]._cache.clear()
+
+
+def check (engine, trace, smz_x, smz_y, cells, tolerance = 0,
+  baselines = BASELINES, sta_dir = None):
+  # runs engine and its reference engine on cells [(smz_duration,
+  # smz_radius)] of trace and prints the comparisons (see above); returns
+  # true if all results and .sta rows match
+  if engine not in ENGINES:
+    raise ValueError("unknown engine %s" % engine)
+  model, run = ENGINES[engine]
+  recorded = read_results(baselines)
+  tmp = tempfile.mkdtemp(prefix = "engine_check-")
+  try:
+    os.mkdir(os.path.join(tmp, "ref"))
+    os.mkdir(os.path.join(tmp, "engine"))
+    source = traj_source.open_trace(trace)
+
+    _forget_indexes()
+    start = time.time()
+    reference = ENGINES[model][1](trace, source, cells, smz_x, smz_y,
+      os.path.join(tmp, "ref"), model)
+    ref_time = time.time() - start
+    _forget_indexes()
+    start = time.time()
+    results = run(trace, source, cells, smz_x, smz_y,
+      os.path.join(tmp, "engine"), model)
+    engine_time = time.time() - start
+
+    ok = True
+    for d, r in cells:
+      key = (LABELS[model], os.path.basename(trace), d, r)
+      against = "recorded"
+      expected = recorded.get(key)
+      if expected is None:
+        against = "reference"
+        expected = reference[(d, r)]
+      diffs, exact = compare(expected, results[(d, r)], tolerance)
+      status = "same"
+      if diffs:
+        status = "differs"
+      elif not exact:
+        status = "within tolerance"
+
+      sta = ()
+      got_sta = batch_run.sta_file(trace, model, d, r,
+        os.path.join(tmp, "engine"))
+      ref_sta = batch_run.sta_file(trace, model, d, r, sta_dir)
+      if sta_dir is None or not os.path.exists(ref_sta):
+        ref_sta = batch_run.sta_file(trace, model, d, r,
+          os.path.join(tmp, "ref"))
+      if os.path.exists(got_sta):
+        rows, differ, first = compare_sta(ref_sta, got_sta, tolerance)
+        sta = (" - sta rows:", rows, differ)
+        if differ:
+          status = "differs"
+      print (("check:", engine, trace, d, r, status, against, len(diffs))
+        + sta)
+      for diff in diffs:
+        print ("  field", diff[0], "expected", diff[1], "got", diff[2])
+      if sta and first is not None:
+        print ("  sta row expected", first[0], "got", first[1])
+      ok = ok and status != "differs"
+
+    speedup = ref_time / max(engine_time, 1e-9)
+    print ("speed:", engine, trace, ref_time, engine_time, speedup)
+    return ok
+  finally:
+    shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  engine, trace = sys.argv[1:3]
+  smz_x, smz_y = float(sys.argv[3]), float(sys.argv[4])
+  durations = [int(w) for w in sys.argv[5].split(",")]
+  radii = [int(w) for w in sys.argv[6].split(",")]
+  tolerance = 0
+  if len(sys.argv) > 7:
+    tolerance = float(sys.argv[7])
+  sta_dir = None
+  if len(sys.argv) > 8:
+    sta_dir = sys.argv[8]
+  ok = check(engine, trace, smz_x, smz_y,
+    [(d, r) for d in durations for r in radii], tolerance, sta_dir = sta_dir)
+  print (time.ctime()) # ===== end of program =====
+  sys.exit(not ok)
@@ -10,7 +10,9 @@
 // overall design...
     // declare and open files
     // declare variables
-    // read input file line-by-line to find max vehicle id
+    // read input file line-by-line to find the vehicle ids
+    // number the vehicles 0..V-1 (in order of id), so the arrays below
+    // have one entry per vehicle, however sparse or large the ids are
     // re-read input file and create arrays, begin_time and end_time
     // re-read input file and write output file with begin_time and end_time
 
@@ -20,8 +22,19 @@
 #include <iomanip>    // for formatting test setw, setprecision
 #include <iostream>   // for endl, fixed
 #include <cmath>      // for sqrt()
+#include <vector>     // for vector
+#include <algorithm>  // for lower_bound
+#include <set>        // for set
 using namespace std;  // to make code more readable (no "std::" prefix)
 
+// function: number ----------------------------------------------------------
+// returns the vehicle number (0..V-1) of vehicle id v, ids being the sorted
+// distinct vehicle ids
+int number(const vector<int>& ids, int v)
+{
+    return lower_bound(ids.begin(), ids.end(), v) - ids.begin();
+}
+
 // function: main ------------------------------------------------------------
 int main()
 {
@@ -36,28 +49,28 @@ int main()
     // declare variables
     int t, v;                     // time, vehicle number
     float x, y;                   // geographical coordinates
-	int maxv = 0;
+	set<int> seen;                // distinct vehicle ids, as they are read
 	
-    // read input file line-by-line to find max vehicle id
+    // read input file line-by-line to find the vehicle ids (a set, so the
+    // memory is one entry per vehicle, not per record)
     while (inData >> t >> v >> x >> y)   // loop through all vehicles 	
     {
-		if (v>maxv) maxv=v;
+		seen.insert(v);
     }
-    cout << "maxv: " << maxv << endl;
+    vector<int> ids(seen.begin(), seen.end()); // distinct ids, sorted
+    seen.clear();
+    cout << "vehicles: " << ids.size() << endl;
     
     // re-read input file and create arrays, begin_time and end_time
-    float begin_time[maxv+1], end_time[maxv+1];
-    for (int i=0; i<maxv+1; i++)
-    {
-        begin_time[i] = -1.0;
-        end_time[i]   = -1.0;
-    }
+    // (indexed by vehicle number, see number())
+    vector<float> begin_time(ids.size(), -1.0), end_time(ids.size(), -1.0);
     inData.clear();
     inData.seekg(0, inData.beg);  // reposition to beginning of input file
     while (inData >> t >> v >> x >> y)   // loop through all input data 	
     {
-		if (begin_time[v]==-1) begin_time[v]=t;
-		end_time[v] = t;
+		int n = number(ids, v);
+		if (begin_time[n]==-1) begin_time[n]=t;
+		end_time[n] = t;
     }
 
     // re-read input file and write output file with begin_time and end_time
@@ -65,8 +78,9 @@ int main()
     inData.seekg(0, inData.beg);  // reposition to beginning of input file
     while (inData >> t >> v >> x >> y)   // loop through all input data 	
     {
+		int n = number(ids, v);
 		outData << t << " " << v << " " << x << " " << y << " " 
-		    << begin_time[v] << " " << end_time[v] << endl;
+		    << begin_time[n] << " " << end_time[n] << endl;
     }
 
 	// close files
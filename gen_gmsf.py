@@ -0,0 +1,206 @@
+# --------------------------------------------------------------------------
+# Filename      : gen_gmsf.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Seeded synthetic GMSF/MMTS trace generator, for scale
+#                 tests of the pipeline beyond the ~1k (rural), ~4.5k
+#                 (urban) and ~8.5k (city) vehicles of the traces from
+#                 gmsf.sourceforge.net.
+#
+#                 The region (size x size meters) is crossed by a grid of
+#                 roads every spacing meters (the road-grid density), in
+#                 both directions; size must be a multiple of spacing, so
+#                 the roads meet all four edges alike. Each vehicle enters at a uniformly random
+#                 time in [0, duration), on a road at a random point of the
+#                 region edge, heading inwards. At every intersection it
+#                 goes straight on (probability straight) or turns left or
+#                 right, and drives 1 to max_blocks blocks at its own speed
+#                 (speed +- 25%) before the next decision, until it reaches
+#                 the edge of the region or the end of the simulation.
+#                 Every such leg is one segment of the trace file.
+#
+#                 All vehicles are moved together, one leg per round, with
+#                 numpy (a round costs the same for 1k or 1M vehicles), and
+#                 the lines are formatted as arrays of digits, so that even
+#                 multi-GB traces are written in seconds to minutes.
+#
+#                 Times are kept in hundredths of seconds, so consecutive
+#                 segments of a vehicle join exactly in the file (start +
+#                 duration of one is the start of the next).
+#
+# Output file   : GMSF/MMTS trace file (see gen_traj.py), sorted by time,
+#                 vehicle number:
+#
+#                 00012.34 17 0.00 600.00 900.00 600.00 45.12
+#
+# Usage         : python gen_gmsf.py synth.txt 100000 [size] [duration]
+#                                     [spacing] [seed]
+#
+#                 (defaults 3000 m, 2000 s, 300 m, seed 1), or
+#
+#                 columns = generate(100000, seed = 1)
+#                 write_gmsf("synth.txt", columns)
+#
+# --------------------------------------------------------------------------
+
+import sys
+import time
+
+import numpy
+
+
+DIRECTIONS = numpy.array([(1, 0), (0, 1), (-1, 0), (0, -1)]) # E, N, W, S
+
+CHUNK = 1 << 20  # lines formatted at a time
+TABLE = 1 << 22  # largest column for which a table of all values is made
+
+
+def generate (vehicles, size = 3000, duration = 2000, spacing = 300,
+  speed = 20.0, straight = 0.6, max_blocks = 3, seed = 1):
+  # returns the segments of a synthetic trace as numpy arrays (start,
+  # vehicle, x1, y1, x2, y2, length), times in hundredths of seconds and
+  # positions in centimeters, sorted by start time, vehicle number
+  rng = numpy.random.RandomState(seed)
+  roads = int(size // spacing) # roads 1 .. roads-1 cross the region
+  if vehicles < 1:
+    raise ValueError("no vehicles to generate")
+  if roads < 2:
+    raise ValueError("spacing %s leaves no road inside a region of %s m"
+      % (spacing, size))
+  end = int(round(duration * 100))
+  scale = int(round(spacing * 100)) # (cm)
+  limit = int(round(size * 100))
+  if limit % scale:
+    raise ValueError("size %s is not a multiple of spacing %s (vehicles "
+      "entering from the E or N edge would be off the road grid)"
+      % (size, spacing))
+
+  # ----- entry: a road on a random side, heading inwards
+  vid = numpy.arange(1, vehicles + 1)
+  side = rng.randint(0, 4, vehicles)      # 0: W edge, 1: S, 2: E, 3: N
+  road = rng.randint(1, roads, vehicles) * scale
+  x = numpy.where(side == 0, 0, numpy.where(side == 2, limit, road))
+  y = numpy.where(side == 1, 0, numpy.where(side == 3, limit, road))
+  heading = side.copy()                   # (the side's inward direction)
+  t = numpy.sort(rng.randint(0, end, vehicles))
+  v_speed = speed * rng.uniform(0.75, 1.25, vehicles) # (m/s)
+
+  columns = [[] for c in range(7)]
+  first = True
+  while len(vid):
+    n = len(vid)
+    # ----- choose the next leg
+    if not first:
+      turn = rng.uniform(size = n) >= straight
+      heading = numpy.where(turn, (heading + rng.choice([1, 3], n)) % 4,
+        heading)
+    first = False
+    blocks = rng.randint(1, max_blocks + 1, n)
+    x2 = x + DIRECTIONS[heading, 0] * blocks * scale
+    y2 = y + DIRECTIONS[heading, 1] * blocks * scale
+    # a leg that reaches the edge ends there, and so does the vehicle
+    out = (x2 <= 0) | (x2 >= limit) | (y2 <= 0) | (y2 >= limit)
+    x2 = numpy.clip(x2, 0, limit)
+    y2 = numpy.clip(y2, 0, limit)
+    length = abs(x2 - x) + abs(y2 - y)
+    dt = numpy.maximum(numpy.rint(length / v_speed), 1).astype(numpy.int64)
+    # a leg that runs past the end of the simulation is cut there
+    late = t + dt > end
+    cut = numpy.where(late, end - t, dt)
+    x2 = numpy.where(late, numpy.rint(x + (x2 - x) * cut / dt.astype(float)),
+      x2).astype(numpy.int64)
+    y2 = numpy.where(late, numpy.rint(y + (y2 - y) * cut / dt.astype(float)),
+      y2).astype(numpy.int64)
+    for c, column in enumerate((t, vid, x, y, x2, y2, cut)):
+      columns[c].append(column)
+    # ----- the vehicles that go on
+    keep = ~(out | late) & (t + cut < end)
+    vid, x, y, heading = vid[keep], x2[keep], y2[keep], heading[keep]
+    t, v_speed = (t + cut)[keep], v_speed[keep]
+
+  columns = [numpy.concatenate(column) for column in columns]
+  order = numpy.argsort(columns[0] * (vehicles + 1) + columns[1]) # by time,
+  return [column[order] for column in columns]                    # vehicle
+
+
+FIELDS = [(2, 7), (0, 0), (2, 0), (2, 0), (2, 0), (2, 0), (2, 0)]
+                 # (decimals, zero padded digits) of each column:
+                 # 00012.34 17 0.00 600.00 900.00 600.00 45.12
+
+
+def _digits (values, decimals, pad, ndigits):
+  # returns (chars, keep): values (integers) written with ndigits digits
+  # and a point before the last decimals, one row per value, and which of
+  # the characters to write (no leading zeros but the last pad digits)
+  n = len(values)
+  width = ndigits + (decimals > 0)
+  chars = numpy.empty((width, n), numpy.uint8) # (a row per digit, so each
+  keep = numpy.ones((width, n), bool)          # is written in one go)
+  pos = width - 1
+  rest = values.copy()
+  for k in range(ndigits):
+    if decimals and k == decimals:
+      chars[pos] = ord(".")
+      pos -= 1
+    chars[pos] = rest % 10 + ord("0")
+    if k >= max(decimals + 1, pad):
+      keep[pos] = values >= 10 ** k # (not a leading zero)
+    rest //= 10
+    pos -= 1
+  return (chars.T, keep.T)
+
+
+def format_lines (columns):
+  # returns the trace file lines of columns (see generate) as one string:
+  # every line is first written at full width and the leading zeros are
+  # then dropped all at once. The digits of a column are looked up in a
+  # table of all values up to its largest (positions, times and durations
+  # are small integers in cm and 1/100 s), or computed if that is large
+  n = len(columns[0])
+  fields = []
+  for values, (decimals, pad) in zip(columns, FIELDS):
+    top = int(values.max())
+    ndigits = max(len(str(top)), decimals + 1, pad)
+    if top < TABLE:
+      chars, keep = _digits(numpy.arange(top + 1), decimals, pad, ndigits)
+      fields.append((numpy.take(chars, values, axis = 0),
+        numpy.take(keep, values, axis = 0)))
+    else:
+      fields.append(_digits(values, decimals, pad, ndigits))
+  width = sum([chars.shape[1] + 1 for chars, keep in fields])
+  line = numpy.empty((n, width), numpy.uint8)
+  mask = numpy.ones((n, width), bool)
+  end = 0 # one past the separator after the field
+  for chars, keep in fields:
+    start = end
+    end += chars.shape[1] + 1
+    line[:, start:end - 1] = chars
+    mask[:, start:end - 1] = keep
+    line[:, end - 1] = ord(" ")
+  line[:, -1] = ord("\n")
+  return line[mask].tostring()
+
+
+def write_gmsf (outfile, columns):
+  # writes the segments (see generate) to a GMSF/MMTS trace file
+  out = open(outfile, "wb")
+  for a in range(0, len(columns[0]), CHUNK):
+    out.write(format_lines([column[a:a + CHUNK] for column in columns]))
+  out.close()
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  outfile = sys.argv[1]
+  vehicles = int(sys.argv[2])
+  parms = [float(w) for w in sys.argv[3:6]]
+  size, duration, spacing = parms + [3000, 2000, 300][len(parms):]
+  seed = 1
+  if len(sys.argv) > 6:
+    seed = int(sys.argv[6])
+  columns = generate(vehicles, size, duration, spacing, seed = seed)
+  write_gmsf(outfile, columns)
+  print ("segments:", len(columns[0]), "vehicles:", vehicles, "file:", outfile)
+  print (time.ctime()) # ===== end of program =====
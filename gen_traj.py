@@ -21,9 +21,10 @@
 #
 # processing    : 1. initialize variables
 #                 2. open input file
-#                 3. loop through lines of input file
-#                 4. loop through words in each trace file line
-#                    and load them into variables
+#                 3. read the columns of the input file in bulk
+#                    (see text_columns.py; a line without 7 numbers
+#                    is reported with its line number)
+#                 4. round the times and durations up to whole steps
 #                    (now the entire trace file is in RAM)
 #                 5. generate intermediate points
 #                    and write to output file
@@ -49,68 +50,45 @@
 #
 #                 gen_traj.out should have duration+1 lines
 #                 for each line of GMSF/MMTS trace file
+#
+# time step     : the first column is the time in steps of step seconds
+#                 (section 1), 1 by default. With step = 0.1 the times are
+#                 tenths of seconds and the file has ~10 lines per second of
+#                 duration; the .srt file made from it must then be opened
+#                 with the same step (traj_source.open_trace(f, 0.1)).
+#                 Rather than a sub-second .srt file, consider passing the
+#                 GMSF/MMTS trace file itself to the engines, which
+#                 interpolates the steps on demand (see traj_source.py)
 
 import math
 import time
 
+import text_columns
+import traj_source
+
 # ---------- 1. inititalize variables --------------------------------------
 v = 1                # vehicle number (note: there is no vehicle "0")
 infile = "city.txt" # gmsf/mmts trace file should be a text file
+step = 1             # seconds per time step (e.g. 0.1)
 
-# code thru "mmts.close()" below is by Patrick D'Errico
-
-times = [] # times in which the states change
-cid = []   # car (vehicle) id
-curx = []  # starting position on car appearence
-cury = []
-finx = []  # end position after block
-finy = []
-elapsed = [] # time steps from start to end
+# code thru section 4 ("elapsed = ...") below is by Patrick D'Errico
+# (his loop over the words of the trace file is now text_columns.py)
 
 # ---------- 2. open input file --------------------------------------------
 print time.ctime(), " ... reading mmts file into variables ... ",
-mmts = open(infile, "r")
-
-# ---------- 3. loop through lines in trace file ----------------------------
-counter = 7
-for line in mmts:
 
-# ---------- 4. loop through words in each trace file line 
-#               and load them into variables
-  for word in line.split():
-        counter = counter + 1
-        if counter == 8:
-            counter = 1
-        if counter == 1:
-            stamp = float(word)
-            if stamp == 0:
-                times.append(0)
-            else:
-                if stamp > int(stamp): #round up timestamps to keep time consistently
-                    times.append((int(stamp)+1))
-                else:
-                    times.append((int(stamp)))
-        if counter == 2:
-            cid.append(int(word))           
-        if counter == 3:
-            curx.append(float(word))
-        if counter == 4:
-            cury.append(float(word))
-        if counter == 5:
-            finx.append(float(word))           
-        if counter == 6:
-            finy.append(float(word))
-        if counter == 7:
-            stamp = float(word)
-            if stamp == 0:
-                elapsed.append(0)
-            else:
-                if stamp > int(stamp): #round up timestamps to keep time consistently
-                    elapsed.append((int(stamp)+1))
-                else:
-                    elapsed.append((int(stamp)))
+# ---------- 3. read the columns of the trace file --------------------------
+# stamps:    times in which the states change (seconds)
+# cid:       car (vehicle) id
+# curx/cury: starting position on car appearence
+# finx/finy: end position after block
+# durations: seconds from start to end
+stamps, cid, curx, cury, finx, finy, durations = \
+  text_columns.read_columns(infile, traj_source.GMSF_COLUMNS)
 
-mmts.close()
+# ---------- 4. round up timestamps to keep time consistently --------------
+times   = [traj_source.to_steps(stamp, step) for stamp in stamps]
+elapsed = [traj_source.to_steps(stamp, step) for stamp in durations]
 
 print " done.", time.ctime()
 
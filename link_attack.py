@@ -0,0 +1,297 @@
+# --------------------------------------------------------------------------
+# Filename      : link_attack.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Linkability attack on the silent mix zones (smz) of
+#                 calc_smz.py: how often an adversary who hears every
+#                 beacon outside the silent periods re-identifies the
+#                 vehicles of an smz group when they speak again.
+#
+#                 A vehicle falls silent at its first record within
+#                 smz_radius of the smz (its entry) and speaks again, under
+#                 a new pseudonym, at its first record from the end of the
+#                 silent period of its group on (smz_exit_time); vehicles
+#                 with no record after that have left and are not linked.
+#                 The groups and silent periods are read from the .sta file
+#                 smz_stats wrote for the cell; positions come from the
+#                 trace.
+#
+#                 Where two segments of a vehicle meet, the trace has two
+#                 records of it in one second, in an order that depends on
+#                 the source (.srt file or GMSF/MMTS trace file, see
+#                 traj_source.py). Only the later segment's start point is
+#                 kept, the one nearer the vehicle's next second (or, at
+#                 its last second, farther from its previous one), so the
+#                 attack does not depend on the order of the records (the
+#                 time of the entry is still that of the first record
+#                 within smz_radius, as for calc_smz.py).
+#
+#                 The adversary dead-reckons every vehicle of a group from
+#                 its entry (position, and velocity from its last record
+#                 before) to the time each reappearing vehicle speaks
+#                 again, and matches reappearing vehicles to entries one to
+#                 one so that the sum of the distances between predicted
+#                 and heard positions is the least (optimal assignment, by
+#                 shortest augmenting paths; the cost matrix of a group is
+#                 built in one numpy expression and each augmenting path
+#                 scans whole rows of it at a time). Distances are taken
+#                 to the millimetre, so that ties (vehicles one behind the
+#                 other at one speed) are broken alike for both sources. A
+#                 vehicle is re-identified if it is matched to its own
+#                 entry.
+#
+#                 The record arrays of the trace are sorted by vehicle
+#                 (and the duplicates marked) once and kept for the next
+#                 cell of the same trace.
+#
+# Output file   : .lnk file, one line per vehicle that entered the smz:
+#
+#                 17 3 24 1 17 1 12.5
+#
+#                 vehicle id, smz group, group size, reappeared (1/0),
+#                 id of the entry it was matched to (-1 if none), matched
+#                 correctly (1/0), distance to the prediction (m)
+#
+# Output print  : ('link:', 'city.srt', 20, 30, ' - groups:', 100, 4483,
+#                   4102, ' - reid:', 1234, 0.3008, 0.0411)
+#
+#                 groups, vehicles that entered the smz, vehicles that
+#                 reappeared, re-identified vehicles, re-identification
+#                 rate, and the rate of a random matching (for comparison)
+#
+# Usage         : python link_attack.py city.srt city.sta 20 30 390 1710
+#                   [outfile]
+#
+#                 (city.sta written by smz_stats(20, 30, 390, 1710,
+#                 "city.srt", outfile = "city.sta"), or by batch_run.py)
+#
+# --------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy
+
+import rsu_coverage
+import traj_source
+
+
+_points = {} # (infile, step) -> records sorted by vehicle, time (see below)
+
+
+def assign (cost):
+  # returns the column assigned to each row of cost (rows <= columns, no
+  # column twice) with the least total cost: the shortest augmenting path
+  # method (Jonker-Volgenant), with row and column potentials u, v
+  n, m = cost.shape
+  if n > m:
+    raise ValueError("more rows (%d) than columns (%d) to assign" % (n, m))
+  u = numpy.zeros(n)
+  v = numpy.zeros(m)
+  col4row = numpy.repeat(-1, n)
+  row4col = numpy.repeat(-1, m)
+  for cur in range(n):
+    # ----- shortest path from row cur to a free column
+    shortest = numpy.repeat(numpy.inf, m)
+    path = numpy.repeat(-1, m)
+    remaining = numpy.ones(m, bool) # columns not reached yet
+    rows = []                       # rows reached
+    low = 0.0
+    i = cur
+    sink = -1
+    while sink == -1:
+      rows.append(i)
+      reduced = low + cost[i] - u[i] - v
+      better = remaining & (reduced < shortest)
+      path[better] = i
+      shortest[better] = reduced[better]
+      j = numpy.argmin(numpy.where(remaining, shortest, numpy.inf))
+      low = shortest[j]
+      if low == numpy.inf:
+        raise ValueError("no assignment of finite cost")
+      remaining[j] = False
+      if row4col[j] == -1:
+        sink = j
+      else:
+        i = row4col[j]
+    # ----- new potentials
+    u[cur] += low
+    others = numpy.array(rows[1:], int)
+    u[others] += low - shortest[col4row[others]]
+    reached = ~remaining
+    v[reached] -= low - shortest[reached]
+    # ----- augment along the path
+    j = sink
+    while True:
+      i = path[j]
+      row4col[j] = i
+      col4row[i], j = j, col4row[i]
+      if i == cur:
+        break
+  return col4row
+
+
+def sorted_points (source):
+  # returns (t, v, x, y, kept) of all records of source, sorted by vehicle,
+  # then time, and which of them are kept, one per vehicle and time (see
+  # above); kept for the last trace asked for
+  key = (source.infile, source.step)
+  if key not in _points:
+    _points.clear()
+    t, v, x, y = rsu_coverage.trace_points(source)
+    keys = v.astype(numpy.int64) * (source.tmax + 1) + t
+    order = numpy.argsort(keys, kind = "mergesort")
+    t, v, x, y, keys = t[order], v[order], x[order], y[order], keys[order]
+    _points[key] = (t, v, x, y, kept_records(v, x, y, keys))
+  return _points[key]
+
+
+def kept_records (v, x, y, keys):
+  # returns a boolean array: one record of each (vehicle, time) key of the
+  # records sorted by keys, the one nearest the mean position of the
+  # vehicle's next time, or at its last time the one farthest from that of
+  # its previous time (ties: the smaller x, then y), whatever their order
+  new = numpy.ones(len(keys), bool)
+  new[1:] = keys[1:] != keys[:-1]
+  group = numpy.cumsum(new) - 1 # (vehicle, time) of each record
+  n = numpy.bincount(group).astype(float)
+  mx = numpy.bincount(group, x) / n
+  my = numpy.bincount(group, y) / n
+  gv = v[new]
+  ahead = numpy.minimum(group + 1, len(n) - 1)
+  behind = numpy.maximum(group - 1, 0)
+  has_next = (group + 1 < len(n)) & (gv[ahead] == v)
+  has_prev = (group > 0) & (gv[behind] == v)
+  score = numpy.where(has_next,
+    numpy.sqrt((x - mx[ahead]) ** 2 + (y - my[ahead]) ** 2),
+    numpy.where(has_prev,
+      -numpy.sqrt((x - mx[behind]) ** 2 + (y - my[behind]) ** 2), 0.0))
+  best = numpy.lexsort((y, x, score, group))
+  first = numpy.ones(len(best), bool)
+  first[1:] = group[best][1:] != group[best][:-1]
+  kept = numpy.zeros(len(keys), bool)
+  kept[best[first]] = True
+  return kept
+
+
+def read_sta (infile, source):
+  # returns {vehicle number: (smz_grp, smz_exit_time (steps))} of the
+  # vehicles of an .sta file (see calc_smz.py) that entered the smz
+  number = traj_source.vehicle_numbers(source.ids)
+  groups = {}
+  sf = open(infile, "r")
+  for lineno, line in enumerate(sf):
+    words = line.split()
+    if not words:
+      continue
+    if len(words) != 9:
+      raise ValueError("%s line %d: expected 9 columns, got %d"
+        % (infile, lineno + 1, len(words)))
+    if int(words[8]) < 0:
+      continue # (never entered the smz)
+    if int(words[0]) not in number:
+      raise ValueError("%s line %d: vehicle %s is not in %s"
+        % (infile, lineno + 1, words[0], source.infile))
+    groups[number[int(words[0])]] = (int(words[8]),
+      traj_source.to_steps(float(words[4]), source.step))
+  sf.close()
+  return groups
+
+
+def linkability (source, sta, smz_duration, smz_radius, smz_x, smz_y,
+  outfile = os.devnull):
+  # runs the attack on the smz groups of .sta file sta (of smz_stats for
+  # these parameters on source, a trace file or an opened source), writes
+  # the per-vehicle .lnk table to outfile and returns the summary (see
+  # above)
+  source = traj_source.open_trace(source)
+  step = source.step
+  smz_steps = traj_source.to_steps(smz_duration, step)
+  t, v, x, y, kept = sorted_points(source)
+  groups = read_sta(sta, source)
+  width = source.tmax + 1
+
+  # ----- entry: time of the first record within smz_radius (of all)
+  inside = numpy.flatnonzero(smz_radius > numpy.sqrt((x - smz_x) ** 2 \
+    + (y - smz_y) ** 2))
+  entered, first = numpy.unique(v[inside], return_index = True)
+  if set(entered.tolist()) != set(groups):
+    raise ValueError("%s: the smz groups are not those of %s (%s, %s)"
+      % (sta, source.infile, smz_duration, smz_radius))
+
+  # ----- the kept records: entry, and velocity from the last one before
+  entered_at = t[inside[first]]
+  t, v, x, y = t[kept], v[kept], x[kept], y[kept]
+  keys = v.astype(numpy.int64) * width + t
+  entry = numpy.searchsorted(keys, entered.astype(numpy.int64) * width
+    + entered_at)
+  prev = numpy.maximum(entry - 1, 0)
+  moving = (entry > 0) & (v[prev] == entered)
+  dt = numpy.where(moving, t[entry] - t[prev], 1).astype(float)
+  vx = numpy.where(moving, (x[entry] - x[prev]) / dt, 0.0)
+  vy = numpy.where(moving, (y[entry] - y[prev]) / dt, 0.0)
+  grp = numpy.array([groups[u][0] for u in entered])
+  if (grp != t[entry] // smz_steps).any():
+    raise ValueError("%s: the smz groups are not those of %s (%s, %s)"
+      % (sta, source.infile, smz_duration, smz_radius))
+
+  # ----- reappearance: first record from the end of the silent period on
+  until = numpy.array([groups[u][1] for u in entered])
+  back = numpy.searchsorted(keys, entered.astype(numpy.int64) * width + until)
+  back = numpy.minimum(back, len(v) - 1)
+  spoke = (v[back] == entered) & (t[back] >= until)
+
+  # ----- optimal matching in each group
+  match = numpy.repeat(-1, len(entered)) # entry matched to (index)
+  error = numpy.zeros(len(entered))
+  size = numpy.zeros(len(entered), int)
+  order = numpy.argsort(grp, kind = "mergesort")
+  bounds = numpy.flatnonzero(numpy.diff(grp[order])) + 1
+  expected = 0.0
+  for members in numpy.split(order, bounds):
+    size[members] = len(members)
+    rows = members[spoke[members]]
+    if not len(rows):
+      continue
+    # (predicted position of every entry at each reappearance time)
+    ahead = (t[back[rows]][:, None] - t[entry[members]][None, :]).astype(float)
+    px = x[entry[members]][None, :] + vx[members][None, :] * ahead
+    py = y[entry[members]][None, :] + vy[members][None, :] * ahead
+    # (to the mm, see above)
+    cost = numpy.round(numpy.sqrt((x[back[rows]][:, None] - px) ** 2 \
+      + (y[back[rows]][:, None] - py) ** 2), 3)
+    cols = assign(cost)
+    match[rows] = members[cols]
+    error[rows] = cost[numpy.arange(len(rows)), cols]
+    expected += float(len(rows)) / len(members)
+
+  correct = match == numpy.arange(len(entered))
+  lnk = open(outfile, "w")
+  for a in range(len(entered)):
+    linked = -1
+    if match[a] >= 0:
+      linked = source.ids[entered[match[a]]]
+    lnk.write("%s %d %d %d %s %d %s\n" % (source.ids[entered[a]], grp[a],
+      size[a], spoke[a], linked, correct[a], error[a]))
+  lnk.close()
+
+  reappeared = int(spoke.sum())
+  result = ("link:", source.infile, smz_duration, smz_radius, " - groups:",
+    len(numpy.unique(grp)), len(entered), reappeared, " - reid:",
+    int(correct.sum()), float(correct.sum()) / max(reappeared, 1),
+    expected / max(reappeared, 1))
+  print (result)
+  return result
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  outfile = os.devnull
+  if len(sys.argv) > 7:
+    outfile = sys.argv[7]
+  linkability(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]),
+    float(sys.argv[5]), float(sys.argv[6]), outfile)
+  print (time.ctime()) # ===== end of program =====
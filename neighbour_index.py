@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------
+# Filename      : neighbour_index.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Neighbour index for the GLR engine (calc_glr.py).
+#
+#                 GLR pairing asks, for every record (v, x, y) of time slice
+#                 t, which vehicles of the look-ahead slice (t+1, see
+#                 traj_source.lookahead) are within comrange of (x, y).
+#                 The answer depends on the trace, the time step, comrange
+#                 and SIM_TIME only, not on smz_duration (silent period) or
+#                 on the state of the vehicles, so it is computed once per
+#                 (trace, comrange) and shared by all silent periods of a
+#                 sweep.
+#
+#                 For each slice t the index holds, in compressed sparse
+#                 row form,
+#
+#                   near[first[i] : first[i+1]]
+#
+#                 the vehicle numbers within comrange of record i of slice
+#                 t, in the order of the look-ahead slice (vehicle number),
+#                 which is the order incomrange() searched them in. The
+#                 distance test is the one calc_glr.py always used,
+#
+#                   comrange > sqrt((x - x')**2 + (y - y')**2)
+#
+#                 done with numpy over the look-ahead vehicles whose x lies
+#                 within comrange of x (a window of the slice sorted by x).
+#
+#                 A few indexes (CACHE_SIZE, the five comranges of a sweep)
+#                 are kept, least recently used first out. Vehicle numbers
+#                 are stored as 16-bit integers when they fit (~60M pairs,
+#                 115 MB, for city.txt at comrange 150).
+#
+# Usage         : index = neighbours(source, comrange, SIM_TIME)
+#                 first, near = index.slice(t)
+#
+# --------------------------------------------------------------------------
+
+from array import array
+from collections import OrderedDict
+
+import numpy
+
+import traj_source
+
+
+CACHE_SIZE = 5  # neighbour indexes kept (one per comrange)
+
+_cache = OrderedDict() # (infile, step, comrange, last) -> NeighbourIndex
+
+
+def in_range (x, y, ax, ay, r):
+  # returns (rows, cols), the pairs of points (x[row], y[row]) and
+  # (ax[col], ay[col]) less than r apart, sorted by row, then col
+  n = len(x)
+  if n == 0 or len(ax) == 0:
+    return (numpy.zeros(0, int), numpy.zeros(0, int))
+  order = numpy.argsort(ax, kind = "mergesort")
+  sx = ax[order]
+  # candidate window by x (widened by 1 m against rounding of x +- r)
+  lo = numpy.searchsorted(sx, x - r - 1, "left")
+  hi = numpy.searchsorted(sx, x + r + 1, "right")
+  counts = hi - lo
+  rows = numpy.repeat(numpy.arange(n), counts)
+  offset = numpy.cumsum(counts) - counts
+  cols = order[numpy.arange(len(rows)) - offset[rows] + lo[rows]]
+  keep = r > numpy.sqrt((x[rows] - ax[cols]) ** 2 + (y[rows] - ay[cols]) ** 2)
+  rows = rows[keep]
+  cols = cols[keep]
+  pairs = numpy.lexsort((cols, rows))
+  return (rows[pairs], cols[pairs])
+
+
+class NeighbourIndex:
+  # per-slice neighbour lists of a trajectory source (see above)
+
+  def __init__ (self, source, r, last):
+    self.r = r
+    self.last = last
+    vtype, vdtype = ("i", numpy.int32) # type of the vehicle numbers
+    if source.vmax < 65536:
+      vtype, vdtype = ("H", numpy.uint16)
+    self.first = {} # first[t]: start of the list of each record of slice t
+    self.near = {}  # near[t]: the lists, one after the other
+    for t, cid, curx, cury, ahead in \
+      traj_source.lookahead(source.slices(), last):
+      rows, cols = in_range(numpy.array(curx, float),
+        numpy.array(cury, float), numpy.array(ahead[1], float),
+        numpy.array(ahead[2], float), r)
+      first = numpy.zeros(len(cid) + 1, numpy.int32)
+      numpy.cumsum(numpy.bincount(rows, minlength = len(cid)),
+        out = first[1:])
+      near = numpy.array(ahead[0], vdtype)[cols]
+      self.first[t] = array("i", first.tostring())
+      self.near[t] = array(vtype, near.tostring())
+
+  def slice (self, t):
+    # returns (first, near) of slice t (empty if there is no such slice)
+    if t not in self.first:
+      return (array("i", [0]), array("i"))
+    return (self.first[t], self.near[t])
+
+  def pairs (self):
+    # returns the number of (record, neighbour) pairs held
+    return sum([len(near) for near in self.near.values()])
+
+
+def neighbours (source, r, last):
+  # returns the neighbour index of source for comrange r, with look-ahead
+  # slice last (SIM_TIME), from the cache if it was built already
+  key = (source.infile, source.step, r, last)
+  if key in _cache:
+    _cache[key] = _cache.pop(key)
+  else:
+    while len(_cache) >= CACHE_SIZE:
+      _cache.popitem(last = False)
+    _cache[key] = NeighbourIndex(source, r, last)
+  return _cache[key]
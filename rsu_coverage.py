@@ -0,0 +1,215 @@
+# --------------------------------------------------------------------------
+# Filename      : rsu_coverage.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Roadside-unit (observer) coverage of a trace: which
+#                 trajectory points an adversary with a set of receivers,
+#                 each hearing vehicles within radius meters, observes.
+#
+#                 All records of the trace (every time slice, see
+#                 traj_source.py) are joined against the receiver discs in
+#                 one vectorised pass. The receivers are indexed in a grid
+#                 of radius x radius cells (sorted by cell), so a point
+#                 is only tested against the receivers of its own and the
+#                 eight neighbouring cells; the points are taken a CHUNK
+#                 at a time, which bounds the memory of the candidate
+#                 pairs. A point is observed if
+#
+#                   radius > sqrt((x - rx)**2 + (y - ry)**2)
+#
+#                 for some receiver (rx, ry), the distance test of the GLR
+#                 engine (see neighbour_index.py).
+#
+#                 Per vehicle, its records in time order give the observed
+#                 fraction and the tracking gaps: each run of consecutive
+#                 unobserved records (also before the first and after the
+#                 last observed one) is a gap, from the time of its first
+#                 record to one step past its last.
+#
+# Input file    : receivers, one "x y" per line (meters), or a number of
+#                 receivers placed uniformly at random in the region
+#
+# Output file   : .cov file, one line per vehicle:
+#
+#                 17 1204 388 0.322259136213 3 512.0 272.0
+#
+#                 vehicle id, records, observed records, observed fraction,
+#                 number of gaps, longest and mean gap (seconds; 0 if none)
+#
+# Output print  : ('coverage:', 'city.srt', 1000, 150, ' - points:', 1836545,
+#                   0.41, ' - vehicles:', 8543, 0.39, 112, 402.5)
+#
+#                 receivers, radius, points, observed fraction of all
+#                 points, vehicles, mean observed fraction per vehicle,
+#                 vehicles never observed, mean longest gap (seconds)
+#
+# Usage         : python rsu_coverage.py city.srt receivers.txt 150 [outfile]
+#                 python rsu_coverage.py city.srt 1000 150 [outfile] [seed]
+#
+#                 rx, ry = random_receivers(source.region, 1000)
+#                 result = coverage(source, rx, ry, 150, "city.cov")
+#
+# --------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy
+
+import text_columns
+import traj_source
+
+
+CHUNK = 1 << 20  # points joined at a time
+
+
+def trace_points (source):
+  # returns numpy arrays (t, v, x, y) of all records of source, in time
+  # order (the arrays of a .srt source themselves, without copies)
+  if hasattr(source, "times"):
+    return (numpy.frombuffer(source.times, numpy.int32),
+      numpy.frombuffer(source.cid, numpy.int32),
+      numpy.frombuffer(source.curx, numpy.float64),
+      numpy.frombuffer(source.cury, numpy.float64))
+  parts = [[], [], [], []]
+  for t, cid, curx, cury in source.slices():
+    parts[0].append(numpy.repeat(t, len(cid)).astype(numpy.int32))
+    parts[1].append(numpy.frombuffer(cid, numpy.int32))
+    parts[2].append(numpy.frombuffer(curx, numpy.float64))
+    parts[3].append(numpy.frombuffer(cury, numpy.float64))
+  return tuple([numpy.concatenate(part) for part in parts])
+
+
+def random_receivers (region, n, seed = 1):
+  # returns (rx, ry), n receivers placed uniformly at random in region
+  xmin, ymin, xmax, ymax = region
+  rng = numpy.random.RandomState(seed)
+  return (rng.uniform(xmin, xmax, n), rng.uniform(ymin, ymax, n))
+
+
+def read_receivers (infile):
+  # returns (rx, ry), the receivers listed in infile ("x y" per line)
+  rx, ry = text_columns.read_columns(infile, "dd")
+  return (numpy.array(rx, numpy.float64), numpy.array(ry, numpy.float64))
+
+
+class ReceiverIndex:
+  # receivers (rx, ry) of radius r, in a grid of r x r cells (see above)
+
+  def __init__ (self, rx, ry, r):
+    if r <= 0:
+      raise ValueError("receiver radius %s is not positive" % r)
+    self.r = float(r)
+    keys = self.keys(rx, ry)
+    order = numpy.argsort(keys, kind = "mergesort")
+    self.cells = keys[order] # cell of each receiver, sorted
+    self.rx = numpy.asarray(rx, numpy.float64)[order]
+    self.ry = numpy.asarray(ry, numpy.float64)[order]
+
+  def keys (self, x, y, dx = 0, dy = 0):
+    # returns the cell numbers of points (x, y), offset by (dx, dy) cells
+    cx = numpy.floor(numpy.asarray(x) / self.r).astype(numpy.int64) + dx
+    cy = numpy.floor(numpy.asarray(y) / self.r).astype(numpy.int64) + dy
+    return (cx << 32) + cy
+
+  def observed (self, x, y):
+    # returns a boolean array: which points (x, y) some receiver hears
+    seen = numpy.zeros(len(x), bool)
+    for a in range(0, len(x), CHUNK):
+      px = x[a:a + CHUNK]
+      py = y[a:a + CHUNK]
+      hit = seen[a:a + CHUNK]
+      for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+          cells = self.keys(px, py, dx, dy)
+          lo = numpy.searchsorted(self.cells, cells, "left")
+          hi = numpy.searchsorted(self.cells, cells, "right")
+          rows = numpy.flatnonzero((hi > lo) & ~hit)
+          counts = (hi - lo)[rows]
+          if not len(rows):
+            continue
+          # candidate pairs (point, receiver), as in neighbour_index.py
+          pairs = numpy.repeat(rows, counts)
+          offset = numpy.cumsum(counts) - counts
+          cols = numpy.arange(len(pairs)) \
+            - numpy.repeat(offset, counts) + lo[pairs]
+          near = self.r > numpy.sqrt((px[pairs] - self.rx[cols]) ** 2 \
+            + (py[pairs] - self.ry[cols]) ** 2)
+          hit[pairs[near]] = True
+    return seen
+
+
+def coverage (source, rx, ry, radius, outfile = os.devnull):
+  # joins the records of source (a trace file or an opened source) with
+  # the receivers (rx, ry) of radius r, writes the per-vehicle .cov table
+  # to outfile and returns the summary (see above)
+  source = traj_source.open_trace(source)
+  t, v, x, y = trace_points(source)
+  seen = ReceiverIndex(rx, ry, radius).observed(x, y)
+
+  # ----- per vehicle, records in time order
+  order = numpy.argsort(v.astype(numpy.int64) * (source.tmax + 1) + t,
+    kind = "mergesort")
+  v, t, seen = v[order], t[order], seen[order]
+  size = source.vmax + 1
+  records = numpy.bincount(v, minlength = size)
+  observed = numpy.bincount(v, weights = seen, minlength = size)
+  observed = observed.astype(numpy.int64)
+
+  # ----- gaps: runs of unobserved records of one vehicle
+  first = numpy.ones(len(v), bool) # first record of a vehicle
+  first[1:] = v[1:] != v[:-1]
+  last = numpy.ones(len(v), bool)  # last record of a vehicle
+  last[:-1] = first[1:]
+  starts = numpy.flatnonzero(~seen & (first | numpy.roll(seen, 1)))
+  ends = numpy.flatnonzero(~seen & (last | numpy.roll(seen, -1)))
+  # (in seconds, rounded as traj_source.to_seconds does)
+  lengths = numpy.round((t[ends] - t[starts] + 1) * float(source.step), 9)
+  gap_v = v[starts]
+  gaps = numpy.bincount(gap_v, minlength = size)
+  longest = numpy.zeros(size)
+  numpy.maximum.at(longest, gap_v, lengths)
+  total = numpy.bincount(gap_v, weights = lengths, minlength = size)
+
+  cov = open(outfile, "w")
+  for u in range(source.vmin, source.vmax + 1):
+    fraction = 0.0
+    if records[u]:
+      fraction = float(observed[u]) / records[u]
+    mean = 0.0
+    if gaps[u]:
+      mean = total[u] / gaps[u]
+    cov.write("%s %d %d %s %d %s %s\n" % (source.ids[u], records[u],
+      observed[u], fraction, gaps[u], longest[u], mean))
+  cov.close()
+
+  present = records[source.vmin:] > 0
+  fractions = observed[source.vmin:][present] \
+    / records[source.vmin:][present].astype(float)
+  result = ("coverage:", source.infile, len(rx), radius, " - points:",
+    len(t), float(seen.sum()) / len(t), " - vehicles:", int(present.sum()),
+    float(fractions.mean()), int((fractions == 0).sum()),
+    float(longest[source.vmin:][present].mean()))
+  print (result)
+  return result
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  source = traj_source.open_trace(sys.argv[1])
+  radius = float(sys.argv[3])
+  outfile = os.devnull
+  if len(sys.argv) > 4:
+    outfile = sys.argv[4]
+  if os.path.exists(sys.argv[2]):
+    rx, ry = read_receivers(sys.argv[2])
+  else:
+    seed = 1
+    if len(sys.argv) > 5:
+      seed = int(sys.argv[5])
+    rx, ry = random_receivers(source.region, int(sys.argv[2]), seed)
+  coverage(source, rx, ry, radius, outfile)
+  print (time.ctime()) # ===== end of program =====
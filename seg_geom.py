@@ -0,0 +1,97 @@
+# --------------------------------------------------------------------------
+# Filename      : seg_geom.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Geometric kernel for piecewise linear (GMSF/MMTS)
+#                 trajectories: when is a point moving along a segment,
+#
+#                   (x0 + tt*dx, y0 + tt*dy)
+#
+#                 inside the smz circle, or inside the band of width
+#                 edge_threshold along the edge of the region?
+#
+#                 Each answer is one or more open intervals of tt, found
+#                 analytically (a quadratic for the circle, a linear
+#                 inequality per side for the band), so the entry and exit
+#                 times of a segment do not depend on any time resolution.
+#                 first_time() gives the exact (continuous) entry time,
+#                 first_sample() the first whole time step in the interval,
+#                 which is what the per-second engines see.
+#
+#                 An empty interval is returned as (t1, t2) with t1 >= t2.
+#
+# --------------------------------------------------------------------------
+
+import math
+
+NEVER  = (0.0, 0.0)
+ALWAYS = (float("-inf"), float("inf"))
+
+
+def circle_times (x0, y0, dx, dy, cx, cy, r):
+  # returns (t1, t2): the point is within r of (cx, cy) for t1 < tt < t2
+  a = dx * dx + dy * dy
+  b = 2 * ((x0 - cx) * dx + (y0 - cy) * dy)
+  c = (x0 - cx) ** 2 + (y0 - cy) ** 2 - r * r
+  if a == 0:
+    if c < 0:
+      return ALWAYS
+    return NEVER
+  disc = b * b - 4 * a * c
+  if disc <= 0:
+    return NEVER
+  root = math.sqrt(disc)
+  return ((-b - root) / (2 * a), (-b + root) / (2 * a))
+
+
+def below_times (x0, dx, c):
+  # returns (t1, t2): x0 + tt*dx < c for t1 < tt < t2
+  if dx == 0:
+    if x0 < c:
+      return ALWAYS
+    return NEVER
+  cross = (c - x0) / dx
+  if dx > 0:
+    return (float("-inf"), cross)
+  return (cross, float("inf"))
+
+
+def band_times (x0, y0, dx, dy, region, edge_threshold):
+  # returns the four intervals (one per side of the region) in which the
+  # point is within edge_threshold of the edge; the band is their union
+  xmin, ymin, xmax, ymax = region
+  return [below_times(x0, dx, xmin + edge_threshold),
+    below_times(y0, dy, ymin + edge_threshold),
+    below_times(-x0, -dx, -(xmax - edge_threshold)),  # x > c is -x < -c
+    below_times(-y0, -dy, -(ymax - edge_threshold))]
+
+
+def first_time (intervals, lo, hi):
+  # returns the first tt in lo..hi inside any of the intervals, or None
+  best = None
+  for t1, t2 in intervals:
+    tt = max(lo, t1)
+    if tt < min(hi, t2) or (tt == hi and t1 < hi < t2):
+      if best is None or tt < best:
+        best = tt
+  return best
+
+
+def first_sample (lo, hi, t1, t2, test):
+  # returns the first whole step tt in lo..hi for which test(tt) is true,
+  # or None, where test(tt) is true (up to rounding) exactly when
+  # t1 < tt < t2; only the steps next to the crossing times are tested
+  if t1 >= t2 or t2 < lo - 1 or t1 > hi + 1:
+    return None
+  tt = lo
+  if t1 > lo:
+    tt = int(math.floor(t1))
+  last = hi
+  if t2 < hi:
+    last = int(math.ceil(t2))
+  while tt <= last:
+    if test(tt):
+      return tt
+    tt += 1
+  return None
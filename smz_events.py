@@ -0,0 +1,420 @@
+# --------------------------------------------------------------------------
+# Filename      : smz_events.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Event-driven version of the SMZ engine in calc_smz.py.
+#
+#                 calc_smz.py visits every (t, v, x, y) record, but a record
+#                 only changes the statistics when the vehicle
+#
+#                 a. enters the smz (its first record within smz_radius of
+#                    (smz_x, smz_y)), or
+#                 b. exits the region (its first record within
+#                    edge_threshold of the region edge, at or after a.)
+#
+#                 Trajectories are piecewise linear (GMSF/MMTS segments),
+#                 so for each segment the records that are inside the smz
+#                 circle, or inside the edge band, are found by solving for
+#                 the crossing times and checking the one or two records
+#                 next to them. Only these enter and exit events are then
+#                 processed, from a priority queue, in the order calc_smz.py
+#                 would have met the records: time, vehicle number, segment.
+#                 The work scales with the number of segments and events,
+#                 not with vehicles x seconds.
+#
+#                 The positions of the other vehicles of an smz group, for
+#                 d_bar, are interpolated from their segments at the moment
+#                 of the exit event.
+#
+#                 The results (print tuple and .sta file) are the same as
+#                 those of calc_smz.py run on the same GMSF/MMTS trace file.
+#
+#                 With exact = True the per-second sampling is dropped
+#                 altogether: segments are taken as they are in the trace
+#                 file (not rounded to whole seconds), a vehicle enters the
+#                 smz at the moment its path crosses the circle and exits at
+#                 the moment it reaches the edge band (see seg_geom.py), and
+#                 d_bar uses the other vehicles' positions at that moment.
+#                 Times in the .sta file are then fractional seconds, and the
+#                 results no longer depend on the time resolution.
+#
+#                 Otherwise the records are those of time steps of step
+#                 seconds (see traj_source.py), as in calc_smz.py; since
+#                 only the crossing steps are looked at, a sub-second step
+#                 costs (almost) nothing extra here.
+#
+#                 note: exact mode is not the limit of ever finer steps,
+#                 and the two must not be compared as if it were. In
+#                 calc_smz.py an exited vehicle is only left out of d_bar
+#                 (vehx = -2) until its next record: a later record of it
+#                 (still in the region, inside the edge band) makes it a
+#                 decoy again for the vehicles of its group that exit
+#                 after it. Exact mode leaves every exited vehicle out.
+#                 The finer the step, the sooner an exited vehicle has its
+#                 next record, so the sampled k grows with finer steps
+#                 instead of converging to the exact one: rural.txt, 20 s,
+#                 30 m, tot-sys k is 2.19 with 1 s steps, 2.87 with 0.1 s,
+#                 2.86 with 0.01 s, but 2.10 exact. Compare results of one
+#                 mode, at one step.
+#
+#                 Approximate mode (fraction < 1), for coarse scans of the
+#                 parameter grid: the events of every vehicle are still
+#                 found and processed, so smz group counts and exits are
+#                 those of the full population, but k, d_bar and
+#                 anon_duration are only computed for a random sample
+#                 (fraction, seeded) of the vehicles that enter the smz;
+#                 d_bar, which compares an exiting vehicle with every
+#                 other member of its group, is most of the work. The
+#                 sampled values are exact; the averages are estimated
+#                 from them (vehicles that never enter the smz are known
+#                 to have k = 1, d_bar = 0, anon_duration = 0), and each
+#                 is returned with the half-width of its confidence
+#                 interval (normal approximation, finite population
+#                 correction; 0 if every vehicle was sampled, inf if only
+#                 one of several was). The .sta file lists the sampled and
+#                 the never-entered vehicles.
+#
+# Input file    : GMSF/MMTS trace file (city.txt, urban.txt, rural.txt),
+#                 see gen_traj.py
+#
+# Output        : same as calc_smz.py
+#
+# Usage         : import smz_events
+#                 smz_events.smz_stats(20, 30, 2290, 800, "rural.txt")
+#                 result, bounds = smz_events.smz_stats(20, 30, 2290, 800,
+#                   "city.txt", fraction = 0.1)
+#
+# --------------------------------------------------------------------------
+
+import math
+import heapq
+import random
+
+import seg_geom
+import traj_source
+
+ENTER = 0  # event kinds; at the same record an entry comes before an exit
+EXIT  = 1
+
+
+def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile,
+  region = None, sim_time = None, outfile = "calc_kda_smz.sta",
+  exact = False, step = None, fraction = None, seed = 1, confidence = 0.95):
+  # same as calc_smz.smz_stats, for a GMSF/MMTS trace file
+  # (in continuous time if exact, see above); with a sample fraction < 1,
+  # returns (estimated result, confidence bounds), see above
+
+  source = traj_source.open_trace(infile, step) # (or a source already)
+  infile = source.infile
+  if not isinstance(source, traj_source.GmsfSource):
+    raise ValueError("%s: the event engine needs a GMSF/MMTS trace file"
+      % infile)
+  step = source.step
+  if sim_time is None:
+    SIM_TIME = source.sim_time # (in steps)
+  else:
+    SIM_TIME = traj_source.to_steps(sim_time, step)
+  horizon = max(SIM_TIME, source.tmax) # last step of the trace
+  if exact:
+    horizon = traj_source.to_seconds(horizon, step)
+    step = 1 # (times are in seconds)
+  smz_steps = traj_source.to_steps(smz_duration, step) # smz_duration in steps
+  if region is None:
+    region = source.region
+  xmin, ymin, xmax, ymax = region
+  edge_threshold = 20
+
+  # segment j starts at start[j] and its record tt (0 <= tt <= elapsed[j])
+  # is at (curx[j] + tt * delta_x[j], cury[j] + tt * delta_y[j])
+  curx = source.curx
+  cury = source.cury
+  if exact:
+    # continuous time: tt is any real 0 <= tt <= duration (a segment of
+    # zero duration is a standing point)
+    start   = source.stamp
+    elapsed = source.duration
+    delta_x = [(source.finx[j] - curx[j]) / elapsed[j] if elapsed[j] else 0.0
+      for j in range(len(start))]
+    delta_y = [(source.finy[j] - cury[j]) / elapsed[j] if elapsed[j] else 0.0
+      for j in range(len(start))]
+  else:
+    # whole seconds, as generated by gen_traj.py
+    start   = source.start
+    elapsed = source.elapsed
+    delta_x = source.delta_x
+    delta_y = source.delta_y
+
+  def inside (j, tt):
+    # true if record tt of segment j is inside the smz (as in calc_smz.py)
+    return smz_radius > math.sqrt((float(curx[j] + tt * delta_x[j])
+      - smz_x) ** 2 + (float(cury[j] + tt * delta_y[j]) - smz_y) ** 2)
+
+  def in_band (j, tt):
+    # true if record tt of segment j is near the edge (as in calc_smz.py)
+    x = curx[j] + tt * delta_x[j]
+    y = cury[j] + tt * delta_y[j]
+    return x < xmin + edge_threshold or x > xmax - edge_threshold \
+      or y < ymin + edge_threshold or y > ymax - edge_threshold
+
+  def first_inside (j, lo):
+    # first tt >= lo of segment j inside the smz, or None
+    t1, t2 = seg_geom.circle_times(curx[j], cury[j], delta_x[j], delta_y[j],
+      smz_x, smz_y, smz_radius)
+    if exact:
+      return seg_geom.first_time([(t1, t2)], lo, elapsed[j])
+    return seg_geom.first_sample(lo, elapsed[j], t1, t2,
+      lambda tt: inside(j, tt))
+
+  def first_in_band (j, lo):
+    # first tt >= lo of segment j near the edge, or None
+    bands = seg_geom.band_times(curx[j], cury[j], delta_x[j], delta_y[j],
+      region, edge_threshold)
+    if exact:
+      return seg_geom.first_time(bands, lo, elapsed[j])
+    best = None
+    for t1, t2 in bands:
+      tt = seg_geom.first_sample(lo, elapsed[j], t1, t2,
+        lambda tt: in_band(j, tt))
+      if tt is not None and (best is None or tt < best):
+        best = tt
+    return best
+
+  # ---------- 1. find the enter and exit events of every vehicle ----------
+
+  events = [] # priority queue of (t, v, segment, kind)
+  for v in range(source.vmin, source.vmax + 1):
+    segs = source.vehicle_segments(v)
+    enter = None # (t, segment) of the first record inside the smz
+    for j in segs:
+      if enter is not None and start[j] > enter[0]:
+        break
+      tt = first_inside(j, 0)
+      if tt is not None and (enter is None or (start[j] + tt, j) < enter):
+        enter = (start[j] + tt, j)
+    if enter is None:
+      continue
+    heapq.heappush(events, (enter[0], v, enter[1], ENTER))
+    leave = None # (t, segment) of the first record near the edge from enter
+    for j in segs:
+      if leave is not None and start[j] > leave[0]:
+        break
+      if start[j] + elapsed[j] < enter[0]:
+        continue
+      lo = max(0, enter[0] - start[j])
+      if start[j] + lo == enter[0] and j < enter[1] and not exact:
+        lo += 1 # same second, but before the entry record
+      tt = first_in_band(j, lo)
+      if tt is not None and (leave is None or (start[j] + tt, j) < leave):
+        leave = (start[j] + tt, j)
+    if leave is not None:
+      heapq.heappush(events, (leave[0], v, leave[1], EXIT))
+
+  # ---------- 2. initialize variables for gathering statistics ------------
+
+  n = source.vmax + 2
+  smz_grp          = [-1] * n
+  k                = [-1] * n
+  d_bar            = [0] * n
+  anon_duration    = [0] * n
+  smz_exit_time    = [-1] * n
+  region_exit_time = [-1] * n
+  exit_record      = [None] * n # (t, segment) of the exit event
+  members          = {}         # smz_grp -> vehicles that entered it
+
+  smz_total = 0
+  smz_count = [0] * (int(horizon // smz_steps) + 2)
+
+  def last_record (j, t):
+    # returns (t, segment) of the last record of vehicle j at or before t
+    best = None
+    for s in source.vehicle_segments(j):
+      if start[s] > t:
+        break
+      rec = (min(t, start[s] + elapsed[s]), s)
+      if best is None or rec > best:
+        best = rec
+    return best
+
+  def position (rec):
+    s = rec[1]
+    tt = rec[0] - start[s]
+    return (curx[s] + tt * delta_x[s], cury[s] + tt * delta_y[s])
+
+  # ----- the vehicles whose statistics are computed
+  sample = None # (all)
+  if fraction is not None and fraction < 1:
+    entered = sorted([v for t, v, seg, kind in events if kind == ENTER])
+    size = min(len(entered), max(2, int(round(fraction * len(entered)))))
+    sample = set(random.Random(seed).sample(entered, size))
+
+  # ---------- 3. process events in record order ---------------------------
+
+  while events:
+    t, v, seg, kind = heapq.heappop(events)
+    if kind == ENTER:
+      cur_smz_grp = int(t // smz_steps)
+      smz_grp[v] = cur_smz_grp
+      smz_count[cur_smz_grp] += 1
+      smz_total += 1
+      smz_exit_time[v] = (cur_smz_grp + 1) * smz_steps
+      members.setdefault(cur_smz_grp, []).append(v)
+      continue
+
+    # ----- exit: compute k, d_bar and anon_duration (as in calc_smz.py)
+    exit_record[v] = (t, seg)
+    region_exit_time[v] = t
+    k[v] = smz_count[smz_grp[v]]
+    smz_count[smz_grp[v]] -= 1
+    if sample is not None and v not in sample:
+      continue
+    x, y = position((t, seg))
+
+    d_sum = 0
+    d_count = 0
+    for j in sorted(members[smz_grp[v]]):
+      if j == v:
+        continue
+      # where calc_smz.py last saw j: at this second if j comes before v
+      # in the slice, else the second before; a vehicle is inactive
+      # (vehx = -2) right after its own exit record. in continuous time
+      # j is simply where it is at t, unless it has exited
+      if exact:
+        if exit_record[j] is not None:
+          continue
+        rec = last_record(j, t)
+      else:
+        rec = last_record(j, t if j < v else t - 1)
+      if rec is None or rec == exit_record[j]:
+        continue
+      px, py = position(rec)
+      d_sum = d_sum + math.sqrt((float(x) - px) ** 2 \
+        + (float(y) - py) ** 2)
+      d_count += 1
+    if d_sum > 0 and k[v] > 0:
+      d_bar[v] = float(d_sum) / (d_count + 1)
+      k[v] = d_count + 1
+
+    if region_exit_time[v] > smz_exit_time[v]:
+      anon_duration[v] = traj_source.to_seconds(
+        region_exit_time[v] - smz_exit_time[v], step)
+    else:
+      anon_duration[v] = 0
+
+  # ---------- 4. write statistics to .sta file and print summary results --
+
+  k_sum = 0
+  d_sum = 0
+  a_sum = 0
+  k_sum_indiv = 0
+  d_sum_indiv = 0
+  a_sum_indiv = 0
+  counter = 0
+
+  sampled = [] # (k, d_bar, anon_duration) of the sampled vehicles
+  sta = open(outfile, "w")
+  for v in range(source.vmin, source.vmax + 1):
+    if sample is not None and smz_grp[v] > -1:
+      if v not in sample:
+        counter += 1
+        continue
+      sampled.append((max(k[v], 1), d_bar[v], anon_duration[v]))
+    end_x, end_y = (-1, -1)
+    rec = last_record(v, float("inf"))
+    if rec is not None:
+      end_x, end_y = position(rec)
+    if k[v] < 1:
+      k[v] = 1
+    s  = str(source.ids[v])
+    s += " " + str(k[v])
+    s += " " + str(d_bar[v])
+    s += " " + str(anon_duration[v])
+    s += " " + str(traj_source.to_seconds(smz_exit_time[v], step))
+    s += " " + str(traj_source.to_seconds(region_exit_time[v], step))
+    s += " " + str(end_x)
+    s += " " + str(end_y)
+    s += " " + str(smz_grp[v])
+    k_sum += k[v]
+    d_sum += d_bar[v]
+    a_sum += anon_duration[v]
+    if k[v] > 1:
+      k_sum_indiv += k[v]
+      d_sum_indiv += d_bar[v]
+      a_sum_indiv += anon_duration[v]
+    counter += 1
+    sta.write(s + "\n")
+  counter_indiv = smz_total
+  sta.close()
+
+  count_total = 0
+  for i in range(len(smz_count)):
+    if smz_count[i] > 0:
+      count_total += smz_count[i]
+
+  if sample is not None:
+    return estimate(sampled, infile, smz_duration, smz_radius, counter,
+      counter_indiv, count_total, confidence)
+
+  result = ("parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
+    float(k_sum) / counter, float(d_sum) / counter, float(a_sum) / counter, \
+    counter, " - anon-only-kda:", float(k_sum_indiv) / counter_indiv, \
+    float(d_sum_indiv) / counter_indiv, float(a_sum_indiv) / counter_indiv, \
+    counter_indiv, count_total)
+  print (result)
+  return result
+
+
+def estimate (sampled, infile, smz_duration, smz_radius, counter,
+  counter_indiv, count_total, confidence):
+  # returns (result, bounds): the averages of smz_stats estimated from the
+  # (k, d_bar, anon_duration) of a sample of the counter_indiv vehicles
+  # that entered the smz, and the half-widths of their confidence intervals
+  n = len(sampled)
+  z = normal_quantile(0.5 + confidence / 2.0)
+
+  def mean_bound (values):
+    # sample mean of values and half-width of its confidence interval
+    mean = math.fsum(values) / n
+    if n == counter_indiv: # (a census: the mean is exact)
+      return (mean, 0.0)
+    if n < 2: # (no variance from one value)
+      return (mean, float("inf"))
+    var = math.fsum([(x - mean) ** 2 for x in values]) / (n - 1)
+    fpc = float(counter_indiv - n) / (counter_indiv - 1)
+    return (mean, z * math.sqrt(var / n * fpc))
+
+  # all vehicles: the ones that never entered have k = 1 and no d_bar or
+  # anon_duration; the others are counter_indiv times the sample mean
+  share = float(counter_indiv) / counter
+  rest = float(counter - counter_indiv) / counter
+  k_all = mean_bound([s[0] for s in sampled])
+  d_all = mean_bound([s[1] for s in sampled])
+  a_all = mean_bound([s[2] for s in sampled])
+  # anon-only sums (k > 1), divided by counter_indiv as in smz_stats
+  k_ind = mean_bound([s[0] * (s[0] > 1) for s in sampled])
+  d_ind = mean_bound([s[1] * (s[0] > 1) for s in sampled])
+  a_ind = mean_bound([s[2] * (s[0] > 1) for s in sampled])
+
+  result = ("parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
+    rest + share * k_all[0], share * d_all[0], share * a_all[0], \
+    counter, " - anon-only-kda:", k_ind[0], d_ind[0], a_ind[0], \
+    counter_indiv, count_total)
+  bounds = ("bounds:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
+    share * k_all[1], share * d_all[1], share * a_all[1], \
+    counter, " - anon-only-kda:", k_ind[1], d_ind[1], a_ind[1], \
+    n, confidence)
+  print (result)
+  print (bounds)
+  return (result, bounds)
+
+
+def normal_quantile (p):
+  # returns z with P(Z < z) = p for a standard normal Z (by bisection)
+  lo, hi = -10.0, 10.0
+  for i in range(100):
+    mid = (lo + hi) / 2
+    if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+      lo = mid
+    else:
+      hi = mid
+  return (lo + hi) / 2
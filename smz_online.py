@@ -0,0 +1,193 @@
+# --------------------------------------------------------------------------
+# Filename      : smz_online.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Online (streaming) version of the SMZ statistics of
+#                 calc_smz.py, for live or replayed traces.
+#
+#                 An SmzMonitor takes time slices (t, cid, curx, cury) as
+#                 they arrive and applies the rules of section 6 of
+#                 calc_smz.py to each record: a vehicle joins the smz group
+#                 of the current period when it comes within smz_radius of
+#                 (smz_x, smz_y), and its k, d_bar and anon_duration are
+#                 fixed when it first comes within edge_threshold of the
+#                 edge of the region afterwards.
+#
+#                 The sums behind the printed averages are kept up to date
+#                 as vehicles exit, so current() costs O(1) at any time,
+#                 and an exit only looks at the members of its own smz
+#                 group (calc_smz.py scans all vehicles). Per-vehicle
+#                 state is kept in dicts, so the vehicle numbers need not
+#                 be known in advance, nor be dense: the averages are over
+#                 the vehicles seen so far.
+#
+#                 Once the whole trace has been fed, current() is the
+#                 tuple calc_smz.smz_stats prints for the same parameters
+#                 (the per-vehicle values are identical; the d_bar averages
+#                 may differ in the last digit, because d_bar is summed in
+#                 order of exit here, not in vehicle order).
+#                 Before that, vehicles that have not left the region count
+#                 as k = 1, d_bar = 0, anon_duration = 0, as they would in
+#                 a batch run that stopped at the current slice.
+#
+# Output print  : same form as calc_smz.py (see the end of its section 7)
+#
+# Usage         : monitor = SmzMonitor(20, 30, 2290, 800, region)
+#                 for t, cid, curx, cury in feed:
+#                   monitor.update(t, cid, curx, cury)
+#                   ... monitor.current() ...
+#
+#                 python smz_online.py rural.txt 20 30 2290 800 [every]
+#
+#                 replays a trace and prints the current values every
+#                 "every" slices (default 100)
+#
+# --------------------------------------------------------------------------
+
+import sys
+import math
+import time
+import bisect
+
+import traj_source
+
+
+class SmzMonitor:
+  # running SMZ statistics (see above)
+
+  def __init__ (self, smz_duration, smz_radius, smz_x, smz_y, region,
+    step = 1, name = "live", edge_threshold = 20):
+    self.smz_duration = smz_duration
+    self.smz_radius = smz_radius
+    self.smz_x = smz_x
+    self.smz_y = smz_y
+    self.region = region
+    self.step = step
+    self.name = name
+    self.edge_threshold = edge_threshold
+    self.smz_steps = traj_source.to_steps(smz_duration, step)
+
+    self.t = None            # last slice seen
+    self.smz_grp = {}        # vehicle -> smz group (vehicles that entered)
+    self.smz_exit_time = {}  # vehicle -> end of its smz period (steps)
+    self.vehx = {}           # vehicle -> most recent position (-2: exited)
+    self.vehy = {}
+    self.exited = {}         # vehicle -> (k, d_bar, anon_duration, t)
+    self.members = {}        # smz group -> its vehicles, sorted
+    self.smz_count = {}      # smz group -> vehicles in it, not yet exited
+
+    self.smz_total = 0       # vehicles that entered the smz
+    self.k_sum = 0           # sums over the vehicles that exited
+    self.d_sum = 0
+    self.a_sum = 0
+    self.k_sum_indiv = 0     # same, over those with k > 1
+    self.d_sum_indiv = 0
+    self.a_sum_indiv = 0
+
+  def update (self, t, cid, curx, cury):
+    # processes the records of time slice t (sorted by vehicle number)
+    xmin, ymin, xmax, ymax = self.region
+    edge = self.edge_threshold
+    self.t = t
+    for i in range(len(cid)):
+      v = cid[i]
+      self.vehx[v] = curx[i]
+      self.vehy[v] = cury[i]
+
+      # ----- entering the smz
+      if v not in self.smz_grp and self.smz_radius > math.sqrt((float(
+        curx[i]) - self.smz_x) ** 2 + (float(cury[i]) - self.smz_y) ** 2):
+        grp = t / self.smz_steps
+        self.smz_grp[v] = grp
+        self.smz_count[grp] = self.smz_count.get(grp, 0) + 1
+        bisect.insort(self.members.setdefault(grp, []), v)
+        self.smz_total += 1
+        self.smz_exit_time[v] = (grp + 1) * self.smz_steps
+
+      # ----- exiting the region
+      if v in self.smz_grp and v not in self.exited and (
+        curx[i] < xmin + edge or curx[i] > xmax - edge
+        or cury[i] < ymin + edge or cury[i] > ymax - edge):
+        self.exit(v, t, curx[i], cury[i])
+
+  def exit (self, v, t, x, y):
+    # fixes k, d_bar and anon_duration of vehicle v, exiting at (x, y)
+    grp = self.smz_grp[v]
+    k = self.smz_count[grp]
+    self.smz_count[grp] -= 1
+    d_bar = 0
+    d_sum = 0
+    d_count = 0
+    for j in self.members[grp]: # (in vehicle order, as calc_smz.py)
+      if self.vehx[j] > -1 and v != j:
+        d_sum = d_sum + math.sqrt((float(x) - self.vehx[j]) ** 2 \
+          + (float(y) - self.vehy[j]) ** 2)
+        d_count += 1
+    if d_sum > 0 and k > 0:
+      d_bar = float(d_sum) / (d_count + 1)
+      k = d_count + 1
+    anon_duration = 0
+    if t > self.smz_exit_time[v]:
+      anon_duration = traj_source.to_seconds(t - self.smz_exit_time[v],
+        self.step)
+    self.vehx[v] = -2
+    self.vehy[v] = -2
+    self.exited[v] = (k, d_bar, anon_duration, t)
+
+    self.k_sum += k
+    self.d_sum += d_bar
+    self.a_sum += anon_duration
+    if k > 1:
+      self.k_sum_indiv += k
+      self.d_sum_indiv += d_bar
+      self.a_sum_indiv += anon_duration
+
+  def feed (self, slices):
+    # processes every slice of an iterable of (t, cid, curx, cury)
+    for t, cid, curx, cury in slices:
+      self.update(t, cid, curx, cury)
+
+  def vehicle (self, v):
+    # returns (k, d_bar, anon_duration) of vehicle v so far
+    if v in self.exited:
+      return self.exited[v][:3]
+    return (1, 0, 0)
+
+  def current (self):
+    # returns the current statistics, in the form calc_smz.py prints them
+    counter = len(self.vehx) # (the vehicles seen, whatever their numbers)
+    k_sum = self.k_sum + counter - len(self.exited) # (k = 1 if not exited)
+    counter_indiv = self.smz_total
+    count_total = self.smz_total - len(self.exited)
+    return ("parms:", self.name, self.smz_duration, self.smz_radius,
+      " - tot-sys-kda:", _avg(k_sum, counter), _avg(self.d_sum, counter),
+      _avg(self.a_sum, counter), counter, " - anon-only-kda:",
+      _avg(self.k_sum_indiv, counter_indiv),
+      _avg(self.d_sum_indiv, counter_indiv),
+      _avg(self.a_sum_indiv, counter_indiv), counter_indiv, count_total)
+
+
+def _avg (total, count):
+  if count == 0:
+    return 0.0
+  return float(total) / count
+
+
+if __name__ == "__main__":
+
+  print (time.ctime()) # beginning of program
+  infile = sys.argv[1]
+  every = 100
+  if len(sys.argv) > 6:
+    every = int(sys.argv[6])
+  source = traj_source.open_trace(infile, stream = True)
+  monitor = SmzMonitor(int(sys.argv[2]), int(sys.argv[3]),
+    float(sys.argv[4]), float(sys.argv[5]), source.region, source.step,
+    infile)
+  for t, cid, curx, cury in source.slices():
+    monitor.update(t, cid, curx, cury)
+    if t % every == 0:
+      print ((t,) + monitor.current())
+  print (monitor.current())
+  print (time.ctime()) # ===== end of program =====
@@ -0,0 +1,305 @@
+# --------------------------------------------------------------------------
+# Filename      : smz_parallel.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Time-partitioned parallel version of calc_smz.smz_stats,
+#                 for the latency of a single parameter set (cell).
+#
+#                 The timeline is split into windows, each run by a worker
+#                 process (forked after the trace is loaded, so all share
+#                 its arrays, as in batch_run.py): two passes over the
+#                 records with a merge between them,
+#
+#                 1. scan: each worker reads the records of its window and
+#                    notes, per vehicle, its first record within
+#                    smz_radius of the smz, its first record near the
+#                    edge of the region (also the first at or after that
+#                    smz record) and its last record; records are told
+#                    apart by (t, position in the slice), as a vehicle may
+#                    have more than one record in a slice
+#                 2. merge (in the parent, per vehicle, cheap): the smz
+#                    entry of a vehicle is its first smz record, and its
+#                    exit the first edge record from then on, which gives
+#                    the state of section 6 of calc_smz.py at the start of
+#                    every window: smz groups, group counts, exited
+#                    vehicles and most recent positions (-2 right after
+#                    an exit record)
+#                 3. replay: each worker runs the loop of calc_smz.py over
+#                    its window from that state, computing k, d_bar and
+#                    anon_duration of the vehicles exiting in it (the
+#                    expensive part); d_bar only looks at the members of
+#                    the exiting vehicle's smz group, in vehicle order, as
+#                    smz_online.py does
+#
+#                 The records of each window are seen exactly as calc_smz.py
+#                 sees them, with the same state, so the statistics and
+#                 the .sta file are identical to calc_smz.py's.
+#
+# Output file   : .sta statistics file, as calc_smz.py
+#
+# Output print  : same form as calc_smz.py (see the end of its section 7)
+#
+# Usage         : import smz_parallel
+#                 smz_parallel.smz_stats(20, 30, 390, 1710, "city.srt",
+#                   processes = 8)
+#
+#                 windows (default: processes) may be more than processes,
+#                 to even out windows of unequal work
+#
+# --------------------------------------------------------------------------
+
+import math
+import bisect
+import multiprocessing
+
+import traj_source
+
+
+EDGE_THRESHOLD = 20  # (m) a vehicle this near the edge exits the region
+
+_run = None # (source, parameters) of the run (inherited by the workers)
+
+
+def smz_stats (smz_duration, smz_radius, smz_x, smz_y, infile,
+  region = None, sim_time = None, outfile = "calc_kda_smz.sta", step = None,
+  processes = None, windows = None):
+  # same as calc_smz.smz_stats, with windows of the timeline run by
+  # processes workers (see above); infile may be a source opened already
+  global _run
+  source = traj_source.open_trace(infile, step)
+  infile = source.infile
+  step = source.step
+  if sim_time is None:
+    SIM_TIME = source.sim_time # (in steps)
+  else:
+    SIM_TIME = traj_source.to_steps(sim_time, step)
+  if region is None:
+    region = source.region
+  smz_steps = traj_source.to_steps(smz_duration, step)
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  if windows is None:
+    windows = processes
+
+  n = source.tmax + 1 - source.tmin
+  bounds = [source.tmin + n * w // windows for w in range(windows + 1)]
+  spans = [(bounds[w], bounds[w + 1]) for w in range(windows)
+    if bounds[w + 1] > bounds[w]]
+  groups = max(SIM_TIME, source.tmax) // smz_steps + 2
+
+  _run = (source, smz_radius, smz_x, smz_y, region, smz_steps, groups, step)
+  if processes == 1:
+    workers = None
+    run = map
+  else:
+    workers = multiprocessing.Pool(processes) # forked after the load
+    run = workers.map
+  try:
+    scans = run(_scan, spans)
+    starts, t_in, t_out, last = merge(spans, scans, source, smz_steps,
+      groups)
+    parts = run(_replay, starts)
+  finally:
+    if workers is not None:
+      workers.close()
+      workers.join()
+    _run = None
+
+  # ---------- statistics of the exits of all windows (as calc_smz.py) -------
+
+  exits = {}
+  for part in parts:
+    exits.update(part)
+
+  k_sum = 0
+  d_sum = 0
+  a_sum = 0
+  k_sum_indiv = 0
+  d_sum_indiv = 0
+  a_sum_indiv = 0
+  counter = 0
+  smz_count = [0] * groups
+
+  sta = open(outfile, "w")
+  for v in range(source.vmin, source.vmax + 1):
+    k, d_bar, anon_duration, smz_exit_time, region_exit_time = \
+      (1, 0, 0, -1, -1)
+    smz_grp = -1
+    if v in t_in:
+      smz_grp = t_in[v] // smz_steps
+      smz_exit_time = (smz_grp + 1) * smz_steps
+      smz_count[smz_grp] += 1
+    if v in exits:
+      k, d_bar, anon_duration, region_exit_time = exits[v]
+      smz_count[smz_grp] -= 1
+      if k < 1:
+        k = 1
+    end_x, end_y = (-1, -1)
+    if v in last:
+      end_x, end_y = last[v][2:]
+    s  = str(source.ids[v])
+    s += " " + str(k)
+    s += " " + str(d_bar)
+    s += " " + str(anon_duration)
+    s += " " + str(traj_source.to_seconds(smz_exit_time, step))
+    s += " " + str(traj_source.to_seconds(region_exit_time, step))
+    s += " " + str(end_x)
+    s += " " + str(end_y)
+    s += " " + str(smz_grp)
+    k_sum += k
+    d_sum += d_bar
+    a_sum += anon_duration
+    if k > 1:
+      k_sum_indiv += k
+      d_sum_indiv += d_bar
+      a_sum_indiv += anon_duration
+    counter += 1
+    sta.write(s + "\n")
+  counter_indiv = len(t_in)
+  sta.close()
+
+  count_total = 0
+  for i in range(len(smz_count)):
+    if smz_count[i] > 0:
+      count_total += smz_count[i]
+
+  result = ("parms:", infile, smz_duration, smz_radius, " - tot-sys-kda:", \
+    float(k_sum) / counter, float(d_sum) / counter, float(a_sum) / counter, \
+    counter, " - anon-only-kda:", float(k_sum_indiv) / counter_indiv, \
+    float(d_sum_indiv) / counter_indiv, float(a_sum_indiv) / counter_indiv, \
+    counter_indiv, count_total)
+  print (result)
+  return result
+
+
+def _near_edge (x, y, region):
+  xmin, ymin, xmax, ymax = region
+  return x < xmin + EDGE_THRESHOLD or x > xmax - EDGE_THRESHOLD \
+    or y < ymin + EDGE_THRESHOLD or y > ymax - EDGE_THRESHOLD
+
+
+def _scan (span):
+  # pass 1 over the records of window span = (t0, t1): returns the time of
+  # the first smz record, the first edge record and first edge record at
+  # or after the first smz record, as (t, i) (record i of slice t), and
+  # the last record, as (t, i, x, y), of each vehicle
+  source, smz_radius, smz_x, smz_y, region = _run[:5]
+  first_in = {}
+  first_edge = {}
+  edge_after_in = {}
+  last = {}
+  t0, t1 = span
+  for t, cid, curx, cury in source.slices(t0):
+    if t >= t1:
+      break
+    for i in range(len(cid)):
+      v = cid[i]
+      last[v] = (t, i, curx[i], cury[i])
+      if v not in first_in and smz_radius > math.sqrt((float(curx[i]) \
+        - smz_x) ** 2 + (float(cury[i]) - smz_y) ** 2):
+        first_in[v] = t
+      if _near_edge(curx[i], cury[i], region):
+        if v not in first_edge:
+          first_edge[v] = (t, i)
+        if v in first_in and v not in edge_after_in:
+          edge_after_in[v] = (t, i)
+  return (first_in, first_edge, edge_after_in, last)
+
+
+def merge (spans, scans, source, smz_steps, groups):
+  # pass 2: returns the state at the start of each window, [(t0, t1,
+  # smz_grp, exited, vehx, vehy, smz_count)], and the smz entry time, exit
+  # record (t, i) and last record (t, i, x, y) of every vehicle, {v: ...}
+  t_in = {}
+  t_out = {}
+  for first_in, first_edge, edge_after_in, last in scans:
+    for v in first_edge: # (vehicles that entered in an earlier window)
+      if v in t_in and v not in t_out:
+        t_out[v] = first_edge[v]
+    for v in first_in:
+      if v not in t_in:
+        t_in[v] = first_in[v]
+        if v in edge_after_in:
+          t_out[v] = edge_after_in[v]
+
+  starts = []
+  size = source.vmax + 2
+  smz_grp = [-1] * size
+  exited = [0] * size
+  vehx = [-1] * size
+  vehy = [-1] * size
+  smz_count = [0] * groups
+  last = {}
+  for w in range(len(spans)):
+    t0, t1 = spans[w]
+    starts.append((t0, t1, list(smz_grp), list(exited), list(vehx),
+      list(vehy), list(smz_count)))
+    for v, (t, i, x, y) in scans[w][3].items():
+      last[v] = (t, i, x, y)
+      vehx[v], vehy[v] = (x, y)
+      if t_out.get(v) == (t, i): # (the exit was its last record)
+        vehx[v], vehy[v] = (-2, -2)
+    for v in scans[w][0]:
+      if t_in[v] == scans[w][0][v]:
+        smz_grp[v] = t_in[v] // smz_steps
+        smz_count[smz_grp[v]] += 1
+    for v in t_out:
+      if t0 <= t_out[v][0] < t1:
+        exited[v] = 1
+        smz_count[smz_grp[v]] -= 1
+  return (starts, t_in, t_out, last)
+
+
+def _replay (start):
+  # pass 3: runs the loop of section 6 of calc_smz.py over the records of
+  # one window, from its start state; returns {v: (k, d_bar,
+  # anon_duration, region_exit_time)} of the vehicles exiting in it
+  source, smz_radius, smz_x, smz_y, region, smz_steps, groups, step = _run
+  t0, t1, smz_grp, exited, vehx, vehy, smz_count = start
+  members = {} # smz group -> its vehicles, sorted
+  for v in range(source.vmin, source.vmax + 1):
+    if smz_grp[v] > -1:
+      members.setdefault(smz_grp[v], []).append(v)
+  exits = {}
+  for t, cid, curx, cury in source.slices(t0):
+    if t >= t1:
+      break
+    for i in range(len(cid)):
+      v = cid[i]
+      cur_smz_grp = t // smz_steps
+      vehx[v] = curx[i]
+      vehy[v] = cury[i]
+
+      # ----- entering the smz
+      if smz_radius > math.sqrt((float(curx[i]) - smz_x) ** 2 \
+        + (float(cury[i]) - smz_y) ** 2) and smz_grp[v] < 0:
+        smz_grp[v] = cur_smz_grp
+        smz_count[cur_smz_grp] += 1
+        bisect.insort(members.setdefault(cur_smz_grp, []), v)
+
+      # ----- exiting the region
+      if _near_edge(curx[i], cury[i], region) and smz_grp[v] > -1 \
+        and exited[v] == 0:
+        exited[v] = 1
+        k = smz_count[smz_grp[v]]
+        smz_count[smz_grp[v]] -= 1
+        d_bar = 0
+        d_sum = 0
+        d_count = 0
+        for j in members[smz_grp[v]]:
+          if vehx[j] > -1 and v != j:
+            d_sum = d_sum + math.sqrt((float(curx[i]) - vehx[j]) ** 2 \
+              + (float(cury[i]) - vehy[j]) ** 2)
+            d_count += 1
+        if d_sum > 0 and k > 0:
+          d_bar = float(d_sum) / (d_count + 1)
+          k = d_count + 1
+        anon_duration = 0
+        smz_exit_time = (smz_grp[v] + 1) * smz_steps
+        if t > smz_exit_time:
+          anon_duration = traj_source.to_seconds(t - smz_exit_time, step)
+        exits[v] = (k, d_bar, anon_duration, t)
+        vehx[v] = -2
+        vehy[v] = -2
+  return exits
@@ -0,0 +1,126 @@
+# --------------------------------------------------------------------------
+# Filename      : sta_bootstrap.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Bootstrap confidence intervals for the SMZ k, d_bar and
+#                 anon_duration averages printed by calc_smz.py and
+#                 calc_kda_smz.py, computed from the per-vehicle .sta rows
+#                 of each parameter set (cell), so the simulation does not
+#                 have to be re-run.
+#
+#                 The .sta file of calc_glr.py also holds SMZ statistics
+#                 (those it prints with dual = True), not GLR ones: the
+#                 "GLR parms:" averages are not covered here.
+#
+#                 To get one .sta file per cell, pass outfile to smz_stats:
+#
+#                   smz_stats(20, 30, 2290, 800, "rural.srt",
+#                     outfile = "rural_20_30.sta")
+#
+# Input file    : .sta statistics file (see section 7 of calc_smz.py)
+#
+#                 1 176 537.041296434 0 300 278 5.0 1346.94 2
+#
+#                 v, k, d_bar, anon_duration, smz_exit_time,
+#                 region_exit_time, veh_end_x, veh_end_y, smz_grp
+#
+# Processing    : 1. read the .sta rows of a cell into an array
+#                 2. compute, per metric, the per-vehicle values whose mean
+#                    is the printed average:
+#                    tot-sys-kda   mean over all vehicles
+#                    anon-only-kda mean over vehicles that entered the smz
+#                                  (smz_grp > -1) of the value if k > 1,
+#                                  else 0 (same as sum / smz_total)
+#                 3. resample the vehicles with replacement, all metrics
+#                    and replicates at once (blocks of replicates x vehicles
+#                    index arrays), and take percentile intervals
+#                 4. cells are independent, so they run in a process pool
+#
+# Output print  : ("CI parms:", stafile, metric set, k, k_lo, k_hi,
+#                  d_bar, d_lo, d_hi, anon_duration, a_lo, a_hi, vehicles)
+#
+# Usage         : python sta_bootstrap.py rural_20_30.sta rural_20_60.sta ...
+#
+# --------------------------------------------------------------------------
+
+import sys
+import multiprocessing
+
+import numpy
+
+
+REPLICATES = 5000  # bootstrap replicates per cell
+ALPHA      = 0.05  # 95% confidence intervals
+BLOCK      = 256   # replicates resampled per index array (bounds memory)
+
+
+def read_sta (stafile):
+  # returns the rows of a .sta file as a (vehicles x 9) float array
+  return numpy.loadtxt(stafile, ndmin = 2)
+
+
+def kda_values (rows):
+  # returns {"tot-sys-kda": values, "anon-only-kda": values}, where values
+  # is a (vehicles x 3) array of per-vehicle k, d_bar, anon_duration whose
+  # column means are the averages calc_smz.py prints
+  kda = rows[:, 1:4]
+  anon = rows[rows[:, 8] > -1]
+  anon_kda = anon[:, 1:4] * (anon[:, 1:2] > 1)
+  return {"tot-sys-kda": kda, "anon-only-kda": anon_kda}
+
+
+def bootstrap_ci (values, replicates = REPLICATES, alpha = ALPHA, seed = 0):
+  # returns (means, lo, hi) of the columns of values, where lo and hi are
+  # the percentile bootstrap confidence limits
+  n = len(values)
+  if n == 0:
+    nan = numpy.nan * numpy.ones(values.shape[1])
+    return (nan, nan, nan)
+  rng = numpy.random.RandomState(seed)
+  columns = numpy.ascontiguousarray(values.T)  # one gather per metric
+  means = numpy.empty((replicates, len(columns)))
+  for first in range(0, replicates, BLOCK):
+    last = min(first + BLOCK, replicates)
+    idx = rng.randint(0, n, size = (last - first, n))
+    for c in range(len(columns)):
+      means[first:last, c] = columns[c].take(idx).mean(axis = 1)
+  lo, hi = numpy.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)],
+    axis = 0)
+  return (values.mean(axis = 0), lo, hi)
+
+
+def cell_ci (stafile, replicates = REPLICATES, alpha = ALPHA, seed = 0):
+  # returns a list of print tuples (see Output print) for one cell
+  rows = read_sta(stafile)
+  result = []
+  for name, values in sorted(kda_values(rows).items(), reverse = True):
+    mean, lo, hi = bootstrap_ci(values, replicates, alpha, seed)
+    result.append(("CI parms:", stafile, name,
+      mean[0], lo[0], hi[0], mean[1], lo[1], hi[1], mean[2], lo[2], hi[2],
+      len(values)))
+  return result
+
+
+def _cell_ci (args):
+  return cell_ci(*args)
+
+
+def sweep_ci (stafiles, replicates = REPLICATES, alpha = ALPHA, seed = 0,
+  processes = None):
+  # returns cell_ci() of every .sta file, computed in parallel
+  jobs = [(f, replicates, alpha, seed) for f in stafiles]
+  if processes == 1 or len(jobs) < 2:
+    return [_cell_ci(job) for job in jobs]
+  pool = multiprocessing.Pool(processes)
+  try:
+    return pool.map(_cell_ci, jobs)
+  finally:
+    pool.close()
+    pool.join()
+
+
+if __name__ == "__main__":
+  for cell in sweep_ci(sys.argv[1:]):
+    for line in cell:
+      print (line)
@@ -0,0 +1,159 @@
+# --------------------------------------------------------------------------
+# Filename      : sweep_journal.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Checkpoint and resume support for long sweeps.
+#
+#                 1. results journal: every completed parameter set (cell)
+#                    of a sweep is appended to a journal file as soon as it
+#                    is done, one line per cell, (key, result): the key of
+#                    the cell (cell_key: label, infile, smz_duration,
+#                    smz_radius, smz_x, smz_y and the options that change
+#                    the result, such as step) and the result tuple in the
+#                    form smz_stats prints it. On restart the cells already
+#                    in the journal are skipped. Each line is written with
+#                    a single write() to a file opened for appending, then
+#                    fsync'ed, so an interruption leaves at most one
+#                    partial last line, which is dropped.
+#
+#                 2. engine checkpoints: smz_stats can save its vehicle
+#                    state arrays at time-slice boundaries and, when run
+#                    again with the same parameters, resume from the last
+#                    saved slice. A checkpoint is written to a temporary
+#                    file and renamed over the old one, so there is always
+#                    one complete checkpoint.
+#
+# Usage         : journal = Journal("calc_glr.journal")
+#                 journal.run(cell_key("GLR parms:", "city.srt", 20, 30, 390,
+#                   1710), smz_stats, 20, 30, 390, 1710, "city.srt",
+#                   checkpoint = "calc_glr.ckpt")
+#
+#                 runs the cell unless it is in the journal already;
+#                 journal.merge("calc.txt", (2290, 800)) also skips the
+#                 cells of an earlier output file (read only), whose result
+#                 tuples do not hold the smz centre: the cells in it are
+#                 taken as run at (2290, 800), with no other options
+#
+# --------------------------------------------------------------------------
+
+import os
+import ast
+import cPickle
+
+
+# smz_stats options that do not change the result (left out of cell keys)
+OUTPUT_OPTIONS = ("outfile", "checkpoint", "checkpoint_every", "glr_outfile",
+  "hist_outfile", "processes", "windows")
+
+
+def cell_key (label, infile, smz_duration, smz_radius, smz_x, smz_y,
+  **options):
+  # returns the journal key of a cell: its parameters, and the options of
+  # smz_stats that change its result (in name order; None ones left out)
+  key = (label, infile, smz_duration, smz_radius, smz_x, smz_y)
+  for name, value in sorted(options.items()):
+    if name not in OUTPUT_OPTIONS and value is not None:
+      key += ((name, value),)
+  return key
+
+
+def append_line (path, line):
+  # appends line (with a newline) to path with one write, and syncs it
+  fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+  try:
+    os.write(fd, line + "\n")
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+
+def drop_partial_line (path):
+  # removes a partial last line (left by an interrupted append_line)
+  if not os.path.exists(path):
+    return
+  jf = open(path, "rb+")
+  text = jf.read()
+  if text and not text.endswith("\n"):
+    jf.truncate(text.rfind("\n") + 1)
+  jf.close()
+
+
+class Journal:
+  # journal of completed cells, by cell key (see cell_key)
+
+  def __init__ (self, path):
+    self.path = path
+    self.results = {}
+    if not os.path.exists(path):
+      return
+    drop_partial_line(path)
+    self.merge(path)
+
+  def merge (self, path, centre = None):
+    # adds the cells of a journal to the completed cells; or, given the
+    # smz centre (smz_x, smz_y) they were run at, the result tuples printed
+    # in an output file of a sweep, such as calc.txt
+    jf = open(path, "r")
+    text = jf.read()
+    jf.close()
+    for line in text.split("\n"):
+      try:
+        entry = ast.literal_eval(line)
+      except (SyntaxError, ValueError):
+        continue # blank line, or not a result (e.g. a date)
+      if not isinstance(entry, tuple) or not entry:
+        continue
+      if centre is None:
+        if len(entry) == 2 and isinstance(entry[0], tuple):
+          self.results[entry[0]] = entry[1]
+      elif isinstance(entry[0], str) and len(entry) > 4:
+        self.results[cell_key(*(tuple(entry[:4]) + tuple(centre)))] = entry
+
+  def done (self, key):
+    # returns true if the cell with this key is in the journal
+    return tuple(key) in self.results
+
+  def record (self, key, result):
+    # adds a completed cell to the journal and returns its result
+    append_line(self.path, repr((tuple(key), tuple(result))))
+    self.results[tuple(key)] = tuple(result)
+    return result
+
+  def run (self, key, smz_stats, *args, **kwargs):
+    # returns smz_stats(*args, **kwargs), or its journaled result (which is
+    # printed the way smz_stats would print it) if the cell is done already
+    if self.done(key):
+      print (self.results[tuple(key)])
+      return self.results[tuple(key)]
+    return self.record(key, smz_stats(*args, **kwargs))
+
+
+def save_state (path, key, t, state):
+  # saves the engine state as of the end of time slice t;
+  # key identifies the run (infile and parameters)
+  tmp = path + ".tmp"
+  cf = open(tmp, "wb")
+  cPickle.dump((key, t, state), cf, 2)
+  cf.flush()
+  os.fsync(cf.fileno())
+  cf.close()
+  os.rename(tmp, path)
+
+
+def load_state (path, key):
+  # returns (t, state) saved for the run with this key, or None
+  if not os.path.exists(path):
+    return None
+  cf = open(path, "rb")
+  saved_key, t, state = cPickle.load(cf)
+  cf.close()
+  if saved_key != key:
+    return None
+  return (t, state)
+
+
+def clear_state (path):
+  # removes the checkpoint once the run is complete
+  if os.path.exists(path):
+    os.remove(path)
@@ -0,0 +1,76 @@
+# --------------------------------------------------------------------------
+# Filename      : test_link_attack.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (needs numpy)
+#
+# Description   : Checks that link_attack.py gives the same linkability for
+#                 a .srt file as for the GMSF/MMTS trace file it was made
+#                 from, whatever the order of the two records a vehicle has
+#                 in a second where two of its segments meet.
+#
+#                 The .srt file is written from the slices of rural.txt,
+#                 each sorted by vehicle with those records in reverse
+#                 trace file order, and rounded as str() rounds them (as
+#                 gen_traj.py writes them).
+#
+# Usage         : python test_link_attack.py
+#
+# --------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import calc_smz
+import link_attack
+import traj_source
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TRACE = os.path.join(HERE, "rural.txt")
+
+SMZ_X, SMZ_Y = 2290, 800
+
+
+def write_srt (source, outfile):
+  # writes the records of source as a .srt file, duplicates reversed
+  srt = open(outfile, "w")
+  for t, cid, curx, cury in source.slices():
+    order = sorted(range(len(cid)), key = lambda i: (cid[i], -i))
+    for i in order:
+      srt.write("%d %s %s %s\n" % (t, source.ids[cid[i]], str(curx[i]),
+        str(cury[i])))
+  srt.close()
+
+
+class SourcesTest (unittest.TestCase):
+
+  def setUp (self):
+    self.tmp = tempfile.mkdtemp(prefix = "test_link_attack-")
+    self.gmsf = traj_source.open_trace(TRACE)
+    self.srt = os.path.join(self.tmp, "rural.srt")
+    write_srt(self.gmsf, self.srt)
+
+  def tearDown (self):
+    link_attack._points.clear()
+    shutil.rmtree(self.tmp)
+
+  def test_same_linkability (self):
+    for d, r in [(20, 30), (60, 150)]:
+      sta = os.path.join(self.tmp, "rural_%d_%d.sta" % (d, r))
+      calc_smz.smz_stats(d, r, SMZ_X, SMZ_Y, self.gmsf, outfile = sta)
+      lnk = [os.path.join(self.tmp, "gmsf.lnk"),
+        os.path.join(self.tmp, "srt.lnk")]
+      expected = link_attack.linkability(self.gmsf, sta, d, r, SMZ_X, SMZ_Y,
+        lnk[0])
+      got = link_attack.linkability(self.srt, sta, d, r, SMZ_X, SMZ_Y,
+        lnk[1])
+      self.assertEqual(expected[2:], got[2:])
+      tables = [[line.split()[:6] for line in open(path)] for path in lnk]
+      self.assertEqual(tables[0], tables[1])
+
+
+if __name__ == "__main__":
+  unittest.main()
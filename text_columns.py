@@ -0,0 +1,161 @@
+# --------------------------------------------------------------------------
+# Filename      : text_columns.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7 (faster with numpy)
+#
+# Description   : Bulk loader for whitespace separated numeric text files:
+#                 GMSF/MMTS trace files (t, v, x1, y1, x2, y2, duration)
+#                 and .srt files (t, v, x, y).
+#
+#                 Instead of splitting every line and converting every word
+#                 with int() and float(), the file is read in blocks of
+#                 whole lines and each block is
+#
+#                 1. checked: the words of every line are counted at once
+#                    (word starts before each newline, from a byte mask),
+#                    and a line with the wrong number of columns is
+#                    reported with its line number (blank lines are skipped)
+#                 2. parsed: all numbers of the block are converted by one
+#                    numpy.fromstring call, with the same (correctly
+#                    rounded) values float() gives, and cut into columns;
+#                    a word that is not a number, or a fraction in an
+#                    integer column, is reported with its line number
+#
+#                 Columns come back as array() objects of the requested
+#                 typecodes ("i" integer, "d" float), followed, if lines
+#                 is set, by the line number of every row. numpy is only
+#                 imported when the first block is parsed; without it the
+#                 same checks are done line by line (slowly).
+#
+# Usage         : t, v, x, y = read_columns("city.srt", "iidd")
+#
+#                 for t, v, x, y in iter_columns("city.srt", "iidd"):
+#                   ...  (one block of lines at a time)
+#
+# --------------------------------------------------------------------------
+
+from array import array
+
+numpy = None     # imported on first use, see _numpy()
+
+
+BLOCK = 1 << 22  # bytes read at a time (bounds the memory of the checks)
+
+
+def iter_columns (infile, types, lines = False, block = BLOCK):
+  # yields the columns (one array per typecode in types) of consecutive
+  # blocks of lines of infile; raises ValueError for a malformed line
+  f = open(infile, "rb")
+  lineno = 1 # number of the first line of the buffer
+  rest = ""
+  while True:
+    data = f.read(block)
+    buf = rest + data
+    if data:
+      cut = buf.rfind("\n") + 1
+      if cut == 0:
+        rest = buf
+        continue
+      buf, rest = buf[:cut], buf[cut:]
+    if buf:
+      yield parse_block(buf, types, infile, lineno, lines)
+      lineno += buf.count("\n")
+    if not data:
+      break
+  f.close()
+
+
+def read_columns (infile, types, lines = False, block = BLOCK):
+  # returns the columns (one array per typecode in types) of infile
+  columns = [array(code) for code in types + "i" * lines]
+  for part in iter_columns(infile, types, lines, block):
+    for c in range(len(columns)):
+      columns[c].extend(part[c])
+  return columns
+
+
+def parse_block (buf, types, infile = "<text>", lineno = 1, lines = False):
+  # returns the columns of buf, whose first line is line lineno of infile
+  if _numpy() is None:
+    return _parse_lines(buf, types, infile, lineno, lines)
+  ncols = len(types)
+
+  # ----- 1. words per line
+  b = numpy.frombuffer(buf, numpy.uint8)
+  if ((b < 9) | ((b > 13) & (b < 32))).any():
+    # (control characters other than whitespace)
+    return _parse_lines(buf, types, infile, lineno, lines)
+  space = (b <= 32) # whitespace: " \t\n\v\f\r"
+  start = ~space    # first byte of each word
+  start[1:] &= space[:-1]
+  ends = numpy.flatnonzero(b == ord("\n")) # end of each line
+  if b[-1] != ord("\n"):
+    ends = numpy.append(ends, len(b))
+  words = numpy.diff(numpy.searchsorted(numpy.flatnonzero(start), ends),
+    prepend = 0)
+  bad = numpy.flatnonzero((words != 0) & (words != ncols))
+  if len(bad):
+    raise ValueError("%s line %d: expected %d columns, got %d"
+      % (infile, lineno + bad[0], ncols, words[bad[0]]))
+  rows = numpy.flatnonzero(words) # line (from 0) of each row
+
+  # ----- 2. numbers
+  values = numpy.fromstring(buf, sep = " ")
+  if len(values) != len(rows) * ncols:
+    # (fromstring stops at the first word that is not a number)
+    return _parse_lines(buf, types, infile, lineno, lines)
+  values = values.reshape(len(rows), ncols)
+  columns = []
+  for c in range(ncols):
+    col = values[:, c]
+    if types[c] == "i":
+      ints = col.astype(numpy.int32)
+      bad = numpy.flatnonzero(ints != col)
+      if len(bad):
+        raise ValueError("%s line %d: column %d is not an integer: %s"
+          % (infile, lineno + rows[bad[0]], c + 1, col[bad[0]]))
+      col = ints
+    columns.append(array(types[c], col.tostring()))
+  if lines:
+    columns.append(array("i", (rows + lineno).astype(numpy.int32).tostring()))
+  return columns
+
+
+def _numpy ():
+  # returns the numpy module, or None if it is not installed
+  global numpy
+  if numpy is None:
+    try:
+      import numpy
+    except ImportError:
+      numpy = False
+  return numpy or None
+
+
+def _parse_lines (buf, types, infile, lineno, lines = False):
+  # line by line version of parse_block (without numpy, or to find the
+  # line of a word that is not a number)
+  ncols = len(types)
+  columns = [array(code) for code in types + "i" * lines]
+  for i, line in enumerate(buf.split("\n")):
+    words = line.split()
+    if not words:
+      continue
+    if len(words) != ncols:
+      raise ValueError("%s line %d: expected %d columns, got %d"
+        % (infile, lineno + i, ncols, len(words)))
+    for c in range(ncols):
+      try:
+        value = float(words[c])
+      except ValueError:
+        raise ValueError("%s line %d: column %d is not a number: %r"
+          % (infile, lineno + i, c + 1, words[c]))
+      if types[c] == "i":
+        if value != int(value):
+          raise ValueError("%s line %d: column %d is not an integer: %s"
+            % (infile, lineno + i, c + 1, words[c]))
+        value = int(value)
+      columns[c].append(value)
+    if lines:
+      columns[ncols].append(lineno + i)
+  return columns
@@ -0,0 +1,287 @@
+# --------------------------------------------------------------------------
+# Filename      : trace_server.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Shared-memory trace server.
+#
+#                 When several calc_*.py processes run against the same
+#                 trace at the same time, each one parses the trace and
+#                 holds its own copy of the arrays. The trace server loads
+#                 each trace once, writes the arrays of its trajectory
+#                 source (see traj_source.py) into a file in POSIX shared
+#                 memory (/dev/shm), and tells clients over a local (unix)
+#                 socket where each array is. A client maps the file and
+#                 uses the arrays in place: the memory is paid once per
+#                 trace, and opening a trace takes milliseconds.
+#
+#                 Protocol: one request line per connection,
+#
+#                   ("open", trace file, step)
+#
+#                 answered by one line,
+#
+#                   ("ok", shm file, layout, state) or ("error", message)
+#
+#                 both written with repr() and read with literal_eval (no
+#                 pickles cross the socket). layout lists the arrays as
+#                 (name, typecode, offset, length) and state holds every
+#                 other attribute of the source (sizes, metadata, small
+#                 indexes), so the client rebuilds the same source.
+#
+#                 Client arrays are ctypes views of a private (copy on
+#                 write) mapping: they are never written, so all clients
+#                 share the server's pages. A trace is loaded again when
+#                 its file changes.
+#
+#                 Access: by default only the user running the server can
+#                 use it, the socket and the shared memory files are
+#                 created mode 0600. Given a group, the server is shared
+#                 by its members: the socket is created mode 0660 and the
+#                 files 0640 (clients only read them), both in that group.
+#                 A client only maps files that are its own user's, or
+#                 of one of its groups and writable by their owner only,
+#                 so a server of another user cannot plant arrays. At most
+#                 MAX_TRACES traces are kept; the least recently opened
+#                 one is dropped, and its file removed, to make room
+#                 (clients keep their mappings). A trace is loaded outside
+#                 the lock of the store, so requests for other traces are
+#                 answered meanwhile.
+#
+# Usage         : python trace_server.py [socket] [group] (runs the server)
+#
+#                 TRACE_SERVER=/tmp/trace_server-1000.sock python calc_glr.py
+#
+#                 (for a shared server, e.g. python trace_server.py
+#                 /srv/traces/server.sock analysts, with the members of
+#                 analysts setting TRACE_SERVER=/srv/traces/server.sock)
+#
+#                 with TRACE_SERVER set, traj_source.open_trace() gets its
+#                 sources from the server; or, directly,
+#
+#                 source = trace_server.attach("city.txt")
+#
+# --------------------------------------------------------------------------
+
+import os
+import grp
+import sys
+import ast
+import mmap
+import time
+import ctypes
+import signal
+import socket
+import hashlib
+import itertools
+import threading
+import SocketServer
+from array import array
+from collections import OrderedDict
+
+import traj_source
+
+
+# default server address (one per user)
+SOCKET  = "/tmp/trace_server-%d.sock" % os.getuid()
+SHM_DIR = "/dev/shm"  # POSIX shared memory (tmpfs)
+
+MAX_TRACES = 4        # traces kept loaded at a time
+
+CTYPES = {"i": ctypes.c_int, "H": ctypes.c_ushort, "l": ctypes.c_long,
+  "d": ctypes.c_double}
+
+
+# ---------- server ---------------------------------------------------------
+
+class TraceStore:
+  # the traces loaded so far, each written to one shared memory file
+
+  def __init__ (self, shm_dir = SHM_DIR, max_traces = MAX_TRACES,
+    gid = None):
+    if not os.path.isdir(shm_dir):
+      shm_dir = "/tmp"
+    self.shm_dir = shm_dir
+    self.max_traces = max_traces
+    self.gid = gid # group the files are shared with (None: the user only)
+    # (path, step) -> (mtime, shm file, layout, state), least recently
+    # opened first
+    self.traces = OrderedDict()
+    self.loading = {} # (path, step) -> lock held while it is loaded
+    self.lock = threading.Lock()
+    self.serial = itertools.count()
+
+  def open (self, infile, step):
+    # returns (shm file, layout, state) of a trace, loading it if needed
+    path = os.path.realpath(infile)
+    mtime = os.path.getmtime(path)
+    key = (path, step)
+    with self.lock:
+      loading = self.loading.setdefault(key, threading.Lock())
+    with loading:
+      with self.lock:
+        entry = self.traces.pop(key, None)
+        if entry is not None:
+          if entry[0] == mtime:
+            self.traces[key] = entry # (now the most recently opened)
+            return entry[1:]
+          os.remove(entry[1])
+      entry = (mtime,) + self.load(path, step)
+      with self.lock:
+        self.traces[key] = entry
+        while len(self.traces) > self.max_traces:
+          os.remove(self.traces.popitem(last = False)[1][1])
+      return entry[1:]
+
+  def load (self, path, step):
+    # loads a trace and writes its arrays to a new shared memory file
+    source = traj_source.open_trace(path, step)
+    if hasattr(source, "index_vehicles"):
+      source.index_vehicles() # (shared as well)
+    name = "trace_server-%s-%d-%d" % (
+      hashlib.md5(repr((path, step))).hexdigest(), os.getpid(),
+      next(self.serial))
+    shm = os.path.join(self.shm_dir, name)
+    layout = []
+    state = {"kind": source.__class__.__name__}
+    fd = os.open(shm, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+    if self.gid is not None:
+      os.fchown(fd, -1, self.gid)
+      os.fchmod(fd, 0640)
+    out = os.fdopen(fd, "wb")
+    for key, value in sorted(source.__dict__.items()):
+      if isinstance(value, array):
+        out.write("\0" * (-out.tell() % 8)) # aligned for ctypes
+        layout.append((key, value.typecode, out.tell(), len(value)))
+        value.tofile(out)
+      else:
+        state[key] = value
+    out.close()
+    return (shm, layout, state)
+
+  def close (self):
+    # removes the shared memory files (clients keep their mappings)
+    with self.lock:
+      for entry in self.traces.values():
+        os.remove(entry[1])
+      self.traces = {}
+
+
+class _Handler (SocketServer.StreamRequestHandler):
+
+  def handle (self):
+    try:
+      command, infile, step = ast.literal_eval(self.rfile.readline())
+      if command != "open":
+        raise ValueError("unknown command %s" % command)
+      reply = ("ok",) + self.server.store.open(infile, step)
+    except Exception, e:
+      reply = ("error", "%s: %s" % (e.__class__.__name__, e))
+    self.wfile.write(repr(reply) + "\n")
+
+
+class _Server (SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+  daemon_threads = True
+
+
+def group_id (group):
+  # returns the id of a group given by name or number
+  if str(group).isdigit():
+    return int(group)
+  return grp.getgrnam(group).gr_gid
+
+
+def serve (address = SOCKET, shm_dir = SHM_DIR, group = None):
+  # runs the trace server until interrupted; with a group (name or id),
+  # for the members of that group as well (see above)
+  os.environ.pop("TRACE_SERVER", None) # (the server loads the traces itself)
+  gid = None
+  mask = 0177 # (the socket is created mode 0600)
+  if group is not None:
+    gid = group_id(group)
+    mask = 0117 # (0660)
+  if os.path.exists(address):
+    os.remove(address)
+  umask = os.umask(mask)
+  try:
+    server = _Server(address, _Handler)
+    if gid is not None:
+      os.chown(address, -1, gid)
+  finally:
+    os.umask(umask)
+  server.store = TraceStore(shm_dir, gid = gid)
+  print (time.ctime(), "trace server on", address)
+  signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.store.close()
+    server.server_close()
+    os.remove(address)
+
+
+# ---------- client ---------------------------------------------------------
+
+class _Attached:
+  # a source rebuilt from its state, instead of from its trace file
+  def __init__ (self, state):
+    self.__dict__.update(state)
+
+
+class SharedGmsfSource (_Attached, traj_source.GmsfSource):
+  pass
+
+
+class SharedSrtSource (_Attached, traj_source.SrtSource):
+  pass
+
+
+KINDS = {"GmsfSource": SharedGmsfSource, "SrtSource": SharedSrtSource}
+
+
+def request (message, address = SOCKET):
+  # sends one request to the server and returns its reply
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(address)
+    sock.sendall(repr(message) + "\n")
+    reply = sock.makefile("r").readline()
+  finally:
+    sock.close()
+  return ast.literal_eval(reply)
+
+
+def attach (infile, step = None, address = SOCKET):
+  # returns the trajectory source of infile, with its arrays in the
+  # server's shared memory
+  if step is None:
+    step = 1
+  reply = request(("open", os.path.abspath(infile), step), address)
+  if reply[0] != "ok":
+    raise IOError("%s: trace server: %s" % (infile, reply[1]))
+  shm, layout, state = reply[1:]
+  shf = open(shm, "rb")
+  st = os.fstat(shf.fileno())
+  if st.st_uid != os.getuid() and (st.st_mode & 0022 \
+    or st.st_gid not in [os.getgid()] + os.getgroups()):
+    shf.close()
+    raise IOError("%s: trace server: %s is neither the user's nor shared "
+      "with one of its groups" % (infile, shm))
+  buf = mmap.mmap(shf.fileno(), 0, access = mmap.ACCESS_COPY)
+  shf.close()
+  for name, typecode, offset, length in layout:
+    state[name] = (CTYPES[typecode] * length).from_buffer(buf, offset)
+  state["infile"] = infile # (as the client named it, for the results)
+  state["_mmap"] = buf
+  return KINDS[state.pop("kind")](state)
+
+
+if __name__ == "__main__":
+  if len(sys.argv) > 2:
+    serve(sys.argv[1], group = sys.argv[2])
+  elif len(sys.argv) > 1:
+    serve(sys.argv[1])
+  else:
+    serve()
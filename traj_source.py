@@ -0,0 +1,641 @@
+# --------------------------------------------------------------------------
+# Filename      : traj_source.py
+# --------------------------------------------------------------------------
+# Language Ver. : Python 2.7
+#
+# Description   : Trajectory sources for the calc_smz.py, calc_kda_smz.py
+#                 and calc_glr.py engines.
+#
+#                 The engines only ever look at one time slice at a time:
+#                 the (vehicle, x, y) positions of all vehicles active at
+#                 time step t, sorted by vehicle number. A trajectory source
+#                 hands out those slices, either from
+#
+#                 a. a sorted, fully enumerated .srt file (SrtSource), the
+#                    output of gen_traj.py + unix sort, or
+#                 b. the GMSF/MMTS trace file itself (GmsfSource), in which
+#                    case the positions are interpolated on demand and the
+#                    expansion, sort and storage steps are skipped entirely
+#
+#                 Every .srt point is a linear interpolation of one GMSF
+#                 segment (see gen_traj.py), so GmsfSource only keeps the
+#                 segments (~52k for city.txt instead of ~1.8M points)
+#                 plus a small interval index by time.
+#
+#                 note: GmsfSource produces the same points as the .srt
+#                 file, but (a) they are not rounded to 12 significant
+#                 digits the way str() rounds them in .srt files, and
+#                 (b) when two segments of one vehicle overlap at a second
+#                 (one ends where the next begins) the two records are
+#                 kept in trace file order, not in unix sort order, so
+#                 results may differ very slightly from the .srt results
+#
+#                 Time is counted in whole time steps of step seconds
+#                 (default 1, as in gen_traj.py); t, tmin, tmax and sim_time
+#                 are step numbers, and to_seconds() converts them back.
+#                 For sub-second steps (e.g. step = 0.1 for GLR comrange
+#                 studies) read the GMSF/MMTS trace file directly: the
+#                 segments do not multiply with the number of steps, only
+#                 the slices do, whereas a .srt file would be 1/step times
+#                 as large. A .srt file generated with a step (gen_traj.py)
+#                 holds step numbers, so it must be opened with the same one.
+#
+#                 Both SrtSource and GmsfSource also answer per-vehicle
+#                 queries, path(v) and lifetime(v), in time proportional to
+#                 the length of the path: a .srt file is indexed by vehicle
+#                 (on first use) with a permutation of its records, grouped
+#                 by vehicle and in time order within each group, next to
+#                 the time order of the file.
+#
+#                 Every source also carries the trace metadata the engines
+#                 size their arrays from:
+#
+#                 sim_time  total simulation time in steps (2000 s for the
+#                           traces from gmsf.sourceforge.net)
+#                 region    (xmin, ymin, xmax, ymax) of the simulated region
+#                           ((0, 0, 3000, 3000) for the same traces)
+#
+#                 both come from the GMSF/MMTS trace file; a .srt file uses
+#                 the trace file it was generated from (same name, .txt)
+#                 if it is present, otherwise its own points
+#
+#                 A .srt file can also be streamed (SrtStream): slices are
+#                 parsed in a background process, a bounded number ahead of
+#                 the engine, so parsing (and waiting for a slow disk)
+#                 overlaps the SMZ/GLR computation and the trace is never
+#                 held in RAM. The engines stream .srt files they are given
+#                 by name when the trace file is at hand for the metadata.
+#
+#                 Vehicles are numbered densely, 1 .. V in the order of
+#                 their ids in the file (there is no vehicle 0), so the
+#                 per-vehicle arrays of the engines have one entry per
+#                 vehicle however the trace generator assigned its ids;
+#                 ids[v] is the id vehicle v has in the file, and is what
+#                 the engines write out. (With the gmsf.sourceforge.net
+#                 traces, whose ids are 1 .. V already, ids[v] == v.)
+#
+#                 Trace and .srt files are parsed in bulk, a block of lines
+#                 at a time (see text_columns.py), and a malformed line is
+#                 reported with its line number.
+#
+# Usage         : source = open_trace("city.txt")  # or "city.srt"
+#                 source = open_trace("city.txt", 0.1) # 0.1 s time steps
+#                 source = open_trace("city.srt", stream = True)
+#                 for t, cid, curx, cury in source.slices():
+#                   ...
+#
+#                 with the environment variable TRACE_SERVER set to the
+#                 socket of a running trace server, traces are opened there
+#                 and shared between processes (see trace_server.py)
+#
+# --------------------------------------------------------------------------
+
+import os
+import bisect
+import Queue
+import threading
+import multiprocessing
+from array import array
+
+import text_columns
+
+GMSF_COLUMNS = "diddddd"  # t, v, x1, y1, x2, y2, duration
+SRT_COLUMNS  = "iidd"     # t, v, x, y
+
+
+def open_trace (infile, step = None, stream = False):
+  # returns the trajectory source for infile, chosen by file extension:
+  # .srt files are read as fully enumerated trajectories (streamed if
+  # stream and the trace file is there for the metadata), anything else
+  # (city.txt, urban.txt, rural.txt) is read as a GMSF/MMTS trace file;
+  # an already opened source is returned as it is
+  if not isinstance(infile, basestring):
+    if step is not None and step != infile.step:
+      raise ValueError("%s: opened with %s s time steps, not %s"
+        % (infile.infile, infile.step, step))
+    return infile
+  if os.environ.get("TRACE_SERVER"):
+    import trace_server
+    return trace_server.attach(infile, step, os.environ["TRACE_SERVER"])
+  if step is None:
+    step = 1
+  if infile.endswith(".srt"):
+    if stream and os.path.exists(trace_file(infile)):
+      return SrtStream(infile, step)
+    return SrtSource(infile, step)
+  return GmsfSource(infile, step = step)
+
+
+def trace_file (srt):
+  # returns the name of the GMSF/MMTS trace file a .srt file was made from
+  return srt[:-len(".srt")] + ".txt"
+
+
+def gmsf_metadata (infile, step = 1):
+  # returns (sim_time, region) of a GMSF/MMTS trace file: the end of the
+  # last segment, rounded up to a whole step, and the bounding box of all
+  # segment endpoints
+  stamp, vid, x1, y1, x2, y2, duration = \
+    text_columns.read_columns(infile, GMSF_COLUMNS)
+  end = max([0.0] + [stamp[j] + duration[j] for j in range(len(stamp))])
+  xmin = min(min(x1), min(x2))
+  xmax = max(max(x1), max(x2))
+  ymin = min(min(y1), min(y2))
+  ymax = max(max(y1), max(y2))
+  # (rounded first so 1990.37 + 9.63 does not become 2001)
+  return (to_steps(round(end, 6), step), (xmin, ymin, xmax, ymax))
+
+
+def gmsf_extent (infile, step = 1):
+  # returns (tmin, tmax, ids) of the records gen_traj.py writes for a
+  # GMSF/MMTS trace file: the range of times (steps) and the vehicle ids
+  # (see dense_ids)
+  stamp, vid, x1, y1, x2, y2, duration = \
+    text_columns.read_columns(infile, GMSF_COLUMNS)
+  start = [to_steps(stamp[j], step) for j in range(len(stamp))]
+  tmax = max([start[j] + to_steps(duration[j], step)
+    for j in range(len(stamp))])
+  return (min(start), tmax, dense_ids(vid)[0])
+
+
+def dense_ids (vid):
+  # returns (ids, numbers): the distinct vehicle ids of vid in increasing
+  # order as ids[1 .. V] (ids[0] = 0, there is no vehicle 0), and vid with
+  # every id replaced by its vehicle number 1 .. V (vid itself if its ids
+  # are 1 .. V already)
+  ids = array("i", [0] + sorted(set(vid)))
+  if ids.tolist() == range(len(ids)):
+    return (ids, vid)
+  number = vehicle_numbers(ids)
+  return (ids, array("i", [number[u] for u in vid]))
+
+
+def vehicle_numbers (ids):
+  # returns {id: vehicle number}, the inverse of ids (see dense_ids)
+  return dict([(ids[v], v) for v in range(1, len(ids))])
+
+
+def ceil_stamp (stamp):
+  # round up timestamps to keep time consistently (same rule as gen_traj.py)
+  if stamp > int(stamp):
+    return int(stamp) + 1
+  return int(stamp)
+
+
+def to_steps (seconds, step = 1):
+  # returns the time in seconds as a number of time steps, rounded up
+  # (same rule as gen_traj.py; the quotient is first rounded to 6 decimals
+  # so that e.g. 1.1 s is 11 steps of 0.1 s, not 12)
+  return ceil_stamp(round(seconds / float(step), 6))
+
+
+def to_seconds (steps, step = 1):
+  # returns a number of time steps in seconds; negative values (times not
+  # set) are returned as they are, and so are all values if step is 1
+  if steps < 0 or step == 1:
+    return steps
+  return round(steps * step, 9)
+
+
+def group_by (keys, kmin, kmax):
+  # returns (first, order), a CSR-style index of keys: the positions i with
+  # keys[i] == k are order[first[k - kmin] : first[k - kmin + 1]], in
+  # increasing order of i (a counting sort, so no comparisons are done)
+  first = array("i", [0] * (kmax - kmin + 2))
+  for k in keys:
+    first[k - kmin + 1] += 1
+  for k in range(1, len(first)):
+    first[k] += first[k - 1]
+  fill = array("i", first)
+  order = array("i", [0] * len(keys))
+  for i in range(len(keys)):
+    k = keys[i] - kmin
+    order[fill[k]] = i
+    fill[k] += 1
+  return (first, order)
+
+
+def lookahead (slices, last):
+  # yields (t, cid, curx, cury, ahead) for each slice, where ahead is the
+  # (cid, curx, cury) slice at time min(t+1, last).
+  #
+  # GLR pairing compares a vehicle's position at time t with the positions
+  # of other vehicles one time step later (this is what the simtimes[]
+  # index in the original calc_glr.py did), and slice "last" (SIM_TIME) is
+  # used for every time at or after the end of the simulation
+
+  empty = ([], [], [])
+  cache = {}
+  it = iter(slices)
+  pending = next(it, None)
+  while pending is not None:
+    t = pending[0]
+    cache[t] = pending[1:]
+    pending = next(it, None)
+    if pending is not None:
+      cache[pending[0]] = pending[1:]
+    cur = cache[t]
+    yield (t, cur[0], cur[1], cur[2], cache.get(min(t + 1, last), empty))
+    for old in [u for u in cache if u < t and u != last]:
+      del cache[old]
+
+
+def prefetch (items, depth = 16):
+  # yields the items of the iterable items, produced on a background
+  # thread at most depth items ahead; an exception raised by the producer
+  # is raised here (the thread is stopped if the consumer stops early)
+  queue = Queue.Queue(depth)
+  stop = threading.Event()
+
+  def put (item):
+    while not stop.is_set():
+      try:
+        queue.put(item, timeout = 0.1)
+        return
+      except Queue.Full:
+        pass
+
+  def produce ():
+    try:
+      for item in items:
+        put((True, item))
+      put((False, None))
+    except Exception, e:
+      put((False, e))
+
+  producer = threading.Thread(target = produce)
+  producer.daemon = True
+  producer.start()
+  try:
+    while True:
+      more, item = queue.get()
+      if not more:
+        if item is not None:
+          raise item
+        return
+      yield item
+  finally:
+    stop.set()
+
+
+def read_srt_slices (infile, first = None):
+  # yields (t, cid, curx, cury) for every time t >= first that has
+  # records in a .srt file, reading the file a block of lines at a time
+  # (a slice cut by the end of a block is completed from the next one)
+  t = None
+  for times, vid, x, y in text_columns.iter_columns(infile, SRT_COLUMNS):
+    a = 0
+    if first is not None:
+      a = bisect.bisect_left(times, first)
+    while a < len(times):
+      b = bisect.bisect_right(times, times[a], a)
+      if times[a] != t:
+        if t is not None:
+          yield (t, cid, curx, cury)
+        t = times[a]
+        cid  = array("i")
+        curx = array("d")
+        cury = array("d")
+      cid.extend(vid[a:b])
+      curx.extend(x[a:b])
+      cury.extend(y[a:b])
+      a = b
+  if t is not None:
+    yield (t, cid, curx, cury)
+
+
+def _srt_reader (infile, first, queue):
+  # reader process of SrtStream: sends the slices as raw array bytes
+  try:
+    for t, cid, curx, cury in read_srt_slices(infile, first):
+      queue.put((t, cid.tostring(), curx.tostring(), cury.tostring()))
+    queue.put(None)
+  except Exception, e:
+    queue.put(("error", "%s: %s" % (e.__class__.__name__, e)))
+
+
+class SrtSource:
+  # positions read from a sorted, fully enumerated .srt file
+  # (form: t, v, x, y), see calc_smz.py for a description; t is a step
+  # number (seconds unless gen_traj.py was run with another step)
+
+  def __init__ (self, infile, step = 1):
+    self.infile = infile
+    self.step  = step       # seconds per time step
+    # times (step number), vehicle number, x and y position at time
+    self.times, self.cid, self.curx, self.cury = \
+      text_columns.read_columns(infile, SRT_COLUMNS)
+    self.ids, self.cid = dense_ids(self.cid) # ids[v]: id of vehicle v
+    self.first = {}         # first[t] is the index of the first record at t
+    self.end   = {}         # end[t] is one past the index of the last one
+    self.veh_first = None   # per-vehicle index, see index_vehicles()
+    self.veh_order = None
+
+    # (the file is sorted by time, so each slice is found by bisection)
+    b = 0
+    for t in range(self.times[0], self.times[-1] + 1):
+      a = b
+      b = bisect.bisect_right(self.times, t, a)
+      if b > a:
+        self.first[t] = a
+        self.end[t] = b
+
+    self.tmin = min(self.first)
+    self.tmax = max(self.first)
+    self.vmin = 1
+    self.vmax = len(self.ids) - 1
+
+    # trace metadata, from the GMSF/MMTS trace file if it is at hand
+    # (points in a .srt file never quite reach the segment endpoints)
+    trace = trace_file(infile)
+    if os.path.exists(trace):
+      self.sim_time, self.region = gmsf_metadata(trace, step)
+    else:
+      self.sim_time = self.tmax
+      self.region = (min(self.curx), min(self.cury),
+        max(self.curx), max(self.cury))
+
+  def slice (self, t):
+    # returns (cid, curx, cury) of all records at time t
+    if t not in self.first:
+      return (array("i"), array("d"), array("d"))
+    a = self.first[t]
+    b = self.end[t]
+    return (self.cid[a:b], self.curx[a:b], self.cury[a:b])
+
+  def slices (self, first = None):
+    # yields (t, cid, curx, cury) for every time slice, in time order,
+    # starting at time first (default: the beginning of the trace)
+    if first is None:
+      first = self.tmin
+    for t in range(max(first, self.tmin), self.tmax + 1):
+      s = self.slice(t)
+      yield (t, s[0], s[1], s[2])
+
+  def index_vehicles (self):
+    # builds the per-vehicle index: the records of vehicle v are
+    # veh_order[veh_first[v - vmin] : veh_first[v - vmin + 1]], in time
+    # order (done on the first per-vehicle query)
+    if self.veh_first is None:
+      self.veh_first, self.veh_order = group_by(self.cid, self.vmin,
+        self.vmax)
+
+  def vehicle_records (self, v):
+    # returns the indexes of the records of vehicle v, in time order
+    if v < self.vmin or v > self.vmax:
+      return []
+    self.index_vehicles()
+    a = self.veh_first[v - self.vmin]
+    b = self.veh_first[v - self.vmin + 1]
+    return self.veh_order[a:b]
+
+  def path (self, v):
+    # returns (times, curx, cury) of all records of vehicle v, in time order
+    times = array("i")
+    curx  = array("d")
+    cury  = array("d")
+    for i in self.vehicle_records(v):
+      times.append(self.times[i])
+      curx.append(self.curx[i])
+      cury.append(self.cury[i])
+    return (times, curx, cury)
+
+  def lifetime (self, v):
+    # returns (begin, end), the times of the first and last records of
+    # vehicle v (as gen_begin.cpp computes them), or (-1, -1) if none
+    records = self.vehicle_records(v)
+    if len(records) == 0:
+      return (-1, -1)
+    return (self.times[records[0]], self.times[records[-1]])
+
+
+class SrtStream:
+  # positions streamed from a sorted, fully enumerated .srt file, which is
+  # parsed by a background process (or thread) up to depth slices ahead of
+  # the engine; nothing but the current slices is held in RAM. The sizes
+  # and metadata (tmin, tmax, ids, sim_time, region) come from the trace
+  # file the .srt file was made from, which must be there
+
+  def __init__ (self, infile, step = 1, depth = 16, background = "process"):
+    self.infile = infile
+    self.step = step             # seconds per time step
+    self.depth = depth           # slices parsed ahead
+    self.background = background # "process" or "thread"
+    trace = trace_file(infile)
+    if not os.path.exists(trace):
+      raise ValueError("%s: streaming needs the trace file %s"
+        % (infile, trace))
+    self.sim_time, self.region = gmsf_metadata(trace, step)
+    self.tmin, self.tmax, self.ids = gmsf_extent(trace, step)
+    self.vmin = 1
+    self.vmax = len(self.ids) - 1
+    self.number = None # {id: vehicle number}, unless they are the same
+    if self.ids.tolist() != range(len(self.ids)):
+      self.number = vehicle_numbers(self.ids)
+
+  def records (self, first = None):
+    # yields (t, cid, curx, cury) for the times with records, from t = first,
+    # parsed in the background
+    if self.background == "thread":
+      for t, cid, curx, cury in prefetch(read_srt_slices(self.infile, first),
+        self.depth):
+        yield (t, self.numbered(cid), curx, cury)
+      return
+    queue = multiprocessing.Queue(self.depth)
+    reader = multiprocessing.Process(target = _srt_reader,
+      args = (self.infile, first, queue))
+    reader.daemon = True
+    reader.start()
+    try:
+      while True:
+        try:
+          item = queue.get(timeout = 1)
+        except Queue.Empty:
+          if not reader.is_alive() and queue.empty():
+            raise IOError("%s: reader process died" % self.infile)
+          continue
+        if item is None:
+          return
+        if len(item) == 2:
+          raise IOError("%s: %s" % (self.infile, item[1]))
+        cid  = array("i")
+        curx = array("d")
+        cury = array("d")
+        cid.fromstring(item[1])
+        curx.fromstring(item[2])
+        cury.fromstring(item[3])
+        yield (item[0], self.numbered(cid), curx, cury)
+    finally:
+      if reader.is_alive():
+        reader.terminate()
+      reader.join()
+
+  def numbered (self, cid):
+    # returns the vehicle numbers of the ids in cid
+    if self.number is None:
+      return cid
+    number = self.number
+    return array("i", [number[u] for u in cid])
+
+  def slices (self, first = None):
+    # yields (t, cid, curx, cury) for every time slice, in time order,
+    # starting at time first (default: the beginning of the trace)
+    if first is None:
+      first = self.tmin
+    t = max(first, self.tmin)
+    for s in self.records(t):
+      while t < s[0]:
+        yield (t, array("i"), array("d"), array("d"))
+        t += 1
+      yield s
+      t = s[0] + 1
+    while t <= self.tmax:
+      yield (t, array("i"), array("d"), array("d"))
+      t += 1
+
+
+class GmsfSource:
+  # positions interpolated on demand from the segments of a GMSF/MMTS
+  # trace file (form: t, v, x1, y1, x2, y2, duration), see gen_traj.py
+  #
+  # segment j covers steps start[j] .. start[j] + elapsed[j] and its
+  # position at step start[j] + tt is
+  #
+  #   (curx[j] + tt * delta_x[j], cury[j] + tt * delta_y[j])
+  #
+  # which is exactly the point gen_traj.py would have written (with the
+  # same step)
+
+  def __init__ (self, infile, block = 16, step = 1):
+    self.infile  = infile
+    self.step    = step        # seconds per time step
+    self.block   = block       # width (steps) of an interval index block
+    # the segments as in the trace file (not rounded): stamp, vehicle
+    # number vid, starting position (curx, cury), end position (finx, finy)
+    # and duration, for resolution-independent geometry (see seg_geom.py)
+    self.stamp, self.vid, self.curx, self.cury, self.finx, self.finy, \
+      self.duration, lines = text_columns.read_columns(infile, GMSF_COLUMNS,
+      lines = True)
+    self.ids, self.vid = dense_ids(self.vid) # ids[v]: id of vehicle v
+    self.start   = array("i")  # first step of segment (rounded up)
+    self.delta_x = array("d")  # movement per step
+    self.delta_y = array("d")
+    self.elapsed = array("i")  # steps from start to end (rounded up)
+    end = 0.0                  # end of the last segment (not rounded)
+    xmin = ymin = float("inf") # bounding box of all segment endpoints
+    xmax = ymax = float("-inf")
+
+    for j in range(len(self.stamp)):
+      stamp   = to_steps(self.stamp[j], step)
+      elapsed = to_steps(self.duration[j], step)
+      if elapsed == 0:
+        raise ValueError("%s line %d: elapsed time is zero"
+          % (infile, lines[j]))
+      x1, y1 = self.curx[j], self.cury[j]
+      x2, y2 = self.finx[j], self.finy[j]
+      self.start.append(stamp)
+      self.delta_x.append((x2 - x1) / (elapsed + 1))
+      self.delta_y.append((y2 - y1) / (elapsed + 1))
+      self.elapsed.append(elapsed)
+      end  = max(end, self.stamp[j] + self.duration[j])
+      xmin = min(xmin, x1, x2)
+      xmax = max(xmax, x1, x2)
+      ymin = min(ymin, y1, y2)
+      ymax = max(ymax, y1, y2)
+
+    self.tmin = min(self.start)
+    self.tmax = max([self.start[j] + self.elapsed[j]
+      for j in range(len(self.start))])
+    self.vmin = 1
+    self.vmax = len(self.ids) - 1
+
+    # trace metadata (see gmsf_metadata)
+    self.sim_time = to_steps(round(end, 6), step)
+    self.region = (xmin, ymin, xmax, ymax)
+
+    # interval index: block_segs[block_first[b] : block_first[b+1]] lists
+    # every segment that is active during any step of block b, i.e. steps
+    # b*block .. (b+1)*block - 1, in trace file order
+    self.block_first = array("i", [0] * (self.tmax // block + 2))
+    for j in range(len(self.start)):
+      for b in range(self.start[j] // block,
+        (self.start[j] + self.elapsed[j]) // block + 1):
+        self.block_first[b + 1] += 1
+    for b in range(1, len(self.block_first)):
+      self.block_first[b] += self.block_first[b - 1]
+    fill = array("i", self.block_first)
+    self.block_segs = array("i", [0] * self.block_first[-1])
+    for j in range(len(self.start)):
+      for b in range(self.start[j] // block,
+        (self.start[j] + self.elapsed[j]) // block + 1):
+        self.block_segs[fill[b]] = j
+        fill[b] += 1
+
+    # per-vehicle index: the segments of vehicle v, in trace file order
+    # (which is time order), see vehicle_segments()
+    self.veh_first, self.veh_segs = group_by(self.vid, self.vmin, self.vmax)
+
+  def vehicle_segments (self, v):
+    # returns the indexes of the segments of vehicle v, in time order
+    if v < self.vmin or v > self.vmax:
+      return []
+    a = self.veh_first[v - self.vmin]
+    b = self.veh_first[v - self.vmin + 1]
+    return self.veh_segs[a:b]
+
+  def path (self, v):
+    # returns (times, curx, cury) of all records of vehicle v, in time
+    # order (the records gen_traj.py would write for it; consecutive
+    # segments may overlap by a step after rounding, hence the sort)
+    records = []
+    for j in self.vehicle_segments(v):
+      for tt in range(self.elapsed[j] + 1):
+        records.append((self.start[j] + tt, self.curx[j] + tt * self.delta_x[j],
+          self.cury[j] + tt * self.delta_y[j]))
+    records.sort(key = lambda r: r[0])
+    return (array("i", [r[0] for r in records]),
+      array("d", [r[1] for r in records]), array("d", [r[2] for r in records]))
+
+  def lifetime (self, v):
+    # returns (begin, end), the times of the first and last records of
+    # vehicle v, or (-1, -1) if none
+    segs = self.vehicle_segments(v)
+    if len(segs) == 0:
+      return (-1, -1)
+    return (min([self.start[j] for j in segs]),
+      max([self.start[j] + self.elapsed[j] for j in segs]))
+
+  def segments_at (self, t):
+    # returns the indexes of all segments active at step t,
+    # in trace file order
+    if t < self.tmin or t > self.tmax:
+      return []
+    start = self.start
+    elapsed = self.elapsed
+    b = t // self.block
+    return [j for j in self.block_segs[self.block_first[b]:
+      self.block_first[b + 1]] if start[j] <= t <= start[j] + elapsed[j]]
+
+  def slice (self, t):
+    # returns (cid, curx, cury) of all vehicles active at step t,
+    # sorted by vehicle number (as in a .srt file)
+    vid = self.vid
+    active = sorted(self.segments_at(t), key = lambda j: vid[j])
+    cid  = array("i")
+    curx = array("d")
+    cury = array("d")
+    for j in active:
+      tt = t - self.start[j]
+      cid.append(vid[j])
+      curx.append(self.curx[j] + tt * self.delta_x[j])
+      cury.append(self.cury[j] + tt * self.delta_y[j])
+    return (cid, curx, cury)
+
+  def slices (self, first = None):
+    # yields (t, cid, curx, cury) for every time slice, in time order,
+    # starting at time first (default: the beginning of the trace)
+    if first is None:
+      first = self.tmin
+    for t in range(max(first, self.tmin), self.tmax + 1):
+      s = self.slice(t)
+      yield (t, s[0], s[1], s[2])